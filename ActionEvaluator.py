@@ -2,11 +2,12 @@
 from numpy.lib.type_check import real
 import Agent
 from usersimulator import SimulatedUsersManager
-from utils import DiaAct, Settings, ContextLogger
-from usersimulator.myUserSim.dialogUtils import Action
+from utils import DiaAct, Settings, ContextLogger, DialogueCorpus
+import Simulate
 import json
 
 import os
+import multiprocessing
 
 logger = ContextLogger.getLogger('')
 
@@ -42,6 +43,11 @@ class ActionEvaluator:
             pass #load here florians model
 
         self.dialogs = None
+        self.deterministic = False
+        if Settings.config.has_option("simulate", "deterministic"):
+            self.deterministic = Settings.config.getboolean("simulate", "deterministic")
+        self.base_seed = Simulate.new_base_seed() if self.deterministic else None
+        self.turn_acts = None   # when a list, evaluate_turn() also records the (act, slots) of every system turn here
 
         self.correct = 0
         self.wrong = 0
@@ -51,9 +57,10 @@ class ActionEvaluator:
        
         self.dialogs = self.read_file(test_file)
 
-        for i in range(len(self.dialogs)):
-            dialog_name = list(self.dialogs.keys())[i]
+        for i, dialog_name in enumerate(self.dialogs.keys()):
             #print "Dialog {}/{}      \r".format(i, len(self.dialogs)),
+            if self.deterministic:
+                Simulate.seed_dialogue(self.base_seed, i)
             dialog = self.dialogs[dialog_name]
             logger.info('Dialogue %s' % (dialog_name))
             self.run(session_id='simulate_dialog'+str(i), dialog=dialog, sim_level=self.sim_level)
@@ -163,6 +170,36 @@ class ActionEvaluator:
         
         return
 
+    def run_shard(self, test_file, dialogue_ids, base_seed, deterministic):
+        '''
+        Runs the given dialogues of a parallel evaluation (see :class:`ParallelActionEvaluator`) and returns the system
+        acts instead of printing the results. The agent is not powered down.
+
+        :param test_file: the test dialogues
+        :type test_file: str
+        :param dialogue_ids: indexes of the dialogues in the file
+        :type dialogue_ids: list
+        :param base_seed: seed of the evaluation, see :func:`Simulate.new_base_seed`
+        :type base_seed: int
+        :param deterministic: reseed for every dialogue rather than once for the shard
+        :type deterministic: bool
+        :return: list -- (dialogue index, [(act, slots) of every system turn]) pairs
+        '''
+        self.dialogs = self.read_file(test_file)
+        names = self.dialogs.keys()
+        if not deterministic:
+            Simulate.seed_dialogue(base_seed + 1, dialogue_ids[0])
+        results = []
+        for i in dialogue_ids:
+            if deterministic:
+                Simulate.seed_dialogue(base_seed, i)
+            logger.info('Dialogue %s' % (names[i]))
+            self.turn_acts = []
+            self.run(session_id='simulate_dialog'+str(i), dialog=self.dialogs[names[i]], sim_level=self.sim_level)
+            results.append((i, self.turn_acts))
+        self.turn_acts = None
+        return results
+
     def evaluate_turn(self, sys_act, turn, test_dialog):
 
         original_agent_act = sys_act.act
@@ -170,6 +207,14 @@ class ActionEvaluator:
             original_slots = [item.slot for item in sys_act.items]
         else:
             original_slots = [None]
+        if self.turn_acts is not None:
+            self.turn_acts.append((original_agent_act, original_slots))
+        self.score_turn(original_agent_act, original_slots, turn, test_dialog)
+
+    def score_turn(self, original_agent_act, original_slots, turn, test_dialog):
+        '''
+        Counts the system act of a turn as correct or wrong against the acts of the agent in the test dialogue.
+        '''
         
         # if sys_act.items:                   #INFORM(city=ny, time=11) -> INFORM(city), INFORM(time)
         #     for item in sys_act.items:
@@ -334,40 +379,73 @@ class ActionEvaluator:
                 print "+----------------+-----------+--------+"
 
     def read_file(self, test_file):
+        '''
+        Returns the dialogues of a markdown corpus file, each read from the file when it is evaluated,
+        see :mod:`utils.DialogueCorpus`.
+        '''
+        return DialogueCorpus.getCorpus(test_file)
+
+
+def _init_worker(error_rate):
+    global _worker_evaluator
+    _worker_evaluator = ActionEvaluator(error_rate)
+
+
+def _run_worker_shard(args):
+    return _worker_evaluator.run_shard(*args)
+
+
+class ParallelActionEvaluator(ActionEvaluator):
+    '''
+    Evaluates the actions of the policy on the test dialogues in several worker processes, as
+    :class:`Simulate.ParallelSimulationSystem` does for simulated dialogues. Every worker is forked from this process and
+    loads the policy itself, with learning off. The workers return the system acts of every turn and they are scored here
+    in dialogue order, so the results are printed as by a single :class:`ActionEvaluator` that got the same system acts.
+    No agent is built in this process.
+
+    With ``[simulate] deterministic = True`` every dialogue is seeded from the seed of the evaluation and its index, so the
+    results do not depend on the number of workers.
+    '''
+    def __init__(self, error_rate, num_workers=None):
+        self.error_rate = error_rate
+        self.num_workers = num_workers
+        if self.num_workers is None and Settings.config.has_option("simulate", "numworkers"):
+            self.num_workers = Settings.config.getint("simulate", "numworkers")
+        if self.num_workers is None or self.num_workers < 1:
+            self.num_workers = multiprocessing.cpu_count()
+        self.deterministic = False
+        if Settings.config.has_option("simulate", "deterministic"):
+            self.deterministic = Settings.config.getboolean("simulate", "deterministic")
+        self.base_seed = Simulate.new_base_seed()
+        self.dialogs = None
+        self.turn_acts = None
 
-        with open(test_file, "r") as f:
-            dialogs_data = f.read().split("##")[1:]
-
-        dialogs = {}
-
-        for dialog in dialogs_data:
-            user_turns = {}
-            u_turn = 0
-            in_user = False
-            agent_turns = {}
-            a_turn = 0
-            in_agent = False
-            dialog_name = dialog.split("\n")[0].strip()
-            for line in dialog.split("\n")[1:]:
-                if line.startswith("USER: "):
-                    if in_agent:
-                        a_turn += 1
-                    in_agent = False
-                    in_user = True
-                    if u_turn not in user_turns:
-                        user_turns[u_turn] = []
-                    user_turns[u_turn].append(line.split("USER: ")[1])
-                elif line.startswith("AGENT: "):
-                    if in_user:
-                        u_turn += 1
-                    in_agent = True
-                    in_user = False
-                    if a_turn not in agent_turns:
-                        agent_turns[a_turn] = []
-                    agent_turns[a_turn].append(line.split("AGENT: ")[1])
-
-            dialogs[dialog_name] = {}
-            dialogs[dialog_name]["USER"] = user_turns
-            dialogs[dialog_name]["AGENT"] = agent_turns
-
-        return dialogs
+        self.correct = 0
+        self.wrong = 0
+        self.action_scores = {}
+
+    def _shards(self, numDialogs):
+        # a few shards per worker to balance dialogues of different length
+        num_shards = min(numDialogs, 4 * self.num_workers)
+        bounds = [numDialogs * k // num_shards for k in range(num_shards + 1)]
+        return [range(bounds[k], bounds[k + 1]) for k in range(num_shards)]
+
+    def run_eval(self, test_file):
+        self.dialogs = self.read_file(test_file)
+        names = self.dialogs.keys()
+        if len(names) > 0:
+            ContextLogger.flushLoggingHandlers()
+            pool = multiprocessing.Pool(min(self.num_workers, len(names)), _init_worker, (self.error_rate,))
+            try:
+                shards = [(test_file, shard, self.base_seed, self.deterministic) for shard in self._shards(len(names))]
+                for results in pool.map(_run_worker_shard, shards, chunksize=1):
+                    for i, turn_acts in results:
+                        test_dialog = self.dialogs[names[i]]["AGENT"]
+                        for turn, (act, slots) in enumerate(turn_acts):
+                            self.score_turn(act, slots, turn, test_dialog)
+            finally:
+                pool.terminate()
+                pool.join()
+
+        self.calc_results()
+        self.print_results()
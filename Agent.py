@@ -32,6 +32,7 @@ Contains 3 classes::
 
     import :mod:`utils.Settings` |.|
     import :mod:`utils.ContextLogger` |.|
+    import :mod:`utils.dact` |.|
     import :class:`utils.DiaAct.DiaAct` |.|
     import :class:`utils.DiaAct.DiaActWithProb` |.|
     import :mod:`semo.SemOManager` |.|
@@ -44,7 +45,7 @@ Contains 3 classes::
 ************************
 
 '''
-from utils import Settings, ContextLogger
+from utils import Settings, ContextLogger, dact
 from topictracking import TopicTracking
 from ontology import Ontology
 from utils.DiaAct import DiaAct, DiaActWithProb
@@ -217,10 +218,12 @@ class DialogueAgent(object):
         '''
         Works through topictracking > semi belief > policy > semo > evaluation -- for turns > 0
         
-        Input consists of a n-best list of either ASR hypotheses (with confidence) or (mostly only in case of simulation) pre-interpreted DiaActWithProb objects.
+        Input consists of a n-best list of either ASR hypotheses (with confidence) or (mostly only in case of simulation) pre-interpreted
+        dialogue acts with their confidence. The interned acts (:class:`utils.dact.Act`) of the simulated user are passed on to the
+        belief tracker as they are.
               
         :param asr_info: information fetched from the asr
-        :type asr_info: list of string or DiaActWithProb objects
+        :type asr_info: list of (string or :class:`utils.dact.Act`, probability) tuples, or DiaActWithProb objects
 
         :param domainString: domain name
         :type domainString: string
@@ -231,7 +234,8 @@ class DialogueAgent(object):
         :return: DiaAct -- the system's reponse dialogue act with verbalization
         ''' 
 
-        logger.dial("user input: {}".format([(x.to_string() if isinstance(x,DiaAct) else x[0], round(x.P_Au_O, 3) if isinstance(x,DiaAct) else x[1]) for x in asr_info]))
+        if logger.isEnabledFor(ContextLogger.DIAL):
+            logger.dial("user input: {}".format([(x.to_string() if isinstance(x,DiaAct) else dact.ActText(x[0]), round(x.P_Au_O, 3) if isinstance(x,DiaAct) else x[1]) for x in asr_info]))
         
         # Check if user says bye and whether this is already valid
         self.callValidator.validate() # update time once more
@@ -390,13 +394,13 @@ class DialogueAgent(object):
         :param domainString: domain name
         :type domainString: string
               
-        :return: string -- the system's dialogue act reponse
+        :return: :class:`utils.dact.Act` -- the system's dialogue act reponse, interned, or None
         '''
         
         if domainString is None:
             domainString = self.topic_tracker.operatingDomain
         sys_act = self.policy_manager.getLastSystemAction(domainString)
-        return sys_act
+        return dact.InternAct(sys_act)
 
     def _logical_requirements(self):
         '''
@@ -580,10 +584,10 @@ class DialogueAgent(object):
         :return: None
         '''
         if self.hub_id=='dialogueserver':
-            logger.dial('Turn %d' % self.currentTurn)
+            logger.dial('Turn %d', self.currentTurn)
         else:
             if self.traceDialog>1: print '   Turn %d' % self.currentTurn
-            logger.dial('** Turn %d **' % self.currentTurn)
+            logger.dial('** Turn %d **', self.currentTurn)
         return
     
     def _print_sys_act(self, sys_act):
@@ -595,10 +599,10 @@ class DialogueAgent(object):
         :return: None
         '''
         if self.hub_id=='dialogueserver':
-            logger.dial('Sys > {}'.format(sys_act))
+            logger.dial('Sys > %s', sys_act)
         else:
             if self.traceDialog>1: print '   Sys > {}'.format(sys_act)
-            logger.dial('| Sys > {}'.format(sys_act))
+            logger.dial('| Sys > %s', sys_act)
     
     def _print_usr_act(self, state, currentDomain):
         '''Prints the system act in different ways for different hubs (dialogueserver, simulate or texthub)
@@ -1051,6 +1055,8 @@ class CallValidator(object):
             if isinstance(ob, tuple):
                 #sentence,sentence_prob = ob[0],ob[1]
                 sentence,_ = ob[0],ob[1]
+                if isinstance(sentence, dact.Act):
+                    sentence = sentence.act
             # simulated user input
             elif isinstance(ob,DiaAct):
                 sentence = ob.act
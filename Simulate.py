@@ -34,6 +34,7 @@ Optional arguments/flags [default values]::
     -n Number of dialogs [1]
     -r semantic error rate [0]
     -s set random seed 
+    -w number of worker processes [1]
     -g generate text prompts
     -h help
 
@@ -45,12 +46,15 @@ Optional arguments/flags [default values]::
     continuewhensuccessful = False
     forcenullpositive = False
     confscorer = additive
+    numworkers = 1              # >1 runs the dialogues in that many processes (evaluation only, see ParallelSimulationSystem)
+    deterministic = False       # reseed the random number generators for every dialogue so that results only depend on the seed
 
 
 .. seealso:: CUED Imports/Dependencies: 
 
     import :mod:`utils.ContextLogger` |.|
     import :mod:`utils.Settings` |.|
+    import :mod:`utils.DialogueCorpus` |.|
     import :mod:`usersimulator.SimulatedUsersManager` |.|
     import :mod:`ontology.FlatOntology` |.|
     import :mod:`Agent` |.|
@@ -60,18 +64,61 @@ Optional arguments/flags [default values]::
 '''
 import os
 import random
-import copy
 import argparse
+import multiprocessing
+import numpy as np
 import Agent
 from usersimulator import SimulatedUsersManager
 from utils import Settings
 from utils import ContextLogger
+from utils import DialogueCorpus
 from ontology import Ontology
+from evaluation.EvaluationManager import EvaluationManager
 logger = ContextLogger.getLogger('')
 
 __author__ = "cued_dialogue_systems_group"
 __version__ = Settings.__version__
 
+_agent_built = False    # set once a SimulationSystem has been built in this process, see can_fork_workers()
+
+
+def new_base_seed():
+    '''
+    Draws the seed from which the dialogue seeds of a run are derived. Taken from Settings.random, so it is set by the
+    seed of the run.
+
+    :return: int
+    '''
+    return Settings.random.randint(1000000000)
+
+
+def seed_dialogue(base_seed, index):
+    '''
+    Reseeds all random number generators with a seed derived from the base seed of the run and the index of a dialogue,
+    so that the dialogue does not depend on the dialogues run before it (in the same process).
+
+    :param base_seed: seed of the run, see :func:`new_base_seed`
+    :type base_seed: int
+    :param index: index of the dialogue in the run
+    :type index: int
+    :return: None
+    '''
+    Settings.random.seed([base_seed, index])
+    np.random.seed([base_seed, index])
+    random.seed(base_seed * 1000003 + index)
+
+
+def can_fork_workers():
+    '''
+    Tells whether the workers of a :class:`ParallelSimulationSystem` can be forked from this process. They cannot once a
+    :class:`SimulationSystem` has been built here, since its agent may hold a tensorflow session (DQN policies) which a
+    forked worker cannot use. Python 2 has no other way to start the workers.
+
+    :return: bool
+    '''
+    return not _agent_built
+
+
 class SimulationSystem(object):
     '''
     Semantic level simulated dialog system
@@ -81,6 +128,14 @@ class SimulationSystem(object):
         :param error_rate: error rate of the simulated environment
         :type error_rate: float
         '''
+        global _agent_built
+        _agent_built = True
+        self.deterministic = False
+        if Settings.config.has_option("simulate", "deterministic"):
+            self.deterministic = Settings.config.getboolean("simulate", "deterministic")
+        # drawn before building the agent, which may use the random number generator as well
+        self.base_seed = new_base_seed() if self.deterministic else None
+
         # Dialogue Agent Factory:
         #-----------------------------------------
         self.agent_factory = Agent.AgentFactory(hub_id='simulate')
@@ -91,6 +146,7 @@ class SimulationSystem(object):
         
         # Simulated User.
         #-----------------------------------------
+        self.error_rate = error_rate
         self.simulator = SimulatedUsersManager.SimulatedUsersManager(error_rate)
         self.traceDialog = 2
         self.sim_level = 'dial_act'
@@ -121,65 +177,53 @@ class SimulationSystem(object):
                     self.num_supervised_dialogs = max(0, Settings.config.getint("exec_config","numsuperviseddialogs"))
                 if Settings.config.has_option("exec_config","trainingfile"):
                     self.training_file = Settings.config.get("exec_config","trainingfile")
-                    self.executed_dialogs = []
+                    self.dialog_sampler = None
                 else:
                     self.semi_supervised = False
 
-    def read_file(self, training_file):
-
-        with open(training_file, "r") as f:
-            dialogs_data = f.read().split("##")[1:]
-
-        dialogs = {}
-
-        for dialog in dialogs_data:
-            user_turns = {}
-            u_turn = 0
-            in_user = False
-            agent_turns = {}
-            a_turn = 0
-            in_agent = False
-            dialog_name = dialog.split("\n")[0].strip()
-            for line in dialog.split("\n")[1:]:
-                if line.startswith("USER: "):
-                    if in_agent:
-                        a_turn += 1
-                    in_agent = False
-                    in_user = True
-                    if u_turn not in user_turns:
-                        user_turns[u_turn] = []
-                    user_turns[u_turn].append(line.split("USER: ")[1])
-                elif line.startswith("AGENT: "):
-                    if in_user:
-                        u_turn += 1
-                    in_agent = True
-                    in_user = False
-                    if a_turn not in agent_turns:
-                        agent_turns[a_turn] = []
-                    agent_turns[a_turn].append(line.split("AGENT: ")[1])
-
-            dialogs[dialog_name] = {}
-            dialogs[dialog_name]["USER"] = user_turns
-            dialogs[dialog_name]["AGENT"] = agent_turns
-
-        return dialogs
+    def reconfigure(self, error_rate):
+        '''
+        Prepares the system for another run instead of building a new one, as done by the warm sessions of pydial.py: the
+        policies take the learning flags and policy files of the config (see :func:`PolicyManager.reconfigure`), the
+        evaluation and the dialogue count start again and the belief trackers are replaced by new ones, as in a new
+        system. The simulated user is only rebuilt if the error rate changes.
 
-    def get_training_dialog(self, dialogs):
+        :param error_rate: error rate of the simulated environment
+        :type error_rate: float
+        :return: None
+        '''
+        if error_rate != self.error_rate:
+            self.error_rate = error_rate
+            self.simulator = SimulatedUsersManager.SimulatedUsersManager(error_rate)
+        if self.deterministic:
+            self.base_seed = new_base_seed()
+        for agent in self.agent_factory.agents.values():
+            booted = [dstring for dstring, tracker in agent.semi_belief_manager.domainSemiBelieftrackers.iteritems()
+                      if tracker is not None]
+            agent.semi_belief_manager = agent._load_manger('semanticbelieftrackingmanager',
+                                                           'semanticbelieftracking.SemanticBeliefTrackingManager.SemanticBeliefTrackingManager')
+            for dstring in booted:
+                agent.semi_belief_manager.bootup(dstring)
+            agent.policy_manager.reconfigure()
+            agent.evaluation_manager.pop_statistics()
+            agent.NUM_DIALOGS = 0
 
-        if not self.executed_dialogs:
-            self.executed_dialogs = []
+    def read_file(self, training_file):
+        '''
+        Returns the dialogues of a markdown corpus file, see :mod:`utils.DialogueCorpus`. They are indexed once per run
+        and each is read from the file when it is drawn.
+        '''
+        return DialogueCorpus.getCorpus(training_file)
 
-        keys = list(dialogs.keys())
+    def get_training_dialog(self, dialogs):
+        '''
+        Draws a dialogue of the corpus, each once until all have been run.
 
-        key = random.choice(keys)
-        if len(self.executed_dialogs) < len(keys):
-            while key in self.executed_dialogs:
-                key = random.choice(keys)
-            self.executed_dialogs.append(key)
-        else:
-            self.executed_dialogs = []
-        
-        return key, copy.deepcopy(dialogs[key])
+        :returns: (tuple) name of the dialogue and the dialogue
+        '''
+        if self.dialog_sampler is None or self.dialog_sampler.corpus is not dialogs:
+            self.dialog_sampler = DialogueCorpus.DialogueSampler(dialogs)
+        return self.dialog_sampler.sample()
 
     def run_dialogs(self, numDialogs):
         '''
@@ -196,6 +240,8 @@ class SimulationSystem(object):
 
         for i in range(numDialogs):
             logger.info('Dialogue %d' % (i+1))
+            if self.deterministic:
+                seed_dialogue(self.base_seed, i)
             # print i
             if self.semi_supervised and i%(numDialogs//self.num_supervised_dialogs) == 0:
                 logger.dial("**SUPERVISED**")
@@ -207,6 +253,33 @@ class SimulationSystem(object):
                 self.run(session_id='simulate_dialog'+str(i), sim_level=self.sim_level, supervised=False)
  
         self.agent_factory.power_down_factory() # Important! -uses FORCE_SAVE on policy- which will finalise learning and save policy.
+
+    def run_shard(self, dialogue_ids, base_seed, deterministic):
+        '''
+        Runs the given dialogues of a parallel run (see :class:`ParallelSimulationSystem`) and collects their evaluation
+        statistics instead of printing a summary. The agent is not powered down, so the policy is not saved.
+
+        :param dialogue_ids: indexes of the dialogues in the run
+        :type dialogue_ids: list
+        :param base_seed: seed of the run, see :func:`new_base_seed`
+        :type base_seed: int
+        :param deterministic: reseed for every dialogue rather than once for the shard
+        :type deterministic: bool
+        :return: list -- (dialogue index, statistics) pairs, see :func:`EvaluationManager.pop_statistics`
+        '''
+        evaluation_manager = self.agent_factory.agents['Smith'].evaluation_manager
+        evaluation_manager.pop_statistics()
+        if not deterministic:
+            # one stream per shard, different from the streams of the deterministic dialogues
+            seed_dialogue(base_seed + 1, dialogue_ids[0])
+        results = []
+        for i in dialogue_ids:
+            logger.info('Dialogue %d' % (i+1))
+            if deterministic:
+                seed_dialogue(base_seed, i)
+            self.run(session_id='simulate_dialog'+str(i), sim_level=self.sim_level, supervised=False)
+            results.append((i, evaluation_manager.pop_statistics()))
+        return results
        
     def run(self, session_id, agent_id='Smith', sim_level='dial_act', supervised=False):
         '''
@@ -281,7 +354,7 @@ class SimulationSystem(object):
                 print '   User >', user_act
             if self.sim_level != 'sys2text':
                 if type(user_act) == list:
-                    logger.dial('| User > ' + str(user_act))
+                    logger.dial('| User > %s', user_act)
                 else:
                     logger.dial('| User > ' + user_act.to_string())
             else:
@@ -332,6 +405,87 @@ class SimulationSystem(object):
 
         return
 
+
+_worker_system = None
+
+
+def _init_worker(error_rate):
+    global _worker_system
+    _worker_system = SimulationSystem(error_rate)
+
+
+def _run_worker_shard(args):
+    return _worker_system.run_shard(*args)
+
+
+class ParallelSimulationSystem(object):
+    '''
+    Runs the dialogues of a :class:`SimulationSystem` in several worker processes. Every worker is forked from this process
+    and builds its own simulator and agent. The evaluation statistics of the dialogues are merged back in dialogue order
+    and printed as one summary, as done by :func:`Agent.AgentFactory.power_down_factory`.
+
+    Only meant for evaluation: the policies of the workers are neither merged nor saved, so learning should be off.
+    Supervised dialogues are not run. As the workers are forked, no tensorflow session must have been created in this
+    process before: if a :class:`SimulationSystem` has already been built here (see :func:`can_fork_workers`), the
+    dialogues are run in this process by a new :class:`SimulationSystem` instead.
+
+    With ``[simulate] deterministic = True`` every dialogue is seeded from the seed of the run and its index, so the results
+    do not depend on the number of workers. Otherwise every shard of dialogues is seeded once.
+    '''
+    def __init__(self, error_rate, num_workers=None):
+        '''
+        :param error_rate: error rate of the simulated environment
+        :type error_rate: float
+        :param num_workers: number of worker processes, default is [simulate] numworkers or the number of cpus
+        :type num_workers: int
+        '''
+        self.error_rate = error_rate
+        self.num_workers = num_workers
+        self.deterministic = False
+        self.base_seed = new_base_seed()
+        if self.num_workers is None and Settings.config.has_option("simulate", "numworkers"):
+            self.num_workers = Settings.config.getint("simulate", "numworkers")
+        if self.num_workers is None or self.num_workers < 1:
+            self.num_workers = multiprocessing.cpu_count()
+        if Settings.config.has_option("simulate", "deterministic"):
+            self.deterministic = Settings.config.getboolean("simulate", "deterministic")
+        if Settings.config.has_option("exec_config", "supervised") and \
+                Settings.config.getboolean("exec_config", "supervised"):
+            logger.warning('Supervised dialogues are not run by the parallel simulation')
+
+    def _shards(self, numDialogs):
+        # a few shards per worker to balance dialogues of different length
+        num_shards = min(numDialogs, 4 * self.num_workers)
+        bounds = [numDialogs * k // num_shards for k in range(num_shards + 1)]
+        return [range(bounds[k], bounds[k + 1]) for k in range(num_shards)]
+
+    def run_dialogs(self, numDialogs):
+        '''
+        Runs the given number of dialogues in the worker processes and prints the evaluation summary.
+
+        :param numDialogs: number of dialogues to run
+        :type numDialogs: int
+        :return: None
+        '''
+        if not can_fork_workers():
+            logger.warning('An agent has already been built in this process, running the dialogues without workers')
+            SimulationSystem(self.error_rate).run_dialogs(numDialogs)
+            return
+        evaluation_manager = EvaluationManager()
+        if numDialogs > 0:
+            ContextLogger.flushLoggingHandlers()
+            pool = multiprocessing.Pool(min(self.num_workers, numDialogs), _init_worker, (self.error_rate,))
+            try:
+                shards = [(shard, self.base_seed, self.deterministic) for shard in self._shards(numDialogs)]
+                for results in pool.map(_run_worker_shard, shards, chunksize=1):
+                    for _, statistics in results:
+                        evaluation_manager.add_statistics(statistics)
+            finally:
+                pool.terminate()
+                pool.join()
+        evaluation_manager.print_summary()
+
+
 if __name__ == '__main__':
     parser = argparse.ArgumentParser(description='Simulate')
     parser.add_argument('-C', '-c', '--config', help='set config file', required=True, type=argparse.FileType('r'))
@@ -341,6 +495,7 @@ if __name__ == '__main__':
     parser.add_argument('--nocolor', dest='use_color',action='store_false', help='no color in logging. best to\
                         turn off if dumping to file. Will be overriden by [logging] config setting of "usecolor=".')
     parser.add_argument('-s', '--seed', help='set random seed', type=int)
+    parser.add_argument('-w', '--workers', help='set the number of worker processes', type=int)
     args = parser.parse_args()
     if args.error is None:
         args.error = 0      # default simulated error rate
@@ -352,7 +507,12 @@ if __name__ == '__main__':
     logger.info("Random Seed is {}".format(seed))
     Ontology.init_global_ontology()
 
-    simulator = SimulationSystem(error_rate=float(args.error)/100)
+    if args.workers is None and Settings.config.has_option("simulate", "numworkers"):
+        args.workers = Settings.config.getint("simulate", "numworkers")
+    if args.workers is not None and args.workers != 1:
+        simulator = ParallelSimulationSystem(error_rate=float(args.error)/100, num_workers=args.workers)
+    else:
+        simulator = SimulationSystem(error_rate=float(args.error)/100)
     simulator.run_dialogs(args.number)
 
 
@@ -45,6 +45,7 @@ from collections import defaultdict
 import math
 import pprint
 import copy
+import json
 
 from utils import ContextLogger, dact
 from policy import SummaryUtils
@@ -69,6 +70,7 @@ class BeliefTracker(object):
         self.domainString = domainString
         self.CONDITIONAL_BELIEF_PROB = 0.8
         self.summaryaction = SummaryAction.SummaryAction(domainString)
+        self._parsed_acts = {}  # memoised parses of the act strings, see _parseSystemAct and _parseUserHyp
     
     ##################################################
     # interface methods
@@ -96,7 +98,7 @@ class BeliefTracker(object):
         Does the actual belief tracking via tracker.addTurn
 
         :param lastact: last system dialgoue act
-        :type lastact: string
+        :type lastact: :class:`utils.dact.Act`
 
         :param obs: current observation
         :type obs: list
@@ -111,7 +113,7 @@ class BeliefTracker(object):
         last_feature = None
         
         if self.prevbelief is not None and 'features' in self.prevbelief.keys():
-            last_feature = copy.deepcopy(self.prevbelief['features'])
+            last_feature = self.prevbelief['features']    # replaced, not modified, by _updateMactFeat
  
         if self.turn == 0:
             self.prevbelief = self._init_belief(constraints)
@@ -119,11 +121,13 @@ class BeliefTracker(object):
         self.prevbelief = self._updateBelief(curturn)
 #         self._print_belief()
         
-        logger.debug(pprint.pformat(curturn))
+        if logger.isEnabledFor(ContextLogger.DEBUG):
+            logger.debug(pprint.pformat(curturn))
 
         self._updateMactFeat(last_feature, lastact)
         self.turn += 1
-        logger.debug(self.str())
+        if logger.isEnabledFor(ContextLogger.DEBUG):
+            logger.debug(self.str())
 #         self._printTopBeliefs()
 
         return self.prevbelief
@@ -167,7 +171,7 @@ class BeliefTracker(object):
                                 constraints[slot] = [val]
                             else:
                                 constraints[slot].append(val)
-        logger.debug("Constraints: "+str(constraints))
+        logger.debug("Constraints: %s", constraints)
         return constraints
     
     def str(self):
@@ -184,7 +188,7 @@ class BeliefTracker(object):
         Convert hypotheses to turn
         
         :param lastact: last system dialgue act
-        :type lastact: string
+        :type lastact: :class:`utils.dact.Act`
 
         :param obs: current observation
         :type obs: list
@@ -196,29 +200,74 @@ class BeliefTracker(object):
         # Last system action
         slastact = []
         if self.turn > 0:
-            slastact = dact.ParseAct(lastact, user=False)
-            slastact = BeliefTrackingUtils._transformAct(slastact, {}, 
-                                                         Ontology.global_ontology.get_ontology(self.domainString), 
-                                                         user=False)
+            slastact = self._parseSystemAct(lastact)
         curturn['output'] = {'dialog-acts': slastact}
 
         # User act hyps
         accumulated = defaultdict(float)
         for (hyp, prob) in obs:
-            hyp = dact.ParseAct(hyp)
-            hyp = BeliefTrackingUtils._transformAct(hyp, {}, Ontology.global_ontology.get_ontology(self.domainString))
-            hyp = dact.inferSlotsForAct(hyp)
-            
             prob = min(1.0, prob)
             if prob < 0:
                 prob = math.exp(prob)
-            accumulated = BeliefTrackingUtils._addprob(accumulated, hyp, prob)
+            accumulated[self._parseUserHyp(hyp)] += min(1.0, float(prob))   # as BeliefTrackingUtils._addprob
             
         sluhyps = BeliefTrackingUtils._normaliseandsort(accumulated)
         
         curturn['input'] = {'live': {'asr-hyps':[], 'slu-hyps':sluhyps}}
         
         return curturn
+
+    def parseAct(self, raw_act_text, user=True):
+        '''
+        Parses a user act hypothesis into a list of acts with their slots. Overridden by trackers of other act formats.
+
+        :param raw_act_text: the interned act, or its text with several acts separated by '|'
+        :type raw_act_text: :class:`utils.dact.Act` or string
+
+        :return: list -- the acts as dicts
+        '''
+        return dact.ParseAct(raw_act_text, user=user)
+
+    def _memoiseAct(self, key, parse):
+        parsed = self._parsed_acts.get(key)
+        if parsed is None:
+            parsed = parse()
+            if len(self._parsed_acts) >= 10000:
+                self._parsed_acts.clear()
+            self._parsed_acts[key] = parsed
+        return parsed
+
+    def _parseSystemAct(self, lastact):
+        '''
+        Parses the last system act and transforms it for the tracker. Memoised per interned act, the returned acts are copies.
+
+        :param lastact: last system dialogue act
+        :type lastact: :class:`utils.dact.Act`
+
+        :return: list -- the acts as dicts
+        '''
+        def parse():
+            slastact = dact.ParseAct(lastact, user=False)
+            return BeliefTrackingUtils._transformAct(slastact, {},
+                                                     Ontology.global_ontology.get_ontology(self.domainString),
+                                                     user=False)
+        return [dict(act, slots=list(act['slots'])) for act in self._memoiseAct((False, lastact), parse)]
+
+    def _parseUserHyp(self, hyp):
+        '''
+        Parses a user act hypothesis and transforms it for the tracker. Memoised per interned act.
+
+        :param hyp: user act hypothesis
+        :type hyp: :class:`utils.dact.Act`
+
+        :return: string -- the acts in json, the key of the hypothesis in the slu hypotheses
+        '''
+        def parse():
+            parsed = self.parseAct(hyp)
+            parsed = BeliefTrackingUtils._transformAct(parsed, {}, Ontology.global_ontology.get_ontology(self.domainString))
+            parsed = dact.inferSlotsForAct(parsed)    # if slot is "this" get slot from value if ontology is provided
+            return json.dumps(parsed)
+        return self._memoiseAct((True, hyp), parse)
     
     def _init_belief(self, constraints=None):
         '''
@@ -303,7 +352,7 @@ class BeliefTracker(object):
         :type last_feature: dict
         
         :param lastact: last system dialgoue act
-        :type lastact: string
+        :type lastact: :class:`utils.dact.Act`
 
         :return: None
         '''
@@ -330,7 +379,7 @@ class BeliefTracker(object):
             if BeliefTrackingUtils._hasType(last_system_act, 'canthelp'):
                 informedVenueSinceNone = []
             else:
-                informedVenueSinceNone = last_feature['informedVenueSinceNone']
+                informedVenueSinceNone = list(last_feature['informedVenueSinceNone'])
             if BeliefTrackingUtils._hasTypeSlot(last_system_act, 'offer', 'name'):
                 venue = BeliefTrackingUtils._getTypeSlot(last_system_act, 'offer', 'name')
                 venue = self._list2str_bugfix(venue)
@@ -39,6 +39,8 @@ __author__ = "cued_dialogue_systems_group"
 
 import json
 import copy
+import collections
+import numpy as np
 
 
 def _hasType(action, act):
@@ -265,4 +267,106 @@ def order_using(l, lookup):
     return sorted(l, key = _index)
 
 
+class SlotValues(object):
+    '''
+    The values of an informable slot in the order of the ontology, followed by 'dontcare' and '**NONE**', and the index
+    of each of them. Shared by all the :class:`SlotBelief` of the slot.
+    '''
+    def __init__(self, values):
+        self.keys = tuple(v for v in values if v not in ('dontcare', '**NONE**')) + ('dontcare', '**NONE**')
+        self.index = dict((v, i) for i, v in enumerate(self.keys))
+        self.none = self.index['**NONE**']
+
+    def __len__(self):
+        return len(self.keys)
+
+
+class SlotBelief(collections.Mapping):
+    '''
+    Belief of an informable slot stored as a numpy vector indexed by :class:`SlotValues`. Reads like the dict of
+    value-prob pairs of the other trackers, values which are not in the ontology are kept in a small dict aside.
+
+    The trackers replace the belief of a slot instead of updating it, so a belief can be shared between turns.
+    '''
+    def __init__(self, slotValues, probs=None, extra=None):
+        self.slotValues = slotValues
+        self.probs = np.zeros(len(slotValues)) if probs is None else probs
+        self.extra = {} if extra is None else extra
+
+    @classmethod
+    def fromDict(cls, slotValues, slot_belief):
+        probs = np.fromiter((slot_belief.get(value, 0.0) for value in slotValues.keys), float, len(slotValues))
+        extra = dict((value, p) for value, p in slot_belief.iteritems() if value not in slotValues.index)
+        return cls(slotValues, probs, extra)
+
+    def __getitem__(self, value):
+        i = self.slotValues.index.get(value)
+        if i is None:
+            return self.extra[value]
+        return self.probs.item(i)
+
+    def __setitem__(self, value, p):
+        i = self.slotValues.index.get(value)
+        if i is None:
+            self.extra[value] = p
+        else:
+            self.probs[i] = p
+
+    def __contains__(self, value):
+        return value in self.slotValues.index or value in self.extra
+
+    def __iter__(self):
+        return iter(self.keys())
+
+    def __len__(self):
+        return len(self.slotValues) + len(self.extra)
+
+    def get(self, value, default=None):
+        i = self.slotValues.index.get(value)
+        if i is None:
+            return self.extra.get(value, default)
+        return self.probs.item(i)
+
+    def keys(self):
+        return list(self.slotValues.keys) + self.extra.keys()
+
+    def values(self):
+        return self.probs.tolist() + self.extra.values()
+
+    def items(self):
+        return zip(self.slotValues.keys, self.probs.tolist()) + self.extra.items()
+
+    def iterkeys(self):
+        return iter(self.keys())
+
+    def itervalues(self):
+        return iter(self.values())
+
+    def iteritems(self):
+        return iter(self.items())
+
+    def copy(self):
+        return SlotBelief(self.slotValues, self.probs.copy(), dict(self.extra))
+
+    def total(self):
+        '''
+        :return: float -- sum of the probabilities of all the values but '**NONE**'
+        '''
+        return self.probs.sum() - self.probs[self.slotValues.none] + sum(self.extra.itervalues())
+
+    def top(self):
+        '''
+        :return: (value, prob) -- the value with the largest belief, the first one in the ontology order on ties
+        '''
+        i = int(self.probs.argmax())
+        value, p = self.slotValues.keys[i], self.probs.item(i)
+        for v, q in self.extra.iteritems():
+            if q > p:
+                value, p = v, q
+        return value, p
+
+    def __repr__(self):
+        return repr(dict(self.items()))
+
+
 #END OF FILE
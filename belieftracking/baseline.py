@@ -31,11 +31,16 @@ Copyright CUED Dialogue Systems Group 2015 - 2017
         "Baseline" and "Focus" trackers from the DSTC challenge. Some unused things have been removed from the DST version
         here - just to keep PyDial simple. 
 
+        With ``arraybeliefs = True`` in ``[policy]`` or ``[policy_<domain>]`` the focus trackers (and the SGD tracker) keep the
+        belief of each informable slot as a :class:`belieftracking.BeliefTrackingUtils.SlotBelief`, a numpy vector in the
+        order of the ontology, and update it with vector operations.
+
 
 .. seealso:: CUED Imports/Dependencies: 
 
     import :mod:`utils.Settings` |.|
     import :class:`belieftracking.BeliefTracker.BeliefTracker` |.|
+    import :mod:`belieftracking.BeliefTrackingUtils` |.|
     import :mod:`ontology.Ontology` |.|
     import :mod:`utils.ContextLogger`
 
@@ -47,8 +52,10 @@ Copyright CUED Dialogue Systems Group 2015 - 2017
 __author__ = "cued_dialogue_systems_group"
 
 import copy
+import numpy as np
 from collections import defaultdict
 from BeliefTracker import BeliefTracker
+from BeliefTrackingUtils import SlotBelief, SlotValues
 from ontology import Ontology
 from utils import ContextLogger
 from policy import SummaryAction
@@ -227,6 +234,87 @@ class RuleBasedTracker(BeliefTracker):
         super(RuleBasedTracker, self).__init__(domainString)
 
         self.summaryaction = SummaryAction.SummaryAction(domainString)
+        self._goalBeliefs = {}  # slot -> (goal labels, belief of the slot built from them), see _tobelief
+
+        # keep the belief of each informable slot as a numpy vector in the order of the ontology, see SlotBelief
+        self.arrayBeliefs = False
+        if Settings.config.has_option('policy', 'arraybeliefs'):
+            self.arrayBeliefs = Settings.config.getboolean('policy', 'arraybeliefs')
+        if Settings.config.has_option('policy_'+domainString, 'arraybeliefs'):
+            self.arrayBeliefs = Settings.config.getboolean('policy_'+domainString, 'arraybeliefs')
+        self._slotValues = {}
+
+    def _getSlotValues(self, slot):
+        if slot not in self._slotValues:
+            self._slotValues[slot] = SlotValues(
+                Ontology.global_ontology.get_informable_slot_values(self.domainString, slot))
+        return self._slotValues[slot]
+
+    def _init_belief(self, constraints=None):
+        belief = super(RuleBasedTracker, self)._init_belief(constraints)
+        if self.arrayBeliefs:
+            for slot in Ontology.global_ontology.get_informable_slots_and_values(self.domainString):
+                if constraints is None:     # nothing known yet
+                    belief['beliefs'][slot] = SlotBelief(self._getSlotValues(slot))
+                    belief['beliefs'][slot]['**NONE**'] = 1.0
+                else:
+                    belief['beliefs'][slot] = SlotBelief.fromDict(self._getSlotValues(slot), belief['beliefs'][slot])
+        return belief
+
+    def _updateGoalLabels(self, goal_labels, this_u):
+        '''
+        Focus update of the goal labels: the labels of a slot are scaled down by the probability that the user did not
+        inform the slot in this turn and the informed values are added.
+
+        :param goal_labels: goal labels of the previous turn, updated in place
+        :type goal_labels: dict
+
+        :param this_u: probability of each informed value of each slot in this turn
+        :type this_u: dict
+
+        :return: None
+        '''
+        if self.arrayBeliefs:
+            # the labels of a slot are its belief, replaced only when the slot is informed
+            for slot, informed in this_u.iteritems():
+                q = max(0.0, 1.0-sum(informed.values())) # clipping at zero because rounding errors
+                slotValues = self._getSlotValues(slot)
+                if slot in goal_labels:
+                    probs = goal_labels[slot].probs * q
+                    extra = dict((value, p*q) for value, p in goal_labels[slot].extra.iteritems())
+                else:
+                    probs = np.zeros(len(slotValues))
+                    extra = {}
+                probs[slotValues.none] = 0.0
+                for value, p in informed.iteritems():
+                    if value in slotValues.index and value != '**NONE**':
+                        probs[slotValues.index[value]] += p
+                    else:
+                        extra[value] = extra.get(value, 0.0) + p
+                total_p = probs.sum() + sum(extra.itervalues())
+                if total_p > 1.0:
+                    probs /= total_p
+                    extra = dict((value, p/total_p) for value, p in extra.iteritems())
+                    total_p = probs.sum() + sum(extra.itervalues())
+                probs[slotValues.none] = 1.0 - total_p
+                goal_labels[slot] = SlotBelief(slotValues, probs, extra)
+            return
+
+        for slot in set(this_u.keys() + goal_labels.keys()) :
+            q = max(0.0,1.0-sum([this_u[slot][value] for value in this_u[slot]])) # clipping at zero because rounding errors
+            if slot not in goal_labels :
+                goal_labels[slot] = {}
+
+            for value in goal_labels[slot] :
+                goal_labels[slot][value] *= q
+            prev_values = goal_labels[slot].keys()
+            for value in this_u[slot] :
+                if value in prev_values :
+                    goal_labels[slot][value] += this_u[slot][value]
+                else :
+                    goal_labels[slot][value]=this_u[slot][value]
+
+            goal_labels[slot] = normalise_dict(goal_labels[slot])
         
     def _updateBelief(self, turn):
         '''
@@ -266,17 +354,31 @@ class RuleBasedTracker(BeliefTracker):
         belief = {}
         for slot in Ontology.global_ontology.get_informable_slots_and_values(self.domainString):
             if slot in track['goal-labels']:
+                goal_labels = track['goal-labels'][slot]
+                if isinstance(goal_labels, SlotBelief):   # already the belief of the slot
+                    belief[slot] = goal_labels
+                    continue
+                built = self._goalBeliefs.get(slot)
+                if built is not None and built[1] is prev_belief['beliefs'].get(slot) and built[0] == goal_labels:
+                    # labels unchanged since the previous turn: share its belief of the slot instead of rebuilding it
+                    belief[slot] = built[1]
+                    continue
                 infom_slot_vals = Ontology.global_ontology.get_informable_slot_values(self.domainString,slot)
                 # su259: user simulator may issue a dontcare for all informable slots, not only system requestable
 #                 if slot not in Ontology.global_ontology.get_system_requestable_slots(self.domainString):
 #                     belief[slot] = dict.fromkeys(infom_slot_vals, 0.0)
 #                 else:
                 belief[slot] = dict.fromkeys(infom_slot_vals+['dontcare'], 0.0)
-                for v in track['goal-labels'][slot]:
-                    belief[slot][v] = track['goal-labels'][slot][v]
+                for v in goal_labels:
+                    belief[slot][v] = goal_labels[v]
                 belief[slot]['**NONE**'] = 1.0 - sum(belief[slot].values())
+                self._goalBeliefs[slot] = (dict(goal_labels), belief[slot])
             elif 'denied-goals' in track: # if in denied goals all values to 0, dontcare to 1
-                if slot in track['denied-goals']:
+                if slot in track['denied-goals'] and self.arrayBeliefs:
+                    belief[slot] = SlotBelief(self._getSlotValues(slot))
+                    belief[slot]['dontcare'] = 1.0
+                    belief[slot]['**NONE**'] = 0.0
+                elif slot in track['denied-goals']:
                     infom_slot_vals = Ontology.global_ontology.get_informable_slot_values(self.domainString,slot)
                     belief[slot] = dict.fromkeys(infom_slot_vals+['dontcare'], 0.0)
                     belief[slot]['dontcare'] = 1.0
@@ -359,7 +461,6 @@ class BaselineTracker(RuleBasedTracker):
     def __init__(self, domainString):
         super(BaselineTracker, self).__init__(domainString)
         self.restart()
-        self.lastInformedVenue = ""        
         
     def _addTurn(self, turn):
         '''
@@ -370,7 +471,7 @@ class BaselineTracker(RuleBasedTracker):
         
         :return: None
         '''
-        hyps = copy.deepcopy(self.hyps)
+        hyps = copy_hyps(self.hyps)
         if "dialog-acts" in turn["output"] :
             mact = turn["output"]["dialog-acts"]
         else :
@@ -455,6 +556,7 @@ class BaselineTracker(RuleBasedTracker):
         Reset the hypotheses
         '''
         super(BaselineTracker, self).restart()
+        self.lastInformedVenue = ""
         self.hyps = {"goal-labels":{}, "goal-labels-joint":[], "requested-slots":{}, "method-label":{}, "discourseAct-labels":{}}
     
 class FocusTracker(RuleBasedTracker):
@@ -465,7 +567,6 @@ class FocusTracker(RuleBasedTracker):
     def __init__(self,domainString):
         super(FocusTracker, self).__init__(domainString)
         self.restart()
-        self.lastInformedVenue = ""
 
     def _addTurn(self, turn):
         '''
@@ -477,7 +578,7 @@ class FocusTracker(RuleBasedTracker):
         :return: None
         '''
 
-        hyps = copy.deepcopy(self.hyps)
+        hyps = copy_hyps(self.hyps)
         if "dialog-acts" in turn["output"] :
             mact = turn["output"]["dialog-acts"]
         else :
@@ -499,22 +600,7 @@ class FocusTracker(RuleBasedTracker):
             discourseAct_stats[discourseAct] += score
 
 
-        for slot in set(this_u.keys() + hyps["goal-labels"].keys()) :
-            q = max(0.0,1.0-sum([this_u[slot][value] for value in this_u[slot]])) # clipping at zero because rounding errors
-            if slot not in hyps["goal-labels"] :
-                hyps["goal-labels"][slot] = {}
-                
-            for value in hyps["goal-labels"][slot] :
-                
-                hyps["goal-labels"][slot][value] *= q
-            prev_values = hyps["goal-labels"][slot].keys()
-            for value in this_u[slot] :
-                if value in prev_values :
-                    hyps["goal-labels"][slot][value] += this_u[slot][value]
-                else :
-                    hyps["goal-labels"][slot][value]=this_u[slot][value]
-        
-            hyps["goal-labels"][slot] = normalise_dict(hyps["goal-labels"][slot])
+        self._updateGoalLabels(hyps["goal-labels"], this_u)
         
         # method node, in 'focus' manner:
         q = min(1.0,max(0.0,method_stats["none"]))
@@ -563,6 +649,7 @@ class FocusTracker(RuleBasedTracker):
         Reset the hypotheses
         '''
         super(FocusTracker, self).restart()
+        self.lastInformedVenue = ""
         self.hyps = {"goal-labels":{},"method-label":{}, "requested-slots":{}}
     
 
@@ -582,6 +669,31 @@ def normalise_dict(x) :
     return dict(x_items)
 
 
+def copy_hyps(hyps):
+    '''
+    Copies the hypotheses of the trackers for the next turn. A tracker updates the dicts and lists of the hypotheses and
+    the labels of each goal slot in place, so these are copied, the values (labels, scores and acts) are shared.
+
+    :param hyps: tracker hypotheses
+    :type hyps: dict
+
+    :return: dict -- copy of the hypotheses
+    '''
+    copied = {}
+    for key, value in hyps.iteritems():
+        if key == "goal-labels":
+            # the labels of the array trackers are replaced, not updated
+            copied[key] = dict((slot, labels if isinstance(labels, SlotBelief) else dict(labels))
+                               for slot, labels in value.iteritems())
+        elif isinstance(value, dict):
+            copied[key] = dict(value)
+        elif isinstance(value, list):
+            copied[key] = list(value)
+        else:
+            copied[key] = value
+    return copied
+
+
 
 
 #END OF FILE
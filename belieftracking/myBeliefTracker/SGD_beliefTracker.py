@@ -1,4 +1,4 @@
-from ..baseline import RuleBasedTracker
+from ..baseline import RuleBasedTracker, copy_hyps
 import copy
 from collections import defaultdict
 import math
@@ -217,14 +217,13 @@ class SGDBeliefTracker(RuleBasedTracker):
     def __init__(self, dstring):
         super(SGDBeliefTracker, self).__init__(dstring)
         self.restart()
-        self.lastInformedVenue = ""
 
     def update_belief_state(self, lastact, obs, constraints=None):
         '''
         Does the actual belief tracking via tracker.addTurn
 
         :param lastact: last system dialgoue act
-        :type lastact: string
+        :type lastact: :class:`utils.dact.Act`
 
         :param obs: current observation
         :type obs: list
@@ -238,15 +237,15 @@ class SGDBeliefTracker(RuleBasedTracker):
         last_feature = None
         
         if self.prevbelief is not None and 'features' in self.prevbelief.keys():
-            last_feature = copy.deepcopy(self.prevbelief['features'])
+            last_feature = self.prevbelief['features']    # replaced, not modified, by _updateMactFeat
  
         if self.turn == 0:
             self.prevbelief = self._init_belief(constraints)
 
-        curturn['lastSysAct'] = lastact
+        curturn['lastSysAct'] = dact.ActText(lastact)
         curturn['lastUserAct'] = None
         if obs:
-            curturn['lastUserAct'] = obs[0][0]
+            curturn['lastUserAct'] = dact.ActText(obs[0][0])
         self.prevbelief = self._updateBelief(curturn)   
         
         self._updateMactFeat(last_feature, lastact) 
@@ -257,51 +256,11 @@ class SGDBeliefTracker(RuleBasedTracker):
             
         return self.prevbelief
 
-    def _convertHypToTurn(self, lastact, obs):
-        '''
-        Convert hypotheses to turn
-        
-        :param lastact: last system dialogue act
-        :type lastact: string
-
-        :param obs: current observation
-        :type obs: list
-        
-        :return: dict -- turn dict
-        '''
-        curturn = {'turn-index': self.turn}
-        
-        # Last system action
-        slastact = []
-        if self.turn > 0:
-            slastact = dact.ParseAct(lastact, user=False)
-            slastact = BeliefTrackingUtils._transformAct(slastact, {}, 
-                                                         Ontology.global_ontology.get_ontology(self.domainString), 
-                                                         user=False)
-        curturn['output'] = {'dialog-acts': slastact}
-
-        # User act hyps
-        accumulated = defaultdict(float)
-        for (hyp, prob) in obs:
-            hyp = self.parseAct(hyp)
-            hyp = BeliefTrackingUtils._transformAct(hyp, {}, Ontology.global_ontology.get_ontology(self.domainString))
-            hyp = dact.inferSlotsForAct(hyp)    # if slot is "this" get slot from value if ontology is provided
-            
-            prob = min(1.0, prob)
-            if prob < 0:
-                prob = math.exp(prob)
-            accumulated = BeliefTrackingUtils._addprob(accumulated, hyp, prob)
-            
-        sluhyps = BeliefTrackingUtils._normaliseandsort(accumulated)
-        
-        curturn['input'] = {'live': {'asr-hyps':[], 'slu-hyps':sluhyps}}
-        
-        return curturn
-    
     def parseAct(self, raw_act_text, user=True):
         final = []
         
-        for act_text in raw_act_text.split("|") :
+        act_texts = [raw_act_text] if isinstance(raw_act_text, dact.Act) else raw_act_text.split("|")
+        for act_text in act_texts :
             try:
                 final += self._parseAct(act_text, user=user)
             except RuntimeError:
@@ -310,7 +269,10 @@ class SGDBeliefTracker(RuleBasedTracker):
 
     def _parseAct(self, raw_act_text, user=True):
     
-        raw_act = self.__parseAct(raw_act_text)
+        if isinstance(raw_act_text, dact.Act):
+            raw_act = dact._RawAct(raw_act_text)
+        else:
+            raw_act = self.__parseAct(raw_act_text)
         final_dialog_act = []
 
         if raw_act['act'] == "SELECT" and user :
@@ -504,7 +466,7 @@ class SGDBeliefTracker(RuleBasedTracker):
         turn => {'output': {'dialog-acts': [{'slots': [('slot', 'intent')], 'act': 'request'}]}, 'turn-index': 19, 'input': {'live': {'asr-hyps': [], 'slu-hyps': [{'slu-hyp': [{u'slots': [[u'intent', None]], u'act': u'REQUEST'}], 'score': 1.0}]}}}
         '''
         
-        hyps = copy.deepcopy(self.hyps)
+        hyps = copy_hyps(self.hyps)
         if "dialog-acts" in turn["output"] :
             mact = turn["output"]["dialog-acts"]
         else :
@@ -532,23 +494,7 @@ class SGDBeliefTracker(RuleBasedTracker):
                 if slot not in hyps["denied-goals"]:
                     hyps["denied-goals"].append(slot)
         
-        for slot in set(this_u.keys() + hyps["goal-labels"].keys()) :
-            q = max(0.0,1.0-sum([this_u[slot][value] for value in this_u[slot]])) # clipping at zero because rounding errors
-            
-            if slot not in hyps["goal-labels"] :
-                hyps["goal-labels"][slot] = {}
-                
-            for value in hyps["goal-labels"][slot] :
-                hyps["goal-labels"][slot][value] *= q
-
-            prev_values = hyps["goal-labels"][slot].keys()
-            for value in this_u[slot] :
-                if value in prev_values :
-                    hyps["goal-labels"][slot][value] += this_u[slot][value]
-                else :
-                    hyps["goal-labels"][slot][value]=this_u[slot][value]
-        
-            hyps["goal-labels"][slot] = normalise_dict(hyps["goal-labels"][slot])
+        self._updateGoalLabels(hyps["goal-labels"], this_u)
         
         # method node, in 'focus' manner:
         q = min(1.0,max(0.0,method_stats["none"]))
@@ -599,4 +545,5 @@ class SGDBeliefTracker(RuleBasedTracker):
         Reset some private members
         '''
         super(SGDBeliefTracker, self).restart()
+        self.lastInformedVenue = ""
         self.hyps = {"goal-labels":{},"method-label":{}, "requested-slots":{}}
\ No newline at end of file
@@ -387,5 +387,37 @@ class EvaluationManager(object):
             if self.domainEvaluators[dstring] is not None:
                 self.domainEvaluators[dstring].print_summary()
 
+    def pop_statistics(self):
+        '''
+        Returns the statistics recorded by the domain evaluators since the last call and clears them. Used by the parallel
+        simulation to send the statistics of each dialogue from the workers back to the main process.
+
+        :returns: dict -- mapping of domain to the (rewards, outcomes, turns, finalrewards) lists of its evaluator
+        '''
+        statistics = {}
+        for dstring, evaluator in self.domainEvaluators.iteritems():
+            if evaluator is not None and (evaluator.rewards or evaluator.finalrewards):
+                statistics[dstring] = (evaluator.rewards, evaluator.outcomes, evaluator.turns, evaluator.finalrewards)
+                evaluator.rewards, evaluator.outcomes, evaluator.turns, evaluator.finalrewards = [], [], [], []
+        return statistics
+
+    def add_statistics(self, statistics):
+        '''
+        Appends statistics returned by :func:`pop_statistics` to the domain evaluators, booting them up if necessary, so that
+        :func:`print_summary` covers them.
+
+        :param statistics: mapping of domain to the (rewards, outcomes, turns, finalrewards) lists
+        :type statistics: dict
+        :returns: None
+        '''
+        for dstring, (rewards, outcomes, turns, finalrewards) in statistics.iteritems():
+            if self.domainEvaluators[dstring] is None:
+                self._bootup_domain(dstring)
+            evaluator = self.domainEvaluators[dstring]
+            evaluator.rewards.extend(rewards)
+            evaluator.outcomes.extend(outcomes)
+            evaluator.turns.extend(turns)
+            evaluator.finalrewards.extend(finalrewards)
+
 
 # END OF FILE
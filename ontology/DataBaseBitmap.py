@@ -0,0 +1,227 @@
+###############################################################################
+# PyDial: Multi-domain Statistical Spoken Dialogue System Software
+###############################################################################
+#
+# Copyright 2015 - 2019
+# Cambridge University Engineering Department Dialogue Systems Group
+#
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+###############################################################################
+
+'''
+DataBaseBitmap.py - in memory database with bitmap indexes
+==========================================================
+
+Copyright CUED Dialogue Systems Group 2015 - 2017
+
+Loads the table of a sqlite database file (domainTag-dbase.db in ontology/ontologies) into memory once and keeps a bitmap of
+the matching entities for every (slot, value) pair. A query is answered by ANDing the bitmaps of its constraints, so no SQL
+is run after loading. Matching follows the sqlite queries of :class:`DataBase_SQLite`: '=' ignores the (ASCII) case, '!='
+does not, and entities where the slot is not set never match.
+
+Selected per domain in the config::
+
+    [ontology_CamRestaurants]
+    database = bitmap    # or sqlite (default)
+
+.. Note::
+    Called by :mod:`ontology.FlatOntologyManager` to load the database of a domain
+
+.. seealso:: CUED Imports/Dependencies:
+
+    import :mod:`utils.ContextLogger` |.|
+    import :mod:`ontology.DataBase` |.|
+    import :mod:`utils.Settings` |.|
+
+************************
+
+'''
+
+__author__ = "cued_dialogue_systems_group"
+import sqlite3
+import numpy as np
+from utils import Settings
+from DataBase import DataBaseINTERFACE
+from utils import ContextLogger
+logger = ContextLogger.getLogger('')
+
+_ASCII_LOWER = dict((ord(c), ord(c.lower())) for c in 'ABCDEFGHIJKLMNOPQRSTUVWXYZ')
+
+
+def _nocase(value):
+    '''Key of the value under sqlite's NOCASE collation, which only folds ASCII letters.
+    '''
+    if isinstance(value, unicode):
+        return value.translate(_ASCII_LOWER)
+    elif isinstance(value, str):
+        return value.lower()
+    return value
+
+
+class DataBase_Bitmap(DataBaseINTERFACE):
+    '''In memory access to entities through bitmap indexes. Same interface as :class:`DataBase_SQLite`; the returned entities
+    are shared between calls and must not be modified.
+    '''
+    def __init__(self, dbfile, dstring):
+        self.domain = dstring
+        self.entities = []
+        self.columns = []
+        self._loaddb(dbfile)
+        self._build_bitmaps()
+
+    def _loaddb(self, dbfile):
+        '''Sets self.entities and self.columns
+        '''
+        try:
+            db_connection = sqlite3.connect(dbfile)
+            cursor = db_connection.cursor()
+            cursor.execute('select * from {}'.format(self.domain))
+            self.columns = [col[0] for col in cursor.description]
+            self.entities = [dict(zip(self.columns, row)) for row in cursor.fetchall()]
+            db_connection.close()
+        except Exception as e:
+            print e
+            logger.error('Could not load database file: %s' % dbfile)
+        return
+
+    def _build_bitmaps(self):
+        '''One bitmap per (slot, value) pair, both ignoring the case (for '=') and exact (for '!='), and one per slot of the
+        entities where the slot is set.
+        '''
+        num = len(self.entities)
+        self._all = np.ones(num, dtype=bool)
+        self._nocase_bitmaps = {}
+        self._exact_bitmaps = {}
+        self._set_bitmaps = {}
+        for slot in self.columns:
+            nocase, exact = {}, {}
+            for idx, ent in enumerate(self.entities):
+                value = ent[slot]
+                if value is None:
+                    continue
+                nocase.setdefault(_nocase(value), []).append(idx)
+                exact.setdefault(value, []).append(idx)
+            self._nocase_bitmaps[slot] = dict((value, self._bitmap(rows)) for value, rows in nocase.iteritems())
+            self._exact_bitmaps[slot] = dict((value, self._bitmap(rows)) for value, rows in exact.iteritems())
+            self._set_bitmaps[slot] = self._bitmap([idx for idx, ent in enumerate(self.entities) if ent[slot] is not None])
+
+    def _bitmap(self, rows):
+        bitmap = np.zeros(len(self.entities), dtype=bool)
+        bitmap[rows] = True
+        return bitmap
+
+    def _lookup(self, bitmaps, value):
+        bitmap = bitmaps.get(value)
+        if bitmap is None and not isinstance(value, basestring):
+            bitmap = bitmaps.get(_nocase(unicode(value)))    # numbers are compared as text in the TEXT columns
+        return bitmap
+
+    def _constraint_bitmap(self, slot, op, value):
+        if slot not in self._set_bitmaps:
+            raise KeyError('no such column: ' + slot)
+        if value is None:
+            return None
+        if op == '!=':
+            bitmap = self._lookup(self._exact_bitmaps[slot], value)
+            if bitmap is None:
+                return self._set_bitmaps[slot]
+            return self._set_bitmaps[slot] & ~bitmap
+        return self._lookup(self._nocase_bitmaps[slot], _nocase(value))
+
+    def _match(self, constraints):
+        '''Bitmap of the entities matching all the constraints.
+
+        :param constraints: features. Dict {slot:value, ...} or List [(slot, op, value), ...]
+        :returns: (tuple) numpy bool array or None if nothing matches, and whether any constraint was applied
+        '''
+        if isinstance(constraints, list):
+            triples = []
+            for const in constraints:
+                if const.op == '=' and const.val == 'dontcare':
+                    continue       # NB assume no != 'dontcare' case occurs - so not handling
+                if const.op == '!=' and const.val != 'dontcare':
+                    triples.append((const.slot, '!=', const.val))
+                else:
+                    triples.append((const.slot, '=', const.val))
+        elif isinstance(constraints, dict):
+            triples = [(slot, '=', value) for slot, value in constraints.iteritems() if value != 'dontcare']
+        else:
+            triples = []
+
+        match = self._all
+        for slot, op, value in triples:
+            bitmap = self._constraint_bitmap(slot, op, value)
+            if bitmap is None:
+                return None, True
+            match = match & bitmap
+        return match, len(triples) > 0
+
+    def entity_by_features(self, constraints):
+        '''Retrieves from database all entities matching the given constraints.
+
+        :param constraints: features. Dict {slot:value, ...} or List [(slot, op, value), ...] \
+        (NB. the tuples in the list are actually a :class:`dact` instances)
+        :returns: (list) all entities (each a dict)  matching the given features.
+        '''
+        try:
+            match, constrained = self._match(constraints)
+        except KeyError as e:
+            logger.error('bitmap database error ' + str(e))
+            return []
+        if match is None:
+            return []
+        results = [self.entities[idx] for idx in np.flatnonzero(match)]
+        if not constrained:
+            # NO CONSTRAINTS --> all entities in random order, as for the sqlite database
+            Settings.random.shuffle(results)
+        return results
+
+    def get_length_entity_by_features(self, constraints):
+        try:
+            match, constrained = self._match(constraints)
+        except KeyError as e:
+            logger.error('bitmap database error ' + str(e))
+            return 0
+        if match is None:
+            return 0
+        if not constrained:
+            # NO CONSTRAINTS --> entity_by_features shuffles all entities, keep its draws from Settings.random
+            return len(self.entity_by_features(constraints))
+        return int(np.count_nonzero(match))
+
+    def query_entity_property(self, name, slot, value):
+        '''
+        '''
+        bitmap = self._nocase_bitmaps['name'].get(_nocase(name))
+        results = [] if bitmap is None else np.flatnonzero(bitmap)
+        assert(len(results)==1)  # name should be a unique identifier
+        try:
+            if self.entities[results[0]][slot] == value:
+                return True
+        except:
+            pass        # some entities haven't had all values for domains slots filled in
+        return False
+
+    def get_all_entities(self):
+        return list(self.entities)
+
+    def get_num_unique_entities(self, cols = None):
+        if cols is None:
+            cols = self.columns
+        return len(set(tuple(ent[col] for col in cols) for ent in self.entities))
+
+
+
+# END OF FILE
@@ -37,6 +37,7 @@ needs to be running, like would be required for mongodb for example).
     import :mod:`utils.ContextLogger` |.|
     import :mod:`ontology.DataBase` |.|
     import :mod:`utils.Settings` |.|
+    import :class:`utils.LRUCache.LRUCache` |.|
 
 ************************
 
@@ -45,6 +46,7 @@ needs to be running, like would be required for mongodb for example).
 __author__ = "cued_dialogue_systems_group"
 import sqlite3
 from utils import Settings
+from utils.LRUCache import LRUCache
 from DataBase import DataBaseINTERFACE
 from utils import ContextLogger
 logger = ContextLogger.getLogger('')
@@ -57,34 +59,106 @@ class DataBase_SQLite(DataBaseINTERFACE):
     '''SQLite3 access to entities. No explicit schema info here-- See scripts file script_txt2JSON_or_SQLITE.py which was used
     to create databases (domainTag-dbase.db in ontology/ontologies).
     -- basically: name is the primary key, all requestable slots are columns. 
-    -- No other rules are added in SQL database regarding other lookups for commonly searched columns. Can use sql for this to optimise
-    further if desired. 
+
+    The database file is copied into memory when loaded and NOCASE indexes are added there for the informable slots, so the
+    file itself is never modified. Query results are cached by constraint set - the returned entities are shared between
+    calls and must not be modified. The cache size is set by dbcachesize in [exec_config] (0 disables the cache).
     '''
-    def __init__(self, dbfile, dstring):
-        self._loaddb(dbfile)
+    def __init__(self, dbfile, dstring, informable_slots=None):
         self.domain = dstring
+        self._loaddb(dbfile)
+        self._create_indexes(informable_slots)
         self.no_constraints_sql_query = '''select  * 
                 from {}'''.format(self.domain) 
                 
         self.limit = 10 # number of randomly returend entities
+
+        cachesize = 1000
+        if Settings.config.has_option("exec_config", "dbcachesize"):
+            cachesize = Settings.config.getint("exec_config", "dbcachesize")
+        self._entity_cache = LRUCache(cachesize)
+        self._count_cache = LRUCache(cachesize)
+        self._where_clauses = {}
     
     def _loaddb(self, dbfile):
         '''Sets self.db
         '''
         try:
-            self.db_connection = sqlite3.connect(dbfile)
+            disk_connection = sqlite3.connect(dbfile)
+            self.db_connection = sqlite3.connect(':memory:', cached_statements=500)
+            self.db_connection.executescript('\n'.join(disk_connection.iterdump()))
+            disk_connection.close()
             self.db_connection.row_factory = self._dict_factory   # for getting entities back as python dict's
             self.cursor = self.db_connection.cursor()         # we will just run 1 query - so only need a single cursor object
+            self.entity_cursor = self.db_connection.cursor()  # rows as tuples, converted with the column names once per query
+            self.entity_cursor.row_factory = None
         except Exception as e:
             print e
             logger.error('Could not load database file: %s' % dbfile)
         return
+
+    def _create_indexes(self, informable_slots=None):
+        '''Creates a NOCASE index for every informable slot which is a column of the table (every column if not given)
+        '''
+        try:
+            columns = [col['name'] for col in self.cursor.execute('pragma table_info({})'.format(self.domain)).fetchall()]
+            for slot in columns:
+                if informable_slots is None or slot in informable_slots:
+                    self.cursor.execute('''create index if not exists {0}_{1}_nocase
+                        on {0} ({1} COLLATE NOCASE)'''.format(self.domain, slot))
+        except Exception as e:
+            logger.error('Could not index database of domain %s: %s' % (self.domain, str(e)))
     
     def _dict_factory(self, cursor, row):
         d = {}
         for idx, col in enumerate(cursor.description):
             d[col[0]] = row[idx]
         return d
+
+    def _normalise_constraints(self, constraints):
+        '''Sorted tuple of (slot, op, value) without the dontcare constraints - the cache key and the shape of the sql query.
+        '''
+        normalised = set()
+        if isinstance(constraints, list):
+            for const in constraints:
+                if const.op == '=' and const.val == 'dontcare':
+                    continue       # NB assume no != 'dontcare' case occurs - so not handling
+                if const.op == '!=' and const.val != 'dontcare':
+                    normalised.add((const.slot, '!=', const.val))
+                else:
+                    normalised.add((const.slot, '=', const.val))
+        elif isinstance(constraints, dict):
+            for slot,value in constraints.iteritems():
+                if value != 'dontcare':
+                    normalised.add((slot, '=', value))
+        return tuple(sorted(normalised))
+
+    def _where_clause(self, constraints):
+        '''Where clause for the given normalised constraints. Built once per slot/op combination so that sqlite reuses the
+        prepared statement.
+        '''
+        shape = tuple((slot, op) for slot, op, _ in constraints)
+        if shape not in self._where_clauses:
+            bits = []
+            for slot, op in shape:
+                if op == '!=':
+                    bits.append(slot +'!= ?')
+                else:
+                    bits.append(slot +'= ?  COLLATE NOCASE')
+            self._where_clauses[shape] = ' where ' + ' and '.join(bits) if len(bits) else ''
+        return self._where_clauses[shape]
+
+    def _fetch_entities(self, constraints):
+        sql_query = '''select  * 
+                from {}'''.format(self.domain) + self._where_clause(constraints)
+        try:
+            self.entity_cursor.execute(sql_query, tuple(value for _, _, value in constraints))
+        except Exception as e:
+            print e     # hold to debug here
+            logger.error('sql error ' + str(e))
+            return []
+        columns = [col[0] for col in self.entity_cursor.description]
+        return [dict(zip(columns, row)) for row in self.entity_cursor.fetchall()]
     
     def entity_by_features(self, constraints):
         '''Retrieves from database all entities matching the given constraints. 
@@ -93,66 +167,52 @@ class DataBase_SQLite(DataBaseINTERFACE):
         (NB. the tuples in the list are actually a :class:`dact` instances)
         :returns: (list) all entities (each a dict)  matching the given features.
         '''
-        
-        # 1. Format constraints into sql_query 
         # NO safety checking - constraints should be a list or a dict 
         # Also no checking of values regarding none:   if const.val == [None, '**NONE**']: --> ERROR
-        doRand = False
-        
-        
-        if len(constraints):
-            bits = []
-            values = []
-            if isinstance(constraints, list):
-                for const in constraints:
-                    if const.op == '=' and const.val == 'dontcare':
-                        continue       # NB assume no != 'dontcare' case occurs - so not handling
-                    if const.op == '!=' and const.val != 'dontcare':
-                        bits.append(const.slot +'!= ?')
-                    else:
-                        bits.append(const.slot +'= ?  COLLATE NOCASE')
-                    values.append(const.val)
-            elif isinstance(constraints, dict):
-                for slot,value in constraints.iteritems():
-                    if value != 'dontcare':
-                        bits.append(slot +'= ? COLLATE NOCASE')
-                        values.append(value)
-                        
-            # 2. Finalise and Execute sql_query
-            try:
-                if len(bits):
-                    sql_query = '''select  * 
-                    from {} 
-                    where '''.format(self.domain)
-                    sql_query += ' and '.join(bits)
-                    self.cursor.execute(sql_query, tuple(values))
-                else:
-                    sql_query =  self.no_constraints_sql_query
-                    self.cursor.execute(sql_query)
-                    doRand = True
-            except Exception as e:
-                print e     # hold to debug here
-                logger.error('sql error ' + str(e))
-                
-                
-            
+        constraints = self._normalise_constraints(constraints)
+        try:
+            results = self._entity_cache.get(constraints)
+        except TypeError:
+            results = self._fetch_entities(constraints)     # unhashable values, not cached
         else:
+            if results is None:
+                results = self._fetch_entities(constraints)
+                self._entity_cache.put(constraints, results)
+        results = list(results)
+
+        if not len(constraints):
             # NO CONSTRAINTS --> get all entities in database?  
             #TODO check when this occurs ... is it better to return a single, random entity? --> returning random 10
-            
-            # 2. Finalise and Execute sql_query
-            sql_query =  self.no_constraints_sql_query
-            self.cursor.execute(sql_query)
-            doRand = True
-        
-        results = self.cursor.fetchall()        # can return directly
-        
-        if doRand:
             Settings.random.shuffle(results)
         return results
     
     def get_length_entity_by_features(self, constraints):
-        return len(self.entity_by_features(constraints))
+        normalised = self._normalise_constraints(constraints)
+        if not len(normalised):
+            # NO CONSTRAINTS --> entity_by_features shuffles all entities, keep its draws from Settings.random
+            return len(self.entity_by_features(constraints))
+        constraints = normalised
+        try:
+            results = self._entity_cache.get(constraints)
+            if results is not None:
+                return len(results)
+            count = self._count_cache.get(constraints)
+        except TypeError:
+            count = None
+            constraints = list(constraints)      # unhashable values, not cached
+        if count is None:
+            sql_query = '''select count(*) 
+                from {}'''.format(self.domain) + self._where_clause(constraints)
+            try:
+                self.entity_cursor.execute(sql_query, tuple(value for _, _, value in constraints))
+                count = self.entity_cursor.fetchone()[0]
+            except Exception as e:
+                print e     # hold to debug here
+                logger.error('sql error ' + str(e))
+                return 0
+            if isinstance(constraints, tuple):
+                self._count_cache.put(constraints, count)
+        return count
     
     def query_entity_property(self, name, slot, value):
         '''
@@ -187,6 +247,8 @@ class DataBase_SQLite(DataBaseINTERFACE):
         return results[0]['count(*)']
     
     def _customQuery(self, query):
+        self._entity_cache.clear()       # the query may change the data
+        self._count_cache.clear()
         self.cursor.execute(query)
         results = self.cursor.fetchall()
         return results
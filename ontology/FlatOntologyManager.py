@@ -32,7 +32,9 @@ Controls Access to the ontology files.
 
     import :mod:`utils.Settings` |.|
     import :mod:`utils.ContextLogger` |.|
-    import :mod:`ontology.OntologyUtils`
+    import :mod:`ontology.OntologyUtils` |.|
+    import :mod:`ontology.DataBaseSQLite` |.|
+    import :mod:`ontology.DataBaseBitmap`
 
 ************************
 
@@ -44,6 +46,7 @@ import numpy as np
 
 import os
 import DataBaseSQLite
+import DataBaseBitmap
 from ontology import OntologyUtils
 from utils import Settings, ContextLogger
 logger = ContextLogger.getLogger('')
@@ -102,8 +105,8 @@ class FlatDomainOntology(object):
     def _set_db(self):
         """Sets self.db to instance of choosen Data base accessing class. 
         
-        .. note:: It is currently hardcoded to use the sqlite method. But this can be config based - data base classes share interface
-        so only need to change class here, nothing else in code will need adjusting. 
+        .. note:: Uses the sqlite database unless database = bitmap is set in [ontology_<domain>]. The data base classes share
+        interface so only need to change class here, nothing else in code will need adjusting. 
         """
         db_fname = OntologyUtils.get_database_path(self.domainString)
         logger.info('Loading database: '+db_fname+'db')
@@ -116,7 +119,16 @@ class FlatDomainOntology(object):
                     dbprefix = None
             if dbprefix:
                 db_fname = os.path.join(dbprefix, db_fname.split('/')[-1])
-            self.db = DataBaseSQLite.DataBase_SQLite(dbfile=db_fname+'db', dstring=self.domainString)
+            database = 'sqlite'
+            if Settings.config.has_option('ontology_' + self.domainString, 'database'):
+                database = Settings.config.get('ontology_' + self.domainString, 'database').lower()
+            if database == 'bitmap':
+                self.db = DataBaseBitmap.DataBase_Bitmap(dbfile=db_fname+'db', dstring=self.domainString)
+            else:
+                if database != 'sqlite':
+                    logger.warning('Unknown database type %s for domain %s - using sqlite' % (database, self.domainString))
+                self.db = DataBaseSQLite.DataBase_SQLite(dbfile=db_fname+'db', dstring=self.domainString,
+                                                         informable_slots=self.ontology['informable'].keys())
         except IOError:
             print IOError
             logger.error("No such file or directory: "+db_fname+". Probably <Settings.root> is not set/set wrong by config.")
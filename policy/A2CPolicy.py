@@ -452,12 +452,14 @@ class A2CPolicy(Policy.Policy):
         value = self.a2c.predict_value([cState])
         policy_mu = self.mu_prob  # self.a2c.getPolicy([cState])[0][0][cAction]
 
+        # the belief state is not used for training, with compactreplay it is not kept
+        state_ori = None if self.compactreplay else state
         if self.replay_type == 'vanilla':
             self.episodes[domainInControl].record(state=cState, \
-                    state_ori=state, action=cAction, reward=reward, value=value[0][0], distribution=policy_mu)
+                    state_ori=state_ori, action=cAction, reward=reward, value=value[0][0], distribution=policy_mu)
         elif self.replay_type == 'prioritized':
             self.episodes[domainInControl].record(state=cState, \
-                    state_ori=state, action=cAction, reward=reward, value=value[0][0], distribution=policy_mu)
+                    state_ori=state_ori, action=cAction, reward=reward, value=value[0][0], distribution=policy_mu)
 
         self.actToBeRecorded = None
         self.samplecount += 1
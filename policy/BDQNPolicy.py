@@ -511,12 +511,14 @@ class BDQNPolicy(Policy.Policy):
             target_value_Q = cur_target_q[0]
             gamma_Q_s_tplu1_maxa_ = self.gamma * target_value_Q[np.argmax(admissible)]
 
+        # with compactreplay the buffer keeps only the executable actions, which is all training needs
+        state_ori = SummaryAction.CompactBelief(execMask) if self.compactreplay else state
         if self.replay_type == 'vanilla':
             self.episodes[domainInControl].record(state=cState, \
-                                                  state_ori=state, action=cAction, reward=reward)
+                                                  state_ori=state_ori, action=cAction, reward=reward)
         elif self.replay_type == 'prioritized':
             self.episodes[domainInControl].record(state=cState, \
-                                                      state_ori=state, action=cAction, reward=reward, \
+                                                      state_ori=state_ori, action=cAction, reward=reward, \
                                                       Q_s_t_a_t_=Q_s_t_a_t_,
                                                       gamma_Q_s_tplu1_maxa_=gamma_Q_s_tplu1_maxa_, uniform=False)
 
@@ -629,9 +631,6 @@ class BDQNPolicy(Policy.Policy):
             s_batch, s_ori_batch, a_batch, r_batch, s2_batch, s2_ori_batch, t_batch, idx_batch, _ = \
                 self.episodes[self.domainString].sample_batch()
 
-            # here?
-            s_batch = np.vstack([np.expand_dims(x, 0) for x in s_batch])
-            s2_batch = np.vstack([np.expand_dims(x, 0) for x in s2_batch])
             # target_q = self.bbqn.predict_target_with_action_maxQ(s2_batch)
             action_q = self.bbqn.predict(s2_batch)
             target_q = self.bbqn.predict_target(s2_batch)
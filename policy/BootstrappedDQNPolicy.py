@@ -351,18 +351,20 @@ class BootstrappedDQNPolicy(Policy.Policy):
             gamma_Q_s_tplu1_maxa_ = self.gamma * target_value_Q[np.argmax(admissible)]
 
 
+        # with compactreplay the buffer keeps only the executable actions, which is all training needs
+        state_ori = SummaryAction.CompactBelief(execMask) if self.compactreplay else state
         if weight == None:
             if self.replay_type == 'vanilla':
                 self.episodes[domainInControl].record(state=cState, \
-                                                      state_ori=state, action=cAction, reward=reward)
+                                                      state_ori=state_ori, action=cAction, reward=reward)
             elif self.replay_type == 'prioritized':
                 # heuristically assign 0.0 to Q_s_t_a_t_ and Q_s_tplu1_maxa_, doesn't matter as it is not used
                 self.episodes[domainInControl].record(state=cState, \
-                                                      state_ori=state, action=cAction, reward=reward, \
+                                                      state_ori=state_ori, action=cAction, reward=reward, \
                                                       Q_s_t_a_t_=Q_s_t_a_t_,
                                                       gamma_Q_s_tplu1_maxa_=gamma_Q_s_tplu1_maxa_, uniform=False)
         else:
-            self.episodes[domainInControl].record(state=cState, state_ori=state, action=cAction, reward=reward,
+            self.episodes[domainInControl].record(state=cState, state_ori=state_ori, action=cAction, reward=reward,
                                                   ma_weight=weight)
 
         self.actToBeRecorded = None
@@ -31,6 +31,10 @@ Copyright CUED Dialogue Systems Group 2015 - 2017
     import :class:`Policy`
     import :class:`utils.ContextLogger`
 
+With replay_type = prioritized the TD errors of a minibatch update the sum tree in one pass and the loss of every
+experience is scaled by its importance-sampling weight. The weight exponent starts at per_beta and is annealed to 1 over
+per_beta_steps minibatches.
+
 .. warning::
         Documentation not done.
 
@@ -43,6 +47,7 @@ import re
 import cPickle as pickle
 import copy
 import json
+import operator
 import numpy as np
 import os
 import random
@@ -66,6 +71,7 @@ from utils import ContextLogger, DiaAct
 from utils.Settings import config as cfg  # this does not work! TODO
 from utils.DialogueState import DialogueState
 from ontology import Ontology
+from belieftracking.BeliefTrackingUtils import SlotBelief
 # from model_prediction_curiosity import constants
 
 # logger = utils.ContextLogger.getLogger('')
@@ -73,96 +79,103 @@ logger = ContextLogger.getLogger('')
 
 
 # --- for flattening the belief --- # 
+policyfeatures = ['requested', 'method', 'full', 'discourseAct', 'offerHappened', 'lastActionInformNone'] #, 'inform_info'
+beliefflags = ['sameSysAct', 'sameUserAct', 'uactConfirm', 'uactAffirm', 'uactInform', 'uactRequest']
+
+
+class BeliefLayout(object):
+    '''
+    Position of every belief feature in the flat belief vector of one domain.
+
+    The layout is computed once from the ontology, so flattening a belief only copies the values into a
+    preallocated float32 vector. The length of the vector (and of the terminal state) follows from the layout.
+    The vector of a :class:`SlotBelief` is copied with a single take, whatever the order of its values.
+    '''
+    def __init__(self, domainUtil):
+        ontology = domainUtil.ontology
+        self.blocks = []        # (belief key, getter, start, stop) for the distributions read value by value
+        self.values = {}        # belief key -> values of its block, in the order of the vector
+        self._takes = {}        # slot -> (SlotValues, indices of the values of its block in the SlotBelief)
+        self.optional = []      # (slot, value, index) for the values which may be missing from the distribution
+        self.features = []      # (feature name, index) for belief['features']
+        offset = 0
+        for feat in policyfeatures:
+            if feat == 'full':                      # belief value for every slot value
+                for slot in ontology['informable']:
+                    offset = self._addBlock(slot, ontology['informable'][slot], offset)
+                    # pfb30 11.03.2017
+                    for value in ['**NONE**', 'dontcare']:
+                        self.optional.append((slot, value, offset))
+                        offset += 1
+            elif feat in ['method', 'discourseAct']:    # belief value for every method / discourse act
+                offset = self._addBlock(feat, ontology[feat], offset)
+            elif feat == 'requested':               # belief value for every request slot
+                offset = self._addBlock(feat, ontology['requestable'], offset)
+            elif feat in ['lastActionInformNone', 'offerHappened']:
+                self.features.append((feat, offset))
+                offset += 1
+            else:
+                logger.error('Invalid feature name in config: ' + feat)
+
+        # the tracker keeps one counter per summary action
+        self.sysActs = (offset, offset + len(SummaryAction.SummaryAction(domainUtil.domainString).action_names))
+        offset = self.sysActs[1]
+        self.flags = (operator.itemgetter(*beliefflags), offset, offset + len(beliefflags))
+        self.size = offset + len(beliefflags)
+
+    def _addBlock(self, key, values, offset):
+        self.values[key] = values
+        if len(values):
+            self.blocks.append((key, operator.itemgetter(*values), offset, offset + len(values)))
+        return offset + len(values)
+
+    def terminal(self):
+        return np.zeros(self.size, dtype=np.float32)
+
+    def flatten(self, belief):
+        flat_belief = np.empty(self.size, dtype=np.float32)
+        beliefs = belief['beliefs']
+        for key, getter, start, stop in self.blocks:
+            if isinstance(beliefs[key], SlotBelief):
+                flat_belief[start:stop] = beliefs[key].probs.take(self._take(key, beliefs[key].slotValues))
+            else:
+                flat_belief[start:stop] = getter(beliefs[key])
+        for slot, value, index in self.optional:
+            flat_belief[index] = beliefs[slot].get(value, 0.)
+        for feat, index in self.features:
+            flat_belief[index] = float(belief['features'][feat])
+        start, stop = self.sysActs
+        flat_belief[start:stop] = beliefs['sysActs'].values()
+        getter, start, stop = self.flags
+        flat_belief[start:stop] = getter(beliefs)
+        return flat_belief
+
+    def _take(self, slot, slotValues):
+        taken = self._takes.get(slot)
+        if taken is None or taken[0] is not slotValues:
+            taken = (slotValues, np.array([slotValues.index[value] for value in self.values[slot]]))
+            self._takes[slot] = taken
+        return taken[1]
+
+
+_belief_layouts = {}
+
+
+def get_belief_layout(domainUtil):
+    '''
+    Returns the :class:`BeliefLayout` of the domain, building it on first use.
+    '''
+    if domainUtil.domainString not in _belief_layouts:
+        _belief_layouts[domainUtil.domainString] = BeliefLayout(domainUtil)
+    return _belief_layouts[domainUtil.domainString]
+
+
 def flatten_belief(belief, domainUtil, merge=False):
+    layout = get_belief_layout(domainUtil)
     belief = belief.getDomainState(domainUtil.domainString)
     if isinstance(belief, TerminalState):
-        if domainUtil.domainString == 'CamRestaurants':
-            return [0] * 241
-        elif domainUtil.domainString == 'CamHotels':
-            return [0] * 111
-        elif domainUtil.domainString == 'SFRestaurants':
-            return [0] * 633
-        elif domainUtil.domainString == 'SFHotels':
-            return [0] * 438
-        elif domainUtil.domainString == 'Laptops11':
-            return [0] * 257
-        elif domainUtil.domainString == 'TV':
-            return [0] * 188
-        elif domainUtil.domainString == 'Banks':
-            return [0] * 306
-        elif domainUtil.domainString == 'Buses':
-            return [0] * 683
-        elif domainUtil.domainString == 'Calendar':
-            return [0] * 496
-        elif domainUtil.domainString == 'Restaurants':
-            return [0] * 1443
-
-    policyfeatures = ['requested', 'method', 'full', 'discourseAct', 'offerHappened', 'lastActionInformNone'] #, 'inform_info'
-
-    flat_belief = []
-    check = []
-    for feat in policyfeatures:
-        add_feature = []
-        if feat == 'full':                      # belief value for every slot value 
-            # for slot in self.sorted_slots:
-            for slot in domainUtil.ontology['informable']:
-                for value in domainUtil.ontology['informable'][slot]:  # + ['**NONE**']:
-                    add_feature.append(belief['beliefs'][slot][value])
-                    check.append(slot+"_"+str(value))
-                # pfb30 11.03.2017
-                try:
-                    add_feature.append(belief['beliefs'][slot]['**NONE**'])
-                    check.append(slot+"_NONE")
-                except:
-                    add_feature.append(0.)  # for NONE
-                    check.append(slot+"_NONE")
-                try:
-                    add_feature.append(belief['beliefs'][slot]['dontcare'])
-                    check.append(slot+"_dontcare")
-                except:
-                    add_feature.append(0.)  # for dontcare
-                    check.append(slot+"_dontcare")
-
-        elif feat == 'method':  # belief value for every method
-            for method in domainUtil.ontology['method']:
-                add_feature.append(belief['beliefs']['method'][method])
-                check.append("method"+method)
-        elif feat == 'discourseAct':    # belief value for every discourse act
-            for discourseAct in domainUtil.ontology['discourseAct']:
-                add_feature.append(belief['beliefs']['discourseAct'][discourseAct])
-                check.append("discAct"+discourseAct)
-        elif feat == 'requested':       # belief value for every request slot
-            for slot in domainUtil.ontology['requestable']:
-                add_feature.append(belief['beliefs']['requested'][slot])
-                check.append("requested_"+slot)
-        elif feat == 'lastActionInformNone':
-            add_feature.append(float(belief['features']['lastActionInformNone']))
-            check.append("lastActionInformNone")
-        elif feat == 'offerHappened':
-            add_feature.append(float(belief['features']['offerHappened']))
-            check.append("offerHappened")
-        elif feat == 'inform_info':
-            add_feature += belief['features']['inform_info']
-            for i in range(len(belief['features']['inform_info'])):
-                check.append("inform_info_"+str(i))
-        else:
-            logger.error('Invalid feature name in config: ' + feat)
-
-    
-        flat_belief += add_feature
-
-    for act, val in belief['beliefs']['sysActs'].items():
-        flat_belief.append(val)
-        
-    flat_belief.append(belief['beliefs']['sameSysAct'])
-    flat_belief.append(belief['beliefs']['sameUserAct'])
-    flat_belief.append(belief['beliefs']['uactConfirm'])
-    flat_belief.append(belief['beliefs']['uactAffirm'])
-    flat_belief.append(belief['beliefs']['uactInform'])
-    flat_belief.append(belief['beliefs']['uactRequest'])
-    #print check
-    
-    return flat_belief
+        return layout.terminal()
+    return layout.flatten(belief)
 
 
 class DQNPolicy(Policy.Policy):
@@ -285,6 +298,14 @@ class DQNPolicy(Policy.Policy):
         if utils.Settings.config.has_option('dqnpolicy', 'replay_type'):
             self.replay_type = utils.Settings.config.get('dqnpolicy', 'replay_type')
 
+        self.per_beta = 0.4
+        if utils.Settings.config.has_option('dqnpolicy', 'per_beta'):
+            self.per_beta = utils.Settings.config.getfloat('dqnpolicy', 'per_beta')
+
+        self.per_beta_steps = 0
+        if utils.Settings.config.has_option('dqnpolicy', 'per_beta_steps'):
+            self.per_beta_steps = utils.Settings.config.getint('dqnpolicy', 'per_beta_steps')
+
         self.architecture = 'vanilla'
         if utils.Settings.config.has_option('dqnpolicy', 'architecture'):
             self.architecture = utils.Settings.config.get('dqnpolicy', 'architecture')
@@ -370,6 +391,12 @@ class DQNPolicy(Policy.Policy):
         if utils.Settings.config.has_option('dqnpolicy_' + domainString, 'replay_type'):
             self.replay_type = utils.Settings.config.get('dqnpolicy_' + domainString, 'replay_type')
 
+        if utils.Settings.config.has_option('dqnpolicy_' + domainString, 'per_beta'):
+            self.per_beta = utils.Settings.config.getfloat('dqnpolicy_' + domainString, 'per_beta')
+
+        if utils.Settings.config.has_option('dqnpolicy_' + domainString, 'per_beta_steps'):
+            self.per_beta_steps = utils.Settings.config.getint('dqnpolicy_' + domainString, 'per_beta_steps')
+
         if utils.Settings.config.has_option('dqnpolicy_' + domainString, 'architecture'):
             self.architecture = utils.Settings.config.get('dqnpolicy_' + domainString, 'architecture')
 
@@ -419,7 +446,8 @@ class DQNPolicy(Policy.Policy):
                     self.episodes[self.domainString] = ReplayBuffer(self.capacity, self.minibatch_size, self.randomseed)
                 elif self.replay_type == 'prioritized':
                     self.episodes[self.domainString] = ReplayPrioritised(self.capacity, self.minibatch_size,
-                                                                         self.randomseed)
+                                                                         self.randomseed, self.per_beta,
+                                                                         self.per_beta_steps)
                 self.samplecount = 0
                 self.episodecount = 0
 
@@ -452,28 +480,7 @@ class DQNPolicy(Policy.Policy):
                 self.dqn.update_target_network()
 
     def get_n_in(self, domain_string):
-        if domain_string == 'CamRestaurants':
-            return 241
-        elif domain_string == 'CamHotels':
-            return 111
-        elif domain_string == 'SFRestaurants':
-            return 636
-        elif domain_string == 'SFHotels':
-            return 438
-        elif domain_string == 'Laptops6':
-            return 241 # ic340: this is wrong
-        elif domain_string == 'Laptops11':
-            return 257
-        elif domain_string is 'TV':
-            return 188
-        elif domain_string == 'Banks':
-            return 306
-        elif domain_string == 'Buses':
-            return 683
-        elif domain_string == 'Calendar':
-            return 496
-        elif domain_string == 'Restaurants':
-            return 1443
+        return get_belief_layout(self.domainUtil).size
 
     def act_on(self, state, hyps=None):
         if self.lastSystemAction is None and self.startwithhello:
@@ -561,15 +568,20 @@ class DQNPolicy(Policy.Policy):
             y_i.append(Q_bootstrap_label)
         """
 
+        # executable actions in this state, used for the target when it is the next state of an experience
+        mask = np.array(execMask) == 0
+        # with compactreplay the buffer keeps only the executable actions, which is all training needs
+        state_ori = SummaryAction.CompactBelief(execMask) if self.compactreplay else state
         if self.replay_type == 'vanilla':
             self.episodes[domainInControl].record(state=cState, \
-                                                  state_ori=state, action=cAction, reward=reward)
+                                                  state_ori=state_ori, action=cAction, reward=reward, mask=mask)
         elif self.replay_type == 'prioritized':
             # heuristically assign 0.0 to Q_s_t_a_t_ and Q_s_tplu1_maxa_, doesn't matter as it is not used
             self.episodes[domainInControl].record(state=cState, \
-                                                  state_ori=state, action=cAction, reward=reward, \
+                                                  state_ori=state_ori, action=cAction, reward=reward, \
                                                   Q_s_t_a_t_=Q_s_t_a_t_,
-                                                  gamma_Q_s_tplu1_maxa_=gamma_Q_s_tplu1_maxa_, uniform=False)
+                                                  gamma_Q_s_tplu1_maxa_=gamma_Q_s_tplu1_maxa_, uniform=False,
+                                                  mask=mask)
         self.actToBeRecorded = None
         self.samplecount += 1
 
@@ -610,26 +622,7 @@ class DQNPolicy(Policy.Policy):
         '''
         
         if isinstance(state, TerminalState):                        # end of dialog
-            if self.domainUtil.domainString == 'CamRestaurants':
-                return [0] * 241, action
-            elif self.domainUtil.domainString == 'CamHotels':
-                return [0] * 111, action
-            elif self.domainUtil.domainString == 'SFRestaurants':
-                return [0] * 633, action
-            elif self.domainUtil.domainString == 'SFHotels':
-                return [0] * 438, action
-            elif self.domainUtil.domainString == 'Laptops11':
-                return [0] * 257, action
-            elif self.domainUtil.domainString == 'TV':
-                return [0] * 188, action
-            elif self.domainUtil.domainString == 'Banks':
-                return [0] * 306, action
-            elif self.domainUtil.domainString == 'Buses':
-                return [0] * 683, action
-            elif self.domainUtil.domainString == 'Calendar':
-                return [0] * 496, action
-            elif self.domainUtil.domainString == 'Restaurants':
-                return [0] * 1443, action
+            return get_belief_layout(self.domainUtil).terminal(), action
         else:
             flat_belief = flatten_belief(state, self.domainUtil)    # self.extractSimpleBelief(state) # 
             self.prev_state_check = flat_belief
@@ -655,6 +648,38 @@ class DQNPolicy(Policy.Policy):
 
             return flat_belief, action
 
+    def _dip_beliefs(self, dip_state):
+        '''
+        Belief vector of every action for the dip2 architecture, computed once per slot
+
+        :param dip_state: the DIP_state of the current turn
+        :returns: (num actions x state_dim) array, row idx is the input for action idx
+        '''
+        slot_beliefs = {}
+        beliefs = []
+        for action_name in self.actions.action_names:
+            act_slot = 'general'
+            for slot in dip_state.slots:
+                if slot in action_name:
+                    act_slot = slot
+            if act_slot not in slot_beliefs:
+                slot_beliefs[act_slot] = dip_state.get_beliefStateVec(act_slot)
+            beliefs.append(slot_beliefs[act_slot])
+        return np.array(beliefs)
+
+    def _dip_action_q(self, predict, beliefs):
+        '''
+        Scores every (belief, action) pair of the dip architecture in a single forward pass
+
+        :param predict: self.dqn.predict_dip or self.dqn.predict_target_dip
+        :param beliefs: (batch x state_dim) array of belief vectors
+        :returns: (batch x action_dim) array of Q values
+        '''
+        batch_size = len(beliefs)
+        inputs = np.repeat(beliefs, self.action_dim, axis=0)
+        actions = np.tile(np.eye(self.action_dim, self.action_dim), (batch_size, 1))
+        return np.reshape(predict(inputs, actions), (batch_size, self.action_dim))
+
     def nextAction(self, beliefstate):
         '''
         select next action
@@ -687,34 +712,15 @@ class DQNPolicy(Policy.Policy):
                     #print 'current maxQ', np.max(admissible)
                     self.episode_ave_max_q.append(np.max(admissible))
                 elif self.architecture == 'dip2':
-                    admissible = []
-                    for idx, v in enumerate(execMask):
-                        action_name = self.actions.action_names[idx]
-                        act_slot = 'general'
-                        for slot in dip_state.slots:
-                            if slot in action_name:
-                                act_slot = slot
-                        beliefVec = dip_state.get_beliefStateVec(act_slot)
-                        action_Q = self.dqn.predict(np.reshape(beliefVec, (1, len(beliefVec))))  # + (1. / (1. + i + j))
-                        if v == 0:
-                            admissible.append(action_Q[0][idx])
-                        else:
-                            admissible.append(v)
+                    # one forward pass over the belief vectors of all actions, Q of action idx is in row idx
+                    action_Q = self.dqn.predict(self._dip_beliefs(dip_state))
+                    admissible = np.where(np.array(execMask) == 0, np.diag(action_Q), execMask)
                     nextaIdex = np.argmax(admissible)
                     self.episode_ave_max_q.append(np.max(admissible))
 
                 else:
-                    admissible = []
-                    for idx, v in enumerate(execMask):
-                        if v > -sys.maxint:
-                            Action_idx = np.eye(self.action_dim, self.action_dim)[[idx]]
-                            Qidx = self.dqn.predict_dip(np.reshape(beliefVec, (1, len(beliefVec))), Action_idx)
-                            #print 'argmax Q',Qidx[0]
-                            admissible.append(Qidx[0])
-                        else:
-                            admissible.append(-sys.maxint)
-                    # action_Q = self.dqn.predict(np.reshape(beliefVec, (1, len(beliefVec))))# + (1. / (1. + i + j))
-                    # admissible = np.add(action_Q, np.array(execMask))
+                    action_Q = self._dip_action_q(self.dqn.predict_dip, np.reshape(beliefVec, (1, len(beliefVec))))
+                    admissible = np.where(np.array(execMask) > -sys.maxint, action_Q[0], -sys.maxint)
                     logger.info('action Q...')
                     #print admissible
                     nextaIdex = np.argmax(admissible)
@@ -756,17 +762,18 @@ class DQNPolicy(Policy.Policy):
             logger.info("Update dqn policy parameters.")
 
         self.episodecount += 1
-        logger.info("Sample Num so far: %s" % (self.samplecount))
-        logger.info("Episode Num so far: %s" % (self.episodecount))
+        logger.info("Sample Num so far: %s", self.samplecount)
+        logger.info("Episode Num so far: %s", self.episodecount)
         #print self.samplecount, self.minibatch_size * 10
         if self.samplecount >= self.minibatch_size * 10 and self.episodecount % self.training_frequency == 0:
             logger.info('start training...')
-            s_batch, s_ori_batch, a_batch, r_batch, s2_batch, s2_ori_batch, t_batch, idx_batch, _ = \
-                self.episodes[self.domainString].sample_batch()
-
-            # here?
-            s_batch = np.vstack([np.expand_dims(x, 0) for x in s_batch])
-            s2_batch = np.vstack([np.expand_dims(x, 0) for x in s2_batch])
+            weights = None
+            if self.replay_type == 'prioritized':
+                s_batch, s_ori_batch, a_batch, r_batch, s2_batch, s2_ori_batch, t_batch, idx_batch, mask_batch, \
+                    weights = self.episodes[self.domainString].sample_batch(with_weights=True)
+            else:
+                s_batch, s_ori_batch, a_batch, r_batch, s2_batch, s2_ori_batch, t_batch, idx_batch, mask_batch = \
+                    self.episodes[self.domainString].sample_batch()
 
             # change index-based a_batch to one-hot-based a_batch
             a_batch_one_hot = np.eye(self.action_dim, self.action_dim)[a_batch]
@@ -776,46 +783,38 @@ class DQNPolicy(Policy.Policy):
                 action_q = self.dqn.predict(s2_batch)
                 target_q = self.dqn.predict_target(s2_batch)
             else:
-                action_q = self.dqn.predict_dip(s2_batch, a_batch_one_hot)
-                target_q = self.dqn.predict_target_dip(s2_batch, a_batch_one_hot)
+                action_q = self._dip_action_q(self.dqn.predict_dip, s2_batch)
+                target_q = self._dip_action_q(self.dqn.predict_target_dip, s2_batch)
             # print 'action Q and target Q:', action_q, target_q
 
-            y_i = []
-            for k in xrange(min(self.minibatch_size, self.episodes[self.domainString].size())):
-                Q_bootstrap_label = 0
-                if t_batch[k]:
-                    Q_bootstrap_label = r_batch[k]
-                else:
-                    if self.q_update == 'single':
-                        execMask = self.summaryaction.getExecutableMask(s2_ori_batch[k], a_batch[k])
-                        action_Q = target_q[k]
-                        admissible = np.add(action_Q, np.array(execMask))
-                        # logger.info('action Q...')
-                        # print admissible
-                        Q_bootstrap_label = r_batch[k] + self.gamma * np.max(admissible)
-                    elif self.q_update == 'double':
-                        execMask = self.summaryaction.getExecutableMask(s2_ori_batch[k], a_batch[k])
-                        action_Q = action_q[k]
-                        value_Q = target_q[k]
-                        admissible = np.add(action_Q, np.array(execMask))
-                        Q_bootstrap_label = r_batch[k] + self.gamma * value_Q[np.argmax(admissible)]
-                y_i.append(Q_bootstrap_label)
-
-                if self.replay_type == 'prioritized':
-                    # update the sum-tree
-                    # update the TD error of the samples in the minibatch
-                    currentQ_s_a_ = action_q[k][a_batch[k]]
-                    error = abs(currentQ_s_a_ - Q_bootstrap_label)
-                    self.episodes[self.domainString].update(idx_batch[k], error)
+            batch_size = len(r_batch)
+            if mask_batch is None:
+                # experiences recorded without their executable actions
+                mask_batch = np.ones((batch_size, self.action_dim), dtype=bool)
+                for k in np.flatnonzero(np.logical_not(t_batch)):
+                    mask_batch[k] = np.array(self.summaryaction.getExecutableMask(s2_ori_batch[k], a_batch[k])) == 0
+
+            if self.q_update == 'single':
+                admissible = np.where(mask_batch, target_q, -sys.maxint)
+                Q_bootstrap = np.max(admissible, axis=1)
+            elif self.q_update == 'double':
+                admissible = np.where(mask_batch, action_q, -sys.maxint)
+                Q_bootstrap = target_q[np.arange(batch_size), np.argmax(admissible, axis=1)]
+            y_i = np.where(t_batch, r_batch, r_batch + self.gamma * Q_bootstrap)
+
+            if self.replay_type == 'prioritized':
+                # update the TD error of the samples in the minibatch
+                currentQ_s_a_ = action_q[np.arange(batch_size), a_batch]
+                self.episodes[self.domainString].update_batch(idx_batch, np.abs(currentQ_s_a_ - y_i))
 
             # Update the critic given the targets
-            reshaped_yi = np.vstack([np.expand_dims(x, 0) for x in y_i])
+            reshaped_yi = np.reshape(y_i, (batch_size, 1))
 
             if self.curiosityreward:
                 curiosity_loss = self.curiosityFunctions.training(s2_batch, s_batch, a_batch_one_hot)
                 # self.curiositypred_loss.append(curiosity_loss)  # for plotting
 
-            predicted_q_value, currentLoss, _ = self.dqn.train(s_batch, a_batch_one_hot, reshaped_yi)
+            predicted_q_value, currentLoss, _ = self.dqn.train(s_batch, a_batch_one_hot, reshaped_yi, weights)
             if self.episodecount % 1 == 0:
                 # Update target networks
                 self.dqn.update_target_network()
@@ -884,7 +883,7 @@ class DQNPolicy(Policy.Policy):
         
         :return: the sorted belief state value vector
         '''
-        bel = copy.deepcopy(belief)
+        bel = dict(belief)  # the values are floats, a shallow copy is enough
         res = []
         if '**NONE**' not in belief:
             res.append(1.0 - sum(belief.values()))  # append the none probability
@@ -34,12 +34,14 @@ Indeed, the transitions where the agent experienced any reward intuitively seem
 '''
 
 # s is the sampled value (from 0 to p_total)
-# For known capacity, this sum tree data structure can be backed by an array?
+# The tree is backed by an array, the children of node i are 2i+1 and 2i+2 and the last capacity nodes are the leaves
 #            0
 #     1               2
 #  3     4        5       6
 # 7 8   9 10    11 12   13 14
 # capacity = 8, tree size = 15,
+# A second array of the same layout holds the minimum priority under every node (inf for the empty leaves), which gives
+# the largest importance-sampling weight without scanning the buffer.
 
 import numpy
 
@@ -49,32 +51,46 @@ class SumTree:
     def __init__(self, capacity):
         self.capacity = capacity
         self.tree = numpy.zeros(2 * capacity - 1) # indexes for sums - all leaves nodes plus the upper hierarchy thus 2 * capacity -1
+        self.mintree = numpy.full(2 * capacity - 1, numpy.inf)  # minimum of the leaves under every node
         self.data = numpy.zeros(capacity, dtype=object)  # to store experience
-
-    def _propagate(self, idx, change):
-        parent = (idx - 1) // 2  # index of parent
-
-        self.tree[parent] += change  # adding the change that was made up the tree
-
-        if parent != 0:
-            self._propagate(parent, change)
-
-    def _retrieve(self, idx, s):  # get index in the tree of node where we wanted to get s
-        left = 2 * idx + 1
-        right = left + 1
-
-        if left >= len(self.tree):
-            return idx
-
-        # search for the value
-        if s <= self.tree[left]:
-            return self._retrieve(left, s)
-        else:
-            return self._retrieve(right, s-self.tree[left])
+        self.n_entries = 0
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        if 'mintree' not in state:
+            # tree pickled before the min tree was added
+            leaves = numpy.arange(self.capacity - 1, 2 * self.capacity - 1)
+            filled = leaves[self.tree[leaves] > 0]  # stored priorities are always positive
+            self.n_entries = len(filled)
+            self.mintree = numpy.full(2 * self.capacity - 1, numpy.inf)
+            self.update_batch(filled, self.tree[filled])
+
+    def _propagate(self, idx):
+        while idx != 0:
+            idx = (idx - 1) // 2  # index of parent
+            left = 2 * idx + 1
+            self.tree[idx] = self.tree[left] + self.tree[left + 1]
+            self.mintree[idx] = min(self.mintree[left], self.mintree[left + 1])
+
+    def _retrieve(self, s):  # get index in the tree of the nodes where we wanted to get s, for an array of s
+        idx = numpy.zeros(len(s), dtype=numpy.int64)
+        s = numpy.array(s, dtype=float)
+        active = 2 * idx + 1 < len(self.tree)
+        while active.any():
+            left = 2 * idx[active] + 1
+            s_active = s[active]
+            go_left = s_active <= self.tree[left]  # search for the value
+            s[active] = numpy.where(go_left, s_active, s_active - self.tree[left])
+            idx[active] = numpy.where(go_left, left, left + 1)
+            active = 2 * idx + 1 < len(self.tree)
+        return idx
 
     def total(self):  # p_total - sum of all errors
         return self.tree[0]
 
+    def min(self):  # smallest priority in the tree
+        return self.mintree[0]
+
     def add(self, p, experience):
         idx = self.write + self.capacity - 1
 
@@ -84,18 +100,60 @@ class SumTree:
         self.write += 1  # if write is above capacity it starts from the first leaf again
         if self.write >= self.capacity:
             self.write = 0
+        self.n_entries = min(self.n_entries + 1, self.capacity)
 
     def getDataSize(self):
-        return self.write
-    
-    def update(self, idx, p):
-        change = p - self.tree[idx]
+        return self.n_entries
 
+    def update(self, idx, p):
         self.tree[idx] = p  # new error in the tree
-        self._propagate(idx, change)  # propagating it back
+        self.mintree[idx] = p
+        self._propagate(idx)  # propagating it back
+
+    def update_batch(self, idxs, ps):
+        '''
+        Sets the priorities of several leaves and recomputes their ancestors one level at a time.
+        '''
+        idxs = numpy.asarray(idxs, dtype=numpy.int64)
+        self.tree[idxs] = ps
+        self.mintree[idxs] = ps
+        parents = numpy.unique((idxs[idxs > 0] - 1) // 2)
+        while len(parents):
+            left = 2 * parents + 1
+            self.tree[parents] = self.tree[left] + self.tree[left + 1]
+            self.mintree[parents] = numpy.minimum(self.mintree[left], self.mintree[left + 1])
+            parents = numpy.unique((parents[parents > 0] - 1) // 2)
 
     def get(self, s):
-        idx = self._retrieve(0, s)  # index of a node
+        idx = self._retrieve([s])[0]  # index of a node
         dataIdx = idx - self.capacity + 1  # getting (7 - 8 + 1 = 0 - cause its first)
 
         return (idx, self.tree[idx], self.data[dataIdx])  # index, value of TD and experience
+
+    def get_batch(self, s):
+        '''
+        Vectorised :meth:`get` for an array of values s.
+
+        :returns: (tuple) arrays of the tree indexes, the priorities and the experiences
+        '''
+        idx = self._retrieve(s)
+        return idx, self.tree[idx], self.data[idx - self.capacity + 1]
+
+    def sample(self, n, beta, rng=numpy.random):
+        '''
+        Draws one value uniformly from each of n equal segments of [0, p_total] and looks all of them up at once.
+
+        :param n: number of samples
+        :param beta: importance-sampling exponent
+        :param rng: random state drawing the values, numpy.random by default
+        :returns: (tuple) tree indexes, experiences and importance-sampling weights normalised by the largest weight in
+            the tree, for the samples that hit a stored experience
+        '''
+        segment = self.total() / n
+        s = segment * (numpy.arange(n) + rng.uniform(size=n))
+        idx, p, experiences = self.get_batch(numpy.minimum(s, self.total()))
+        keep = p > 0  # float round-off can land on an empty leaf
+        idx, p, experiences = idx[keep], p[keep], experiences[keep]
+        # w_i = (N * P(i)) ** -beta / max_j w_j, where the max is taken by the smallest priority
+        weights = (p / self.min()) ** (-beta)
+        return idx, experiences, weights
@@ -27,6 +27,7 @@ The algorithm is developed with tflearn + Tensorflow
 
 Author: Pei-Hao Su
 """
+import numpy as np
 import tensorflow as tf
 
 # ===========================
@@ -87,9 +88,12 @@ class DeepQNetwork(object):
         #action_maxQ_one_hot = tf.one_hot(self.a_maxQ, self.a_dim, 1.0, 0.0, name='action_maxQ_one_hot')
         #self.action_maxQ_target = tf.reduce_sum(self.target_Qout * action_maxQ_one_hot, reduction_indices=1, name='a_maxQ_target')
 
+        # importance-sampling weights of the minibatch for prioritised replay, all ones if not fed
+        self.is_weights = tf.placeholder_with_default(tf.ones_like(self.sampled_q), [None, 1])
+
         # Define loss and optimization Op
         self.diff = self.sampled_q - self.pred_q
-        self.loss = tf.reduce_mean(self.clipped_error(self.diff), name='loss')
+        self.loss = tf.reduce_mean(self.is_weights * self.clipped_error(self.diff), name='loss')
 
         self.optimizer = tf.train.AdamOptimizer(self.learning_rate)
         self.optimize = self.optimizer.minimize(self.loss)
@@ -170,12 +174,15 @@ class DeepQNetwork(object):
 
         return inputs, action, Qout
 
-    def train(self, inputs, action, sampled_q):
-        return self.sess.run([self.pred_q, self.optimize, self.loss], feed_dict={ #yes, needs to be changed too
+    def train(self, inputs, action, sampled_q, weights=None):
+        feed_dict = { #yes, needs to be changed too
             self.inputs: inputs,
             self.action: action,
             self.sampled_q: sampled_q
-        })
+        }
+        if weights is not None:
+            feed_dict[self.is_weights] = np.reshape(weights, (-1, 1))
+        return self.sess.run([self.pred_q, self.optimize, self.loss], feed_dict=feed_dict)
 
     def predict(self, inputs):
         return self.sess.run(self.Qout, feed_dict={
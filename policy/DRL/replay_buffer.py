@@ -25,7 +25,6 @@ Data structure for implementing experience replay
 
 Author: Patrick Emami
 """
-from collections import deque
 import random
 import numpy as np
 from ..Policy import TerminalAction, TerminalState
@@ -35,17 +34,63 @@ class ReplayBuffer(replay_abc.ReplayABC):
 
     def __init__(self, buffer_size, batch_size, random_seed=1234):
         """
-        The right side of the deque contains the most recent experiences 
+        Experiences are stored column-wise in preallocated arrays which are used as a ring buffer:
+        self.index is the slot written next, i.e. the oldest experience once the buffer is full
         """
         self.buffer_size = buffer_size
         self.batch_size = batch_size
+        self._allocate()
+
+        random.seed(random_seed)
+
+    def _allocate(self):
         self.count = 0
-        self.buffer = deque()
+        self.index = 0
+        self.s_batch, self.s2_batch = None, None   # allocated with the first experience, when the state size is known
+        self.mask_batch, self.has_mask = None, None # executable actions in s2, allocated with the first mask
+        self.s_ori_batch = np.empty(self.buffer_size, dtype=object)
+        self.s2_ori_batch = np.empty(self.buffer_size, dtype=object)
+        self.a_batch = np.zeros(self.buffer_size, dtype=np.int64)
+        self.r_batch = np.zeros(self.buffer_size)
+        self.t_batch = np.zeros(self.buffer_size, dtype=bool)
         self.s_prev, self.s_ori_prev, self.a_prev, self.r_prev = None, None, None, None
 
-        random.seed(random_seed)
+    _columns = ('s_batch', 's2_batch', 'mask_batch', 'has_mask', 's_ori_batch', 's2_ori_batch', 'a_batch', 'r_batch',
+                't_batch')
 
-    def record(self, state, state_ori, action, reward, terminal=False):
+    def __getstate__(self):
+        """
+        Until the buffer is full only the filled rows are pickled
+        """
+        state = self.__dict__.copy()
+        if self.count < self.buffer_size:
+            for name in self._columns:
+                if state[name] is not None:
+                    state[name] = state[name][:self.count]
+        return state
+
+    def __setstate__(self, state):
+        if 'buffer' in state:
+            # replay buffer pickled as a deque of experiences
+            experiences = state.pop('buffer')
+            self.__dict__.update(state)
+            s_prev, s_ori_prev, a_prev, r_prev = self.s_prev, self.s_ori_prev, self.a_prev, self.r_prev
+            self._allocate()
+            for experience in list(experiences)[-self.buffer_size:]:
+                self._add(*experience)
+            self.s_prev, self.s_ori_prev, self.a_prev, self.r_prev = s_prev, s_ori_prev, a_prev, r_prev
+        else:
+            self.__dict__.update(state)
+            for name in self._columns:
+                column = getattr(self, name)
+                if column is not None and len(column) < self.buffer_size:
+                    full = np.zeros((self.buffer_size,) + column.shape[1:], dtype=column.dtype)
+                    if column.dtype == object:
+                        full.fill(None)
+                    full[:len(column)] = column
+                    setattr(self, name, full)
+
+    def record(self, state, state_ori, action, reward, terminal=False, mask=None):
         """
         Record the experience:
             Turn #  User: state         System: action                  got reward
@@ -69,122 +114,64 @@ class ReplayBuffer(replay_abc.ReplayABC):
             self.s_prev, self.s_ori_prev, self.a_prev, self.r_prev = state, state_ori, action, reward
             return
         else:
-            #terminal = False
-            #if isinstance(state,TerminalState):
             if terminal == True:
                 # if current state is terminal (dummy), add dialogue success reward to r_prev
-                #terminal = True
-                #experience = (self.s_prev, self.s_ori_prev, self.a_prev, self.r_prev+reward, state, state_ori, terminal)
-
-                #self.buffer.pop()
-
-                #action = 13 # bye action
-                #self.buffer[-1][1] = action # action here is 13
-                
-                self.buffer[-1][3] += reward #- 1  # add dialogue succes reward to last added experience , -1 for goodbye turn
-                self.buffer[-1][-1] = terminal # change this experience to terminal
-
-                #print 'terminal transition...', self.buffer[-1]
-
-                #experience = self.buffer.popright()
-                #modifiedExp = list(experience[:2] + [experience[2]+reward-1] + experience[3:-1] + [terminal])
+                if self.count > 0:
+                    last = (self.index - 1) % self.buffer_size
+                    self.r_batch[last] += reward  # add dialogue succes reward to last added experience
+                    self.t_batch[last] = terminal  # change this experience to terminal
 
                 self.s_prev, self.s_ori_prev, self.a_prev, self.r_prev = None, None, None, None
             else: # not terminal state
-                experience = [self.s_prev, self.s_ori_prev, self.a_prev, self.r_prev, state, state_ori, terminal]
+                self._add(self.s_prev, self.s_ori_prev, self.a_prev, self.r_prev, state, state_ori, terminal, mask)
                 self.s_prev, self.s_ori_prev, self.a_prev, self.r_prev = state, state_ori, action, reward
 
-                # add experience to buffer
-                if self.count < self.buffer_size:
-                    self.buffer.append(experience)
-                    self.count += 1
-                else:
-                    self.buffer.popleft()
-                    self.buffer.append(experience)
+    def _add(self, s, s_ori, a, r, s2, s2_ori, t, mask=None):
+        """
+        Writes the experience over the oldest one once the buffer is full
+        """
+        if self.s_batch is None:
+            self.s_batch = np.zeros((self.buffer_size, np.size(s)), dtype=np.float32)
+            self.s2_batch = np.zeros((self.buffer_size, np.size(s)), dtype=np.float32)
+        if mask is not None and self.mask_batch is None:
+            self.mask_batch = np.zeros((self.buffer_size, np.size(mask)), dtype=bool)
+            self.has_mask = np.zeros(self.buffer_size, dtype=bool)
+        i = self.index
+        if self.mask_batch is not None:
+            self.has_mask[i] = mask is not None
+            if mask is not None:
+                self.mask_batch[i] = mask
+        self.s_batch[i] = s
+        self.s_ori_batch[i] = s_ori
+        self.a_batch[i] = a
+        self.r_batch[i] = r
+        self.s2_batch[i] = s2
+        self.s2_ori_batch[i] = s2_ori
+        self.t_batch[i] = t
+        self.index = (i + 1) % self.buffer_size
+        self.count = min(self.count + 1, self.buffer_size)
 
     def size(self):
         return self.count
 
-    def sample_batch(self):
-        batch = []
-
+    def _batch(self, idx):
         """
-        s_batch  = np.array([_[0] for _ in self.buffer])
-        a_batch  = np.array([_[1] for _ in self.buffer])
-        r_batch  = np.array([_[2] for _ in self.buffer])
-        s2_batch = np.array([_[3] for _ in self.buffer])
-        t_batch  = np.array([_[4] for _ in self.buffer])
-        print s_batch
-        print a_batch
-        print r_batch
-        print s2_batch
-        print t_batch
+        The last field holds the executable actions in s2 if they were recorded for every sampled experience
         """
-        if self.count < self.batch_size:
-            batch = random.sample(self.buffer, self.count)
-        else:
-            batch = random.sample(self.buffer, self.batch_size)
+        mask_batch = None
+        if self.mask_batch is not None and self.has_mask[idx].all():
+            mask_batch = self.mask_batch[idx]
+        return self.s_batch[idx], self.s_ori_batch[idx], self.a_batch[idx], self.r_batch[idx], self.s2_batch[idx], \
+               self.s2_ori_batch[idx], self.t_batch[idx], None, mask_batch
 
-        s_batch         = np.array([_[0] for _ in batch])
-        s_ori_batch     = np.array([_[1] for _ in batch])
-        a_batch         = np.array([_[2] for _ in batch])
-        r_batch         = np.array([_[3] for _ in batch])
-        s2_batch        = np.array([_[4] for _ in batch])
-        s2_ori_batch    = np.array([_[5] for _ in batch])
-        t_batch         = np.array([_[6] for _ in batch])
-
-        return s_batch, s_ori_batch, a_batch, r_batch, s2_batch, s2_ori_batch, t_batch, None, None
+    def sample_batch(self):
+        idx = np.array(random.sample(xrange(self.count), min(self.count, self.batch_size)), dtype=np.int64)
+        return self._batch(idx)
 
     def sample_batch_vanilla_PER(self):
-        ########
-        # pick the samples for experience replay 
-        # based on prioritised sampling and random selection
-        ########
-
-        batch = random.sample(self.buffer, len(self.buffer))
-
-        """
-        print 'length of batch', len(batch)
-        print self.batch_size
-        print self.batch_size/2
-        print self.batch_size-self.batch_size/2
-        """
-
-        # determine pos and neg indices
-        pos = []
-        neg = []
-        for r in range(len(batch)):
-            if batch[r][2] > 0:
-                #if Settings.random.rand() < self.prior_sample_prob:
-                if random.random() < 0.8 and len(pos) < self.batch_size/2:
-                    pos.append(batch[r])
-            else:
-                neg.append(batch[r])
-       
-        # first append all pos and then 
-        # fill up to self.minibatch_size with neg
-
-        ExpRep = []
-        ExpRep += pos
-
-        random.shuffle(neg)
-        neg = neg[-(self.batch_size-len(pos)):]
-    
-        ExpRep += neg
-
-        s_batch         = np.array([_[0] for _ in batch])
-        s_ori_batch     = np.array([_[1] for _ in batch])
-        a_batch         = np.array([_[2] for _ in batch])
-        r_batch         = np.array([_[3] for _ in batch])
-        s2_batch        = np.array([_[4] for _ in batch])
-        s2_ori_batch    = np.array([_[5] for _ in batch])
-        t_batch         = np.array([_[6] for _ in batch])
-
-        return s_batch, s_ori_batch, a_batch, r_batch, s2_batch, s2_ori_batch, t_batch, None, None
-
+        # the whole buffer in random order
+        idx = np.array(random.sample(xrange(self.count), self.count), dtype=np.int64)
+        return self._batch(idx)
 
     def clear(self):
-        self.deque.clear()
-        self.count = 0
-        self.s_prev, self.s_ori_prev, self.a_prev, self.r_prev = None, None, None, None
-
+        self._allocate()
@@ -28,12 +28,16 @@ import PER.sum_tree
 
 class ReplayPrioritised(replay_abc.ReplayABC):
     """
-    stored as a tuple (s, a, r, s_1, terminal) in SumTree
+    stored as a tuple (s, a, r, s_1, terminal) in SumTree, followed by the executable actions in s_1 if given
     """
 
-    def __init__(self, buffer_size, batch_size, random_seed=1234):
+    beta_increment = 0.  # default for buffers pickled before beta was annealed
+    rng = np.random  # default for buffers pickled before they had their own random state
+
+    def __init__(self, buffer_size, batch_size, random_seed=1234, beta=0.4, beta_steps=0):
         """
-        The right side of the deque contains the most recent experiences
+        The importance-sampling exponent beta grows linearly from its start value to 1 over beta_steps weighted
+        minibatches, it stays constant if beta_steps is 0
         """
         self.tree = PER.sum_tree.SumTree(buffer_size)
         self.batch_size = batch_size
@@ -42,14 +46,16 @@ class ReplayPrioritised(replay_abc.ReplayABC):
         # p_i = (p + e)^a
         self.e = 0.00000001
         self.a = 0.6  # values suggested by authors
-        self.beta = 0.4  # to 1 - values suggested by authors
+        self.beta = beta  # to 1 - 0.4 suggested by authors
+        self.beta_increment = (1. - beta) / beta_steps if beta_steps > 0 else 0.
 
         self.previous_index = None  # TODO
         self.prevQ_s_t_a_t_ = None
         random.seed(random_seed)
+        self.rng = np.random.RandomState(random_seed)  # draws the samples
 
     def record(self, state, state_ori, action, reward, Q_s_t_a_t_, gamma_Q_s_tplu1_maxa_, uniform=False,
-               terminal=False):
+               terminal=False, mask=None):
 
         """
         Record the experience:
@@ -64,7 +70,7 @@ class ReplayPrioritised(replay_abc.ReplayABC):
             Experience 2: (North, inform(cheap, north), -1+20, Bye)
         """
 
-        if self.s_prev == None and self.s_ori_prev == None and self.a_prev == None and self.r_prev == None:
+        if self.s_prev is None and self.s_ori_prev is None and self.a_prev is None and self.r_prev is None:
             self.s_prev, self.s_ori_prev, self.a_prev, self.r_prev = state, state_ori, action, reward
             self.prevQ_s_t_a_t_ = Q_s_t_a_t_
             return
@@ -75,11 +81,11 @@ class ReplayPrioritised(replay_abc.ReplayABC):
                 self.tree.data[self.tree.write - 1][3] += reward
 
                 # change this experience to terminal
-                self.tree.data[self.tree.write - 1][-1] = terminal
+                self.tree.data[self.tree.write - 1][6] = terminal
 
                 # update the p (calculated from TD error) of node with idx in self.tree
                 # idx: index in self.tree
-                idx = self.tree.write + self.tree.capacity - 1 - 1  #last -1 to get back one position
+                idx = (self.tree.write - 1) % self.tree.capacity + self.tree.capacity - 1  # leaf of the last write
                 error = abs(self.prevQ_s_t_a_t_ - (self.r_prev + reward))  # reward final as q_s
                 p = self._getPriority(error)
                 self.tree.update(idx, p)
@@ -91,7 +97,7 @@ class ReplayPrioritised(replay_abc.ReplayABC):
                     error = 0.0
                 else:
                     error = abs(self.prevQ_s_t_a_t_ - self.r_prev - gamma_Q_s_tplu1_maxa_)
-                experience = [self.s_prev, self.s_ori_prev, self.a_prev, self.r_prev, state, state_ori, terminal]
+                experience = [self.s_prev, self.s_ori_prev, self.a_prev, self.r_prev, state, state_ori, terminal, mask]
                 self.s_prev, self.s_ori_prev, self.a_prev, self.r_prev = state, state_ori, action, reward
                 self.prevQ_s_t_a_t_ = Q_s_t_a_t_
 
@@ -108,28 +114,12 @@ class ReplayPrioritised(replay_abc.ReplayABC):
         p = self._getPriority(error)
         self.tree.add(p, experience)
 
-    def sample_batch(self):  # batch size as n here
-        batch = []
-        indexes = []
-        probabilities = []
-
-        # it takes floor so it doesnt take the last one into account
-        segment = self.tree.total() / self.batch_size
-
-        for ii in range(self.batch_size):
-            a = segment * ii
-            b = segment * (ii + 1)
-
-            s = random.uniform(a, b)
-            (idx, p, experience) = self.tree.get(s)
-            if experience != 0:
-                batch.append(experience)
-                indexes.append(idx)
-                probabilities.append(p)
-                # ii += 1
-            else:
-                pass
-
+    def sample_batch(self, with_weights=False):  # batch size as n here
+        """
+        Samples one experience from each of batch_size equal segments of the total priority. With with_weights the
+        normalised importance-sampling weights of the experiences are appended to the returned tuple and beta is annealed
+        """
+        indexes, batch, weights = self.tree.sample(self.batch_size, self.beta, self.rng)
 
         s_batch = np.array([_[0] for _ in batch])
         s_ori_batch = np.array([_[1] for _ in batch])
@@ -138,14 +128,19 @@ class ReplayPrioritised(replay_abc.ReplayABC):
         s2_batch = np.array([_[4] for _ in batch])
         s2_ori_batch = np.array([_[5] for _ in batch])
         t_batch = np.array([_[6] for _ in batch])
+        mask_batch = None
+        if all(len(_) > 7 and _[7] is not None for _ in batch):
+            mask_batch = np.array([_[7] for _ in batch], dtype=bool)
 
-        # TODO - N means capacity - do we change it when it's not filled?
-        weights = (np.array(probabilities) * self.tree.capacity) ** (-self.beta)
-        w_max = max(weights)
-        weights /= w_max
-
-        return s_batch, s_ori_batch, a_batch, r_batch, s2_batch, s2_ori_batch, t_batch, indexes, None
+        ret = s_batch, s_ori_batch, a_batch, r_batch, s2_batch, s2_ori_batch, t_batch, indexes, mask_batch
+        if with_weights:
+            self.beta = min(1., self.beta + self.beta_increment)
+            ret += (weights,)
+        return ret
 
     def update(self, idx, error):
         p = self._getPriority(error)
         self.tree.update(idx, p)
+
+    def update_batch(self, indexes, errors):
+        self.tree.update_batch(indexes, self._getPriority(np.asarray(errors)))
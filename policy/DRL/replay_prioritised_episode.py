@@ -37,9 +37,13 @@ class ReplayPrioritisedEpisode(replay_abc.ReplayABC):
     stored as a tuple (s, a, r, s_1, terminal) in SumTree
     """
 
-    def __init__(self, buffer_size, batch_size, random_seed=1234):
+    beta_increment = 0.  # default for buffers pickled before beta was annealed
+    rng = np.random  # default for buffers pickled before they had their own random state
+
+    def __init__(self, buffer_size, batch_size, random_seed=1234, beta=0.4, beta_steps=0):
         """
-        The right side of the deque contains the most recent experiences
+        The importance-sampling exponent beta grows linearly from its start value to 1 over beta_steps weighted
+        minibatches, it stays constant if beta_steps is 0
         """
         self.tree = PER.sum_tree.SumTree(buffer_size)
         self.batch_size = batch_size
@@ -50,10 +54,12 @@ class ReplayPrioritisedEpisode(replay_abc.ReplayABC):
         # p_i = (p + e)^a
         self.e = 0.00000001
         self.a = 0.6  # values suggested by authors
-        self.beta = 0.4  # to 1 - values suggested by authors
+        self.beta = beta  # to 1 - 0.4 suggested by authors
+        self.beta_increment = (1. - beta) / beta_steps if beta_steps > 0 else 0.
 
         self.previous_index = None  # TODO
         random.seed(random_seed)
+        self.rng = np.random.RandomState(random_seed)  # draws the samples
 
     def record(self, state, state_ori, action, reward, value, terminal=False, distribution=None, mask=None):
         """
@@ -114,40 +120,12 @@ class ReplayPrioritisedEpisode(replay_abc.ReplayABC):
         p = self._getPriority(error)
         self.tree.add(p, experience)
 
-    def sample_batch(self):  # batch size as n here
-        batch = []
-        indexes = []
-        # self.batch_size = 1
-        # it takes floor so it doesnt take the last one into account
-        segment = self.tree.total() / self.batch_size
-
-        # todo this is weird, sometimes the return is 0
-        ii = 0
-        # while ii < self.batch_size:
-        for ii in range(self.batch_size):
-            a = segment * ii
-            b = segment * (ii + 1)
-            # TODO test
-
-            s = random.uniform(a, b)
-            (idx, p, experience) = self.tree.get(s)
-            if experience != 0:
-                batch.append(experience)
-                indexes.append(idx)
-                # ii += 1
-            else:
-                pass
-                # assert False
-                # print ii, a, b, s, idx, p
-                # break
-        batch = np.array(batch)
-        # print batch
-
+    def sample_batch(self, with_weights=False):  # batch size as n here
         """
-        print batch[0]
-        print batch
-        print 'len',len(batch)
+        Samples one episode from each of batch_size equal segments of the total priority. With with_weights the
+        normalised importance-sampling weights of the episodes are appended to the returned list and beta is annealed
         """
+        indexes, batch, weights = self.tree.sample(self.batch_size, self.beta, self.rng)
 
         s_batch = []
         s_ori_batch = []
@@ -207,8 +185,14 @@ class ReplayPrioritisedEpisode(replay_abc.ReplayABC):
             ret.append(d_batch)
         if return_mask:
             ret.append(m_batch)
+        if with_weights:
+            self.beta = min(1., self.beta + self.beta_increment)
+            ret.append(weights)
         return ret
 
     def update(self, idx, error):
         p = self._getPriority(error)
         self.tree.update(idx, p)
+
+    def update_batch(self, indexes, errors):
+        self.tree.update_batch(indexes, self._getPriority(np.asarray(errors)))
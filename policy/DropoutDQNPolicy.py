@@ -54,7 +54,7 @@ from utils import ContextLogger, DiaAct
 import ontology.FlatOntologyManager as FlatOnt
 
 import tensorflow as tf
-from DRL.replay_bufferVanilla import ReplayBuffer
+from DRL.replay_buffer import ReplayBuffer
 from DRL.replay_prioritisedVanilla import ReplayPrioritised
 import DRL.utils as drlutils
 import DRL.dropout_dqn as dqn
@@ -387,18 +387,20 @@ class DropoutDQNPolicy(Policy.Policy):
             gamma_Q_s_tplu1_maxa_ = self.gamma * target_value_Q[np.argmax(admissible)]
 
 
+        # with compactreplay the buffer keeps only the executable actions, which is all training needs
+        state_ori = SummaryAction.CompactBelief(execMask) if self.compactreplay else state
         if weight == None:
             if self.replay_type == 'vanilla':
                 self.episodes[domainInControl].record(state=cState, \
-                                                      state_ori=state, action=cAction, reward=reward)
+                                                      state_ori=state_ori, action=cAction, reward=reward)
             elif self.replay_type == 'prioritized':
                 # heuristically assign 0.0 to Q_s_t_a_t_ and Q_s_tplu1_maxa_, doesn't matter as it is not used
                 self.episodes[domainInControl].record(state=cState, \
-                                                      state_ori=state, action=cAction, reward=reward, \
+                                                      state_ori=state_ori, action=cAction, reward=reward, \
                                                       Q_s_t_a_t_=Q_s_t_a_t_,
                                                       gamma_Q_s_tplu1_maxa_=gamma_Q_s_tplu1_maxa_, uniform=False)
         else:
-            self.episodes[domainInControl].record(state=cState, state_ori=state, action=cAction, reward=reward,
+            self.episodes[domainInControl].record(state=cState, state_ori=state_ori, action=cAction, reward=reward,
                                                   ma_weight=weight)
 
         self.actToBeRecorded = None
@@ -503,8 +505,6 @@ class DropoutDQNPolicy(Policy.Policy):
             s_batch, s_ori_batch, a_batch, r_batch, s2_batch, s2_ori_batch, t_batch, idx_batch, _ = \
                 self.episodes[self.domainString].sample_batch()
 
-            s_batch = np.vstack([np.expand_dims(x, 0) for x in s_batch])
-            s2_batch = np.vstack([np.expand_dims(x, 0) for x in s2_batch])
             # target_q = self.dqn.predict_target_with_action_maxQ(s2_batch)
             action_q = self.dqn.predict(s2_batch, self.epsilon_start) #alpha
             target_q = self.dqn.predict_target(s2_batch, 1.0)
@@ -463,15 +463,17 @@ class ENACPolicy(Policy.Policy):
         value = np.array([[0.0]])
         policy_mu = self.mu_prob
 
+        # the belief state is not used for training, with compactreplay it is not kept
+        state_ori = None if self.compactreplay else state
         if weight == None:
             if self.replay_type == 'vanilla':
                 self.episodes[domainInControl].record(state=cState, \
-                        state_ori=state, action=cAction, reward=reward, value=value[0][0], distribution=policy_mu)
+                        state_ori=state_ori, action=cAction, reward=reward, value=value[0][0], distribution=policy_mu)
             elif self.replay_type == 'prioritized':
                 self.episodes[domainInControl].record(state=cState, \
-                        state_ori=state, action=cAction, reward=reward, value=value[0][0], distribution=policy_mu)
+                        state_ori=state_ori, action=cAction, reward=reward, value=value[0][0], distribution=policy_mu)
         else:
-            self.episodes[domainInControl].record(state=cState, state_ori=state, action=cAction, reward=reward, ma_weight=weight)
+            self.episodes[domainInControl].record(state=cState, state_ori=state_ori, action=cAction, reward=reward, ma_weight=weight)
 
         self.actToBeRecorded = None
         self.samplecount += 1
@@ -40,6 +40,7 @@ This module encapsulates all classes and functionality which implement the GPSAR
     nu = 0.001
     scale = -1
     numprior = 0
+    cholesky = False
 
 .. seealso:: CUED Imports/Dependencies: 
 
@@ -57,7 +58,9 @@ __author__ = "cued_dialogue_systems_group"
 import numpy as np
 import math
 import scipy.stats
+import scipy.linalg
 import pickle as pkl
+import cStringIO
 import os.path
 import copy
 #from profilehooks import profile
@@ -107,6 +110,117 @@ class LearnerInterface:
     def LearningStep(self, pstate, paction, r, state, action, kernel):
         pass
 
+class GPDictionary(object):
+    '''
+    The GP dictionary of representative [state, action] pairs.
+
+    The pairs themselves are kept in self.points (this list is what gets pickled to the .dct file). Next to it the
+    belief vectors are packed row-wise into a preallocated, zero padded matrix and the actions are stored as indices
+    into a table of distinct actions, so that the kernel between a state and every dictionary point is one matrix
+    operation rather than a python loop over the dictionary.
+
+    The packed view is built lazily. Call invalidate() after modifying stored states or actions in place
+    (e.g. slot abstraction of the dictionary).
+    '''
+    def __init__(self, points=None):
+        self.points = list(points) if points is not None else []
+        self.invalidate()
+
+    def __len__(self):
+        return len(self.points)
+
+    def __iter__(self):
+        return iter(self.points)
+
+    def __getitem__(self, index):
+        return self.points[index]
+
+    def invalidate(self):
+        '''
+        Drops the packed view, it is rebuilt from self.points on next use
+        '''
+        self._vecs = None       # capacity x width matrix of zero padded belief vectors
+        self._lens = None       # unpadded length of each belief vector
+        self._acts = None       # index of each point's action in self._actionList
+        self._actionIndex = {}  # action string -> index in self._actionList
+        self._actionList = []   # one representative action object per distinct action string
+
+    def append(self, point):
+        '''
+        Adds a [state, action] pair to the dictionary
+        '''
+        self.points.append(point)
+        if self._vecs is not None:
+            self._pack(len(self.points) - 1)
+
+    def remove(self, index):
+        '''
+        Removes the point at index, later points move up by one
+        '''
+        n = len(self.points)
+        del self.points[index]
+        if self._vecs is not None:
+            self._vecs[index:n-1] = self._vecs[index+1:n]
+            self._lens[index:n-1] = self._lens[index+1:n]
+            self._acts[index:n-1] = self._acts[index+1:n]
+
+    def _build(self):
+        width = max([self._stateVec(state).size for [state, _] in self.points] + [1])
+        capacity = max(len(self.points), 16)
+        self._vecs = np.zeros((capacity, width))
+        self._lens = np.zeros(capacity, dtype=int)
+        self._acts = np.zeros(capacity, dtype=int)
+        self._actionIndex = {}
+        self._actionList = []
+        for i in xrange(len(self.points)):
+            self._pack(i)
+
+    def _pack(self, i):
+        state, action = self.points[i]
+        vec = self._stateVec(state)
+        capacity, width = self._vecs.shape
+        if i >= capacity:
+            # amortised O(1) append: double the number of rows
+            self._vecs = np.vstack((self._vecs, np.zeros((capacity, width))))
+            self._lens = np.concatenate((self._lens, np.zeros(capacity, dtype=int)))
+            self._acts = np.concatenate((self._acts, np.zeros(capacity, dtype=int)))
+        if vec.size > width:
+            self._vecs = np.hstack((self._vecs, np.zeros((self._vecs.shape[0], vec.size - width))))
+        self._vecs[i, :vec.size] = vec
+        self._lens[i] = vec.size
+        if action.act not in self._actionIndex:
+            self._actionIndex[action.act] = len(self._actionList)
+            self._actionList.append(action)
+        self._acts[i] = self._actionIndex[action.act]
+
+    @staticmethod
+    def _stateVec(state):
+        if state.beliefStateVec is None:
+            return np.zeros(0)
+        return np.asarray(state.beliefStateVec, dtype=float)
+
+    def kernelMatrix(self, state, actions, kernel, prior=False):
+        '''
+        Kernel values between the pairs (state, action) for each action in actions and all dictionary points.
+        Row i equals the python loop over the dictionary with kernel.ActionKernel and kernel.beliefKernel
+        (kernel.PriorKernel if prior is True) for actions[i].
+
+        :returns: len(actions) x N matrix
+        '''
+        if self._vecs is None:
+            self._build()
+        n = len(self.points)
+        vecs = self._vecs[:n]
+        lens = self._lens[:n]
+        if prior:
+            stateKer = kernel.priorKernelVector(state, vecs, lens)
+        else:
+            stateKer = kernel.beliefKernelVector(state, vecs, lens)
+        actKer = kernel.actionKernelMatrix(actions, self._actionList)[:, self._acts[:n]]
+        # non-positive action kernel values are taken as they are, without the belief kernel
+        return np.where(actKer > 0, actKer * stateKer, actKer)
+
+
 class GPSARSAPrior(LearnerInterface):
     '''
     Defines the GP prior. Derives from LearnerInterface.
@@ -125,7 +239,7 @@ class GPSARSAPrior(LearnerInterface):
         self._actionSize = 0
         self.initial = False
         self.terminal = False
-        self.params['_dictionary'] = []
+        self.params['_dictionary'] = GPDictionary()
         self.params['_alpha_tilda'] = []
         self._inputDictFile =""
         self._inputParamFile = ""
@@ -171,7 +285,7 @@ class GPSARSAPrior(LearnerInterface):
         Reads input policy dictionary file
         """
         with open(self._inputDictFile, 'rb') as pkl_file:
-            self.params['_dictionary'] = pkl.load(pkl_file)
+            self.params['_dictionary'] = GPDictionary(pkl.load(pkl_file))
         logger.info("In Prior class: Read dictionary of size " + str(len(self.params['_dictionary'])))
 
     def DictionarySize(self):
@@ -227,24 +341,17 @@ class GPSARSAPrior(LearnerInterface):
     def k_tilda(self,state, action, kernel):
         """
         Based on product between action and belief kernels. 
-        O(N) in dictionary size N.
+        O(N) in dictionary size N, evaluated as a single vector operation over the packed dictionary.
         :returns: vector of kernel values of given state, action and kernel with all state-action pairs in the dictionary
         """
-        res = []
-        for [dstate, daction] in self.params['_dictionary']:
-            actKer = kernel.ActionKernel(action, daction)
-            if actKer > 0:
-                if self._prior != None:
-                    # TODO - is this correct? seems to not use prior and be same as else: statement
-                    stateKer = kernel.PriorKernel(state, dstate)
-                else:
-                    stateKer = kernel.beliefKernel(state, dstate)
-
+        return self.k_tilda_actions(state, [action], kernel)[0]
 
-                res.append(actKer*stateKer)
-            else:
-                res.append(actKer)
-        return np.array(res)
+    def k_tilda_actions(self, state, actions, kernel):
+        """
+        Batched k_tilda() for several actions in the same state.
+        :returns: matrix with one row of kernel values against all dictionary points per action
+        """
+        return self.params['_dictionary'].kernelMatrix(state, actions, kernel, prior=self._prior != None)
 
 
 class GPSARSA(GPSARSAPrior):
@@ -268,9 +375,12 @@ class GPSARSA(GPSARSAPrior):
        self._scale scaling of the standard deviation when sampling Q-value, if -1 than taking the mean
        self.learning if true in learning mode
     """
-    def __init__(self, in_policyfile, out_policyfile, domainString=None, learning=False, sharedParams=None):
+    def __init__(self, in_policyfile, out_policyfile, domainString=None, learning=False, sharedParams=None,
+                 maxDictionarySize=0, evictionPolicy='oldest'):
         """
         Initialise the prior given policy files
+        maxDictionarySize bounds the number of dictionary points (0 for no bound), evictionPolicy is one of
+        'oldest', 'alpha' and 'novelty' (see selectEviction())
         """
         GPSARSAPrior.__init__(self,in_policyfile,out_policyfile,-1,learning,domainString,sharedParams)
         self.save_as_prior = False
@@ -294,14 +404,21 @@ class GPSARSA(GPSARSAPrior):
         self.params['_c_tilda'] = np.zeros(1)
         self.params['_a'] = np.ones(1)
         self.params['_alpha_tilda'] = np.zeros(1)
-        self.params['_dictionary'] = []
+        self.params['_dictionary'] = GPDictionary()
         self.params['_d'] = 0.
         self.params['_s'] = float('inf')
+        self.params['_K_tilda_chol'] = None     # Cholesky factor of the Gram matrix, only kept if self.cholesky
+        self.params['_buffers'] = {}            # preallocated storage backing the statistics, see _extendBuffer()
 
 
         self._random = False
         self._num_prior = 0
         self._scale = -1
+        self.cholesky = False
+        self.maxDictionarySize = maxDictionarySize
+        self.evictionPolicy = evictionPolicy
+        if self.evictionPolicy not in ['oldest', 'alpha', 'novelty']:
+            logger.error('Unknown dictionary eviction policy %s' % self.evictionPolicy)
         self._prior = None
         self.beliefparametrisation = 'GP'
         # self.learning = learning => set in GPSARSAPrior __init__
@@ -323,6 +440,8 @@ class GPSARSA(GPSARSAPrior):
             self._scale = Settings.config.getint('gpsarsa',"scale")
         if Settings.config.has_option("gpsarsa", "saveasnpy"):
             self.numpyFileFormat = Settings.config.getboolean('gpsarsa', "saveasnpy")
+        if Settings.config.has_option("gpsarsa", "cholesky"):
+            self.cholesky = Settings.config.getboolean('gpsarsa', "cholesky")
 
         # domain specific parameter settings (overrides general policy parameter settings)
         if Settings.config.has_option("gpsarsa_"+domainString, "saveasprior"):
@@ -341,6 +460,8 @@ class GPSARSA(GPSARSAPrior):
             self._scale = Settings.config.getint("gpsarsa_"+domainString,"scale")
         if Settings.config.has_option("gpsarsa_"+domainString, "saveasnpy"):
             self.numpyFileFormat = Settings.config.getboolean("gpsarsa_"+domainString, "saveasnpy")
+        if Settings.config.has_option("gpsarsa_"+domainString, "cholesky"):
+            self.cholesky = Settings.config.getboolean("gpsarsa_"+domainString, "cholesky")
 
         if self._num_prior == 0:
             self._inputDictFile = in_policyfile+".dct"
@@ -378,9 +499,10 @@ class GPSARSA(GPSARSAPrior):
             self.params['_c_tilda'] = np.array([])
             self.params['_a'] = np.array([])
             self.params['_alpha_tilda'] = np.array([])
-            self.params['_dictionary'] = []
+            self.params['_dictionary'] = GPDictionary()
             self.params['_d'] = 0
             self.params['_s'] = float('inf')
+            self.params['_K_tilda_chol'] = None
 
         self.initial = True
         self.terminal = False
@@ -400,30 +522,41 @@ class GPSARSA(GPSARSAPrior):
         :param: kernel
         :returns: mean and variance of GP for given state, action and kernel
         """
-        qprior = 0
-        qval = 0
-        qvar = 0
+        [means, variances] = self.QvalueMeanVarActions(state, [action], kernel)
+        return [means[0], variances[0]]
+
+    def QvalueMeanVarActions(self, state, actions, kernel):
+        """
+        Gets mean and variance of Q-value at (S,A) for every action A in actions, using one kernel matrix
+        between all actions and the whole dictionary.
+        :param: state
+        :param: actions list of actions
+        :param: kernel
+        :returns: arrays of means and variances of GP, one entry per action
+        """
+        qprior = np.zeros(len(actions))
+        qval = np.zeros(len(actions))
+        qvar = np.zeros(len(actions))
 
         #TODO come back to this
         if self._prior != None:
-            qprior = self._prior.QvalueMean(state, action, kernel)
+            qprior = np.array([self._prior.QvalueMean(state, action, kernel) for action in actions])
 
         if len(self.params['_dictionary']) > 0 :
-            k_tilda_t = self.k_tilda(state,action,kernel)
+            k_tilda_t = self.k_tilda_actions(state, actions, kernel)
             qval = np.dot(k_tilda_t, self.params['_alpha_tilda'])
-            qvar = np.dot(k_tilda_t, np.dot(self.params['_C_tilda'], k_tilda_t))
+            qvar = np.sum(np.dot(k_tilda_t, self.params['_C_tilda']) * k_tilda_t, axis=1)
 
-        mean = qprior + qval        
+        mean = qprior + qval
         if self._prior != None:
-            qorg = kernel.PriorKernel(state, state)*kernel.ActionKernel(action,action)
+            stateKer = kernel.PriorKernel(state, state)
         else:
-            qorg = kernel.beliefKernel(state,state)*kernel.ActionKernel(action,action)
+            stateKer = kernel.beliefKernel(state,state)
+        qorg = stateKer * np.array([kernel.ActionKernel(action, action) for action in actions], dtype=float)
         var = qorg - qvar
 
-        if var < 0:
-            #print '-\n'*5   # TODO - deal with this better - put this print statement so that when it occurs you DO SEE IT!
-            #logger.warning("Variance negative "+str(var))
-            var =0
+        # negative variances are set to 0
+        var[var < 0] = 0
         #if math.fabs(mean) > 100:
         #    logger.error("Mean very large "+str(mean))
 
@@ -461,14 +594,13 @@ class GPSARSA(GPSARSAPrior):
             return [Settings.random.choice(executable), 0,0]
 
         Q =[]
-        for action in executable:
+        [means, variances] = self.QvalueMeanVarActions(state, executable, kernel)
+        for action, mean, var in zip(executable, means, variances):
             if self._scale <= 0:
-                [mean, var] = self.QvalueMeanVar(state, action, kernel)
                 logger.debug('action: ' +str(action.act) + ' mean then var:\t\t\t ' + str(mean) + '  ' + str(math.sqrt(var)))
                 value = mean
                 gaussvar = 0
             else:
-                [mean, var ] = self.QvalueMeanVar(state, action, kernel)                
                 gaussvar = self._scale * math.sqrt(var)                        
                 value = gaussvar * Settings.random.randn() + mean     # Sample a Q value for this action
                 logger.debug('action: ' +str(action.act) + ' mean then var:\t\t\t ' + str(mean) + '  ' + str(gaussvar))
@@ -489,70 +621,114 @@ class GPSARSA(GPSARSAPrior):
         return [best_action, best_actions_sampled_Q_value, actions_likelihood]
 
 
-    def Extend(self,delta_prev, pstate, paction):
+    def Extend(self,delta_prev, pstate, paction, l_prev=None):
         """
         Add points pstate and paction in the dictionary and extend sufficient statistics matrices and vectors for one dimension
         Only used for the first state action pair in the episode
         """
+        self.extendKtildainv(self.params['_a'], delta_prev, l_prev)
+        self.extendVector('_alpha_tilda')
+        self.extendMatrix('_C_tilda')
+
         _a_prev = np.zeros(len(self.params['_dictionary']) + 1)
         _a_prev[-1] =1.0
-        _c_tilda_prev = np.zeros(len(self.params['_dictionary']) + 1)
-        _K_tilda_inv_prev = self.extendKtildainv(self.params['_K_tilda_inv'], self.params['_a'], delta_prev)
-        _alpha_tilda_prev = self.extendVector(self.params['_alpha_tilda'])
-        _C_tilda_prev = self.extendMatrix(self.params['_C_tilda'])
-
         self.params['_a'] = _a_prev
-        self.params['_alpha_tilda'] = _alpha_tilda_prev
-        self.params['_c_tilda'] = _c_tilda_prev
-        self.params['_C_tilda'] = _C_tilda_prev
-        self.params['_K_tilda_inv'] = _K_tilda_inv_prev
+        self.params['_c_tilda'] = np.zeros(len(self.params['_dictionary']) + 1)
 
         self.params['_dictionary'].append([pstate, paction])
         #self.checkKtildainv(kernel)
 
-    def extendMatrix(self, M):
+    def _extendBuffer(self, key):
+        """
+        Returns the preallocated buffer backing self.params[key] with room for at least one more dictionary point.
+        The capacity is doubled when the buffer is full, so the statistics are not reallocated and copied on every insert.
         """
-        Extend the dimentionality of matrix by one row and column -- new elements are zeros.
+        value = self.params[key]
+        n = value.shape[0]
+        buf = self.params['_buffers'].get(key)
+        if buf is None or value.base is not buf or buf.shape[0] <= n:
+            capacity = max(2 * (n + 1), 16)
+            buf = np.zeros((capacity,) * value.ndim)
+            buf[(slice(0, n),) * value.ndim] = value
+            self.params['_buffers'][key] = buf
+        return buf, n
+
+    def extendMatrix(self, key):
         """
-        lenM = len(M[0])
-        M_new = np.zeros((lenM+1, lenM+1))
-        M_new[:lenM,:lenM] = M
-        return M_new
+        Extend the dimentionality of matrix self.params[key] by one row and column -- new elements are zeros.
+        """
+        buf, lenM = self._extendBuffer(key)
+        buf[lenM, :lenM+1] = 0.0
+        buf[:lenM+1, lenM] = 0.0
+        self.params[key] = buf[:lenM+1, :lenM+1]
+        return self.params[key]
 
 
-    def extendVector(self, v):
+    def extendVector(self, key):
         """
-        Extend the dimensionality of vector by one element
+        Extend the dimensionality of vector self.params[key] by one element
         """
-        lenV = len(v)
-        v_new = np.zeros(lenV+1)
-        v_new[:lenV] = v
-        return v_new
+        buf, lenV = self._extendBuffer(key)
+        buf[lenV] = 0.0
+        self.params[key] = buf[:lenV+1]
+        return self.params[key]
     
-    def extendKtildainv(self, K_tilda_inv, a, delta_new):
+    def extendKtildainv(self, a, delta_new, l_new=None):
         """
         # grows nxn -> n+1xn+1 where n is dict size
-        :returns: inverse of the Gram matrix using the previous Gram matrix and partition inverse theorem
+        Updates the inverse of the Gram matrix in place using the partition inverse theorem, or, if self.cholesky is set,
+        appends the row [l_new, sqrt(delta_new)] to the Cholesky factor of the Gram matrix (l_new as returned by projectKtilda()).
         """
-        lenD = len(self.params['_dictionary'])
-        K_tilda_inv_new = np.zeros((lenD+1,lenD+1))   
-        K_tilda_inv_new[:lenD,:lenD] = K_tilda_inv + np.outer(a,a)/delta_new
-        K_tilda_inv_new[:lenD,lenD] = -a/delta_new      # new col
-        K_tilda_inv_new[lenD,:lenD] = -a/delta_new      # new row
-        K_tilda_inv_new[-1][-1] = 1/delta_new           # new corner
-        return K_tilda_inv_new
-
-
-    def ExtendNew(self, delta_new, state, action, kernel, _a_new, k_tilda_prev, k_tilda_new, delta_k_tilda_new):
+        if self.cholesky:
+            buf, lenD = self._extendBuffer('_K_tilda_chol')
+            buf[:lenD+1, lenD] = 0.0
+            buf[lenD, :lenD] = l_new
+            buf[lenD, lenD] = math.sqrt(delta_new)
+            self.params['_K_tilda_chol'] = buf[:lenD+1, :lenD+1]
+            return
+
+        buf, lenD = self._extendBuffer('_K_tilda_inv')
+        buf[:lenD,:lenD] += np.outer(a, a / delta_new)
+        buf[:lenD,lenD] = -a/delta_new      # new col
+        buf[lenD,:lenD] = -a/delta_new      # new row
+        buf[lenD,lenD] = 1/delta_new        # new corner
+        self.params['_K_tilda_inv'] = buf[:lenD+1, :lenD+1]
+
+    def projectKtilda(self, k_tilda):
+        """
+        Projects the kernel vector of a state-action pair onto the dictionary
+        :returns: a = K_tilda^-1 k_tilda, the kernel estimate k_tilda.a and, if self.cholesky is set, l = L^-1 k_tilda
+                  (L the Cholesky factor of K_tilda, else None)
+        """
+        if self.cholesky:
+            L = self.params['_K_tilda_chol']
+            l = scipy.linalg.solve_triangular(L, k_tilda, lower=True, check_finite=False)
+            a = scipy.linalg.solve_triangular(L, l, lower=True, trans='T', check_finite=False)
+            # computed as a squared norm the kernel estimate can not exceed the true kernel value by more than rounding
+            return a, np.dot(l, l), l
+        a = np.dot(self.params['_K_tilda_inv'], k_tilda)
+        return a, np.dot(k_tilda, a), None
+
+    def factoriseKtilda(self, kernel):
+        """
+        (Re)computes the Cholesky factor of the Gram matrix of the dictionary, e.g. after loading a policy from file
+        """
+        K_tilda = np.array([self.k_tilda(state, action, kernel) for [state, action] in self.params['_dictionary']])
+        try:
+            self.params['_K_tilda_chol'] = np.linalg.cholesky(K_tilda)
+        except np.linalg.LinAlgError:
+            logger.warning("Gram matrix of dictionary not positive definite - adding nu to its diagonal")
+            self.params['_K_tilda_chol'] = np.linalg.cholesky(K_tilda + self._nu * np.eye(len(K_tilda)))
+
+    def ExtendNew(self, delta_new, state, action, kernel, _a_new, k_tilda_prev, k_tilda_new, delta_k_tilda_new, l_new=None):
         """
         Add new state and action to the dictionary and extend sufficient statistics matrices and vectors for one dimension
         and reestimates all parameters apart form the ones involving the reward
         """
-        _K_tilda_inv_new = self.extendKtildainv(self.params['_K_tilda_inv'], _a_new, delta_new)
+        self.extendKtildainv(_a_new, delta_new, l_new)
         _a_new = np.zeros(len(self.params['_dictionary']) + 1)
         _a_new[-1] =1.0
-        _h_tilda_new = self.extendVector(self.params['_a'])
-        _h_tilda_new[-1] = - self._gamma
+        _h_tilda_new = np.append(self.params['_a'], - self._gamma)
 
         if self._prior != None:
             kernelValue = kernel.PriorKernel(state,state)
@@ -567,8 +743,7 @@ class GPSARSA(GPSARSAPrior):
         part2 = np.zeros(len(self.params['_dictionary']))\
                     if self.initial else (((self._gamma * (self._sigma ** 2)) * self.params['_c_tilda']) / self.params['_s'])
 
-        _c_tilda_new = self.extendVector(_h_tilda_new[:-1] - part1  + part2)
-        _c_tilda_new[-1] = _h_tilda_new[-1]
+        _c_tilda_new = np.append(_h_tilda_new[:-1] - part1  + part2, _h_tilda_new[-1])
 
         spart1 = (1.0 + (self._gamma ** 2))* (self._sigma **2)
         spart2 = np.dot(delta_k_tilda_new, np.dot(self.params['_C_tilda'], delta_k_tilda_new))
@@ -576,14 +751,11 @@ class GPSARSA(GPSARSAPrior):
                         - self._gamma*(self._sigma**2)) * (self._gamma * (self._sigma ** 2 )) / self.params['_s'])
 
         _s_new = spart1 + delta_k_new - spart2 + spart3
-        _alpha_tilda_new=self.extendVector(self.params['_alpha_tilda'])
-        _C_tilda_new = self.extendMatrix(self.params['_C_tilda'])
+        self.extendVector('_alpha_tilda')
+        self.extendMatrix('_C_tilda')
 
         self.params['_s'] = _s_new
-        self.params['_alpha_tilda'] = _alpha_tilda_new
         self.params['_c_tilda'] = _c_tilda_new
-        self.params['_C_tilda'] = _C_tilda_new
-        self.params['_K_tilda_inv'] = _K_tilda_inv_new
         self.params['_a'] = _a_new
         self.params['_dictionary'].append([state, action])
         #self.checkKtildainv(kernel)
@@ -609,6 +781,96 @@ class GPSARSA(GPSARSAPrior):
         self.params['_s'] = _s_new
         self.params['_a'] = _a_new
 
+    def _removeFromBuffer(self, key, index):
+        """
+        Removes element index (row and column index of a matrix) of self.params[key], compacting it within its buffer
+        """
+        buf, n = self._extendBuffer(key)
+        if buf.ndim == 2:
+            buf[index:n-1, :n] = buf[index+1:n, :n]
+            buf[:n-1, index:n-1] = buf[:n-1, index+1:n]
+            self.params[key] = buf[:n-1, :n-1]
+        else:
+            buf[index:n-1] = buf[index+1:n]
+            self.params[key] = buf[:n-1]
+        return self.params[key]
+
+    @staticmethod
+    def _cholupdate(L, x):
+        """
+        In place rank one update of the lower triangular Cholesky factor L to that of L L^T + x x^T
+        """
+        x = x.copy()
+        for k in xrange(len(x)):
+            r = math.hypot(L[k, k], x[k])
+            c = r / L[k, k]
+            s = x[k] / L[k, k]
+            L[k, k] = r
+            L[k+1:, k] = (L[k+1:, k] + s * x[k+1:]) / c
+            x[k+1:] = c * x[k+1:] - s * L[k+1:, k]
+
+    def selectEviction(self):
+        """
+        Chooses the dictionary point to remove when the dictionary exceeds self.maxDictionarySize, according to self.evictionPolicy:
+        oldest - the point added first
+        alpha - the point with the smallest absolute weight in _alpha_tilda, i.e. the smallest contribution to the posterior mean
+        novelty - the point best approximated by the rest of the dictionary (smallest ALD residual 1/[K_tilda^-1]_jj)
+        :returns: index of the point
+        """
+        if self.evictionPolicy == 'alpha':
+            return int(np.argmin(np.abs(self.params['_alpha_tilda'])))
+        elif self.evictionPolicy == 'novelty':
+            if self.cholesky:
+                # diagonal of the inverse needs the inverse factor - O(N^3), prefer oldest or alpha with the Cholesky option
+                L_inv = scipy.linalg.solve_triangular(self.params['_K_tilda_chol'], np.eye(len(self.params['_dictionary'])),
+                                                      lower=True, check_finite=False)
+                K_tilda_inv_diag = np.einsum('ij,ij->j', L_inv, L_inv)
+            else:
+                K_tilda_inv_diag = np.diag(self.params['_K_tilda_inv'])
+            return int(np.argmax(K_tilda_inv_diag))
+        return 0
+
+    def RemovePoint(self, index):
+        """
+        Removes a point from the dictionary. Its kernel function is replaced by its projection a onto the remaining points,
+        so every coefficient vector v becomes v[rest] + v[index]*a and _C_tilda becomes T C T^T with T = [I, a].
+        The inverse of the Gram matrix (or its Cholesky factor) is downdated accordingly.
+        """
+        n = len(self.params['_dictionary'])
+        rest = np.arange(n) != index
+
+        if self.cholesky:
+            L = self.params['_K_tilda_chol']
+            k_col = np.dot(L[rest], L[index])          # column of the Gram matrix without the removed point
+            x = L[index+1:, index].copy()
+            L = self._removeFromBuffer('_K_tilda_chol', index)
+            self._cholupdate(L[index:, index:], x)
+            proj = scipy.linalg.cho_solve((L, True), k_col, check_finite=False)
+        else:
+            K_inv = self.params['_K_tilda_inv']
+            q = K_inv[rest, index]
+            r = K_inv[index, index]
+            proj = -q / r
+            self._removeFromBuffer('_K_tilda_inv', index)
+            self.params['_K_tilda_inv'] -= np.outer(q, q / r)
+
+        C = self.params['_C_tilda']
+        C_col = C[rest, index]
+        C_corner = C[index, index]
+        self._removeFromBuffer('_C_tilda', index)
+        self.params['_C_tilda'] += np.outer(C_col, proj) + np.outer(proj, C_col + C_corner * proj)
+
+        alpha = self.params['_alpha_tilda'][index]
+        self._removeFromBuffer('_alpha_tilda', index)
+        self.params['_alpha_tilda'] += alpha * proj
+
+        # episode statistics live in the same coefficient space
+        for key in ['_c_tilda', '_a']:
+            if len(self.params[key]) == n:
+                self.params[key] = self.params[key][rest] + self.params[key][index] * proj
+
+        self.params['_dictionary'].remove(index)
+
     #@profile
     def LearningStep(self, pstate, paction, reward, state, action, kernel):
         """
@@ -634,30 +896,36 @@ class GPSARSA(GPSARSAPrior):
                 offset = self._prior.QvalueMean(pstate,paction,kernel)
 
             reward = reward - offset
+        if self.cholesky and self.params['_K_tilda_chol'] is None and len(self.params['_dictionary']) > 0:
+            # e.g. dictionary read from file, where only the explicit inverse is stored
+            self.factoriseKtilda(kernel)
         # INIT:
         if len(self.params['_dictionary']) == 0:
-            self.params['_K_tilda_inv'] = np.zeros((1, 1))
             if self._prior != None:
-                self.params['_K_tilda_inv'][0][0] = 1.0 / (kernel.PriorKernel(pstate, pstate) * kernel.ActionKernel(paction, paction))
+                kernelValue = kernel.PriorKernel(pstate, pstate) * kernel.ActionKernel(paction, paction)
             else:
-                self.params['_K_tilda_inv'][0][0] = 1.0 / (kernel.beliefKernel(pstate, pstate) * kernel.ActionKernel(paction, paction))
+                kernelValue = kernel.beliefKernel(pstate, pstate) * kernel.ActionKernel(paction, paction)
+            self.params['_K_tilda_inv'] = np.zeros((1, 1))
+            self.params['_K_tilda_inv'][0][0] = 1.0 / kernelValue
+            if self.cholesky:
+                self.params['_K_tilda_chol'] = np.array([[math.sqrt(kernelValue)]])
 
             self.params['_dictionary'].append([pstate, paction])
 
         elif self.initial :
             k_tilda_prev = self.k_tilda(pstate,paction,kernel)
-            self.params['_a'] = np.dot(self.params['_K_tilda_inv'], k_tilda_prev)
+            self.params['_a'], ker_est, l_prev = self.projectKtilda(k_tilda_prev)
             self.params['_c_tilda'] = np.zeros(len(self.params['_dictionary']))
             if self._prior != None:
-                delta_prev = kernel.PriorKernel(pstate,pstate)*kernel.ActionKernel(paction,paction) - np.dot(k_tilda_prev, self.params['_a'])
+                delta_prev = kernel.PriorKernel(pstate,pstate)*kernel.ActionKernel(paction,paction) - ker_est
             else:
-                delta_prev = kernel.beliefKernel(pstate,pstate)*kernel.ActionKernel(paction,paction) - np.dot(k_tilda_prev, self.params['_a'])
+                delta_prev = kernel.beliefKernel(pstate,pstate)*kernel.ActionKernel(paction,paction) - ker_est
 
             self.params['_d'] = 0.0
             self.params['_s'] = float('inf')
 
             if delta_prev > self._nu :
-                self.Extend(delta_prev, pstate, paction)
+                self.Extend(delta_prev, pstate, paction, l_prev)
 
         k_tilda_prev = self.k_tilda(pstate,paction,kernel)        
 
@@ -665,17 +933,17 @@ class GPSARSA(GPSARSAPrior):
         if self.terminal:
             _a_new = np.zeros(len(self.params['_dictionary']))
             delta_new = 0.0
+            l_new = None
             delta_k_tilda_new = k_tilda_prev                        
         else:   
             k_tilda_new = self.k_tilda(state, action, kernel)      
-            _a_new = np.dot(self.params['_K_tilda_inv'], k_tilda_new)
+            _a_new, ker_est, l_new = self.projectKtilda(k_tilda_new)
 
             if self._prior != None:
                 curr_ker = kernel.PriorKernel(state,state)*kernel.ActionKernel(action,action)
             else:
                 curr_ker = kernel.beliefKernel(state,state)*kernel.ActionKernel(action,action)
 
-            ker_est = np.dot(k_tilda_new, _a_new)
             delta_new = curr_ker - ker_est
             delta_k_tilda_new = k_tilda_prev - self._gamma*k_tilda_new
 
@@ -691,7 +959,7 @@ class GPSARSA(GPSARSAPrior):
             logger.warning("Negative sparcification "+str(delta_new))
          
         if delta_new > self._nu :
-            self.ExtendNew(delta_new, state, action, kernel, _a_new, k_tilda_prev, k_tilda_new, delta_k_tilda_new)
+            self.ExtendNew(delta_new, state, action, kernel, _a_new, k_tilda_prev, k_tilda_new, delta_k_tilda_new, l_new)
         else:
             self.NoExtend(_a_new, delta_k_tilda_new)
         
@@ -701,7 +969,13 @@ class GPSARSA(GPSARSAPrior):
         #    self._optimise_hyperparameters()
 
         self.params['_alpha_tilda'] += self.params['_c_tilda'] * (self.params['_d'] / self.params['_s'])
-        self.params['_C_tilda'] += np.outer(self.params['_c_tilda'], self.params['_c_tilda']) / self.params['_s']
+        # rank one update in place - _C_tilda is a view of its preallocated buffer
+        self.params['_C_tilda'] += np.outer(self.params['_c_tilda'], self.params['_c_tilda'] / self.params['_s'])
+
+        # budgeted dictionary:
+        if self.maxDictionarySize > 0:
+            while len(self.params['_dictionary']) > self.maxDictionarySize:
+                self.RemovePoint(self.selectEviction())
 
                 
     def checkKtildainv(self, kernel):
@@ -759,7 +1033,7 @@ class GPSARSA(GPSARSAPrior):
         if inputDictFile not in  ["",".dct"]:
             logger.info("Loading dictionary file " + inputDictFile)
             with open(inputDictFile,'rb') as pkl_file:
-                self.params['_dictionary'] = pkl.load(pkl_file)
+                self.params['_dictionary'] = GPDictionary(pkl.load(pkl_file))
                 #logger.info("Read dictionary of size "+str(len(self.sharedParams['_dictionary'])))
                 logger.info("in SARSA class: Read dictionary of size " + str(len(self.params['_dictionary'])))
         else:
@@ -797,6 +1071,7 @@ class GPSARSA(GPSARSAPrior):
                 self.params['_d'] = pkl.load(pkl_file)
                 self.params['_s'] = pkl.load(pkl_file)
                 #-------------------------------
+        self.params['_K_tilda_chol'] = None
 
     def saveDictionary(self):
         """
@@ -807,9 +1082,9 @@ class GPSARSA(GPSARSAPrior):
         outputDictFile = self._outputDictFile
         if self.sharedParams:
             outputDictFile = self._outputDictFile.replace(self.domainString, 'singlemodel')
-        PolicyUtils.checkDirExistsAndMake(outputDictFile)
-        with open(outputDictFile,'wb') as pkl_file:
-            pkl.dump(self.params['_dictionary'], pkl_file)
+        pkl_file = cStringIO.StringIO()
+        pkl.dump(self.params['_dictionary'].points, pkl_file)
+        PolicyUtils.writeFile(outputDictFile, pkl_file.getvalue())
 
 
     def saveParameters(self):
@@ -819,31 +1094,48 @@ class GPSARSA(GPSARSAPrior):
         outputParamFile = self._outputParamFile
         if self.sharedParams:
             outputParamFile = self._outputParamFile.replace(self.domainString, 'singlemodel')
-        PolicyUtils.checkDirExistsAndMake(outputParamFile)
-        with open(outputParamFile,'wb') as pkl_file:
-            if self.numpyFileFormat:
-                np.savez(pkl_file, _K_tilda_inv=self.params['_K_tilda_inv'], _C_tilda=self.params['_C_tilda'], _c_tilda=self.params['_c_tilda'], _a=self.params['_a'], _alpha_tilda=self.params['_alpha_tilda'], _d=self.params['_d'], _s=self.params['_s'])
-            else:
-                # ORDER MUST BE THE SAME HERE AS IN readParameters() above.
-                pkl.dump(self.params['_K_tilda_inv'], pkl_file)
-                pkl.dump(self.params['_C_tilda'], pkl_file)
-                pkl.dump(self.params['_c_tilda'], pkl_file)
-                pkl.dump(self.params['_a'], pkl_file)
-                pkl.dump(self.params['_alpha_tilda'], pkl_file)
-                pkl.dump(self.params['_d'], pkl_file)
-                pkl.dump(self.params['_s'], pkl_file)
-                #-------------------------------
+        if self.cholesky and self.params['_K_tilda_chol'] is not None:
+            # policy files always hold the explicit inverse of the Gram matrix
+            L = self.params['_K_tilda_chol']
+            self.params['_K_tilda_inv'] = scipy.linalg.cho_solve((L, True), np.eye(len(L)), check_finite=False)
+        # serialised here, the file itself may be written in the background (see PolicyUtils.writeFile)
+        pkl_file = cStringIO.StringIO()
+        if self.numpyFileFormat:
+            np.savez(pkl_file, _K_tilda_inv=self.params['_K_tilda_inv'], _C_tilda=self.params['_C_tilda'], _c_tilda=self.params['_c_tilda'], _a=self.params['_a'], _alpha_tilda=self.params['_alpha_tilda'], _d=self.params['_d'], _s=self.params['_s'])
+        else:
+            # ORDER MUST BE THE SAME HERE AS IN readParameters() above.
+            pkl.dump(self.params['_K_tilda_inv'], pkl_file)
+            pkl.dump(self.params['_C_tilda'], pkl_file)
+            pkl.dump(self.params['_c_tilda'], pkl_file)
+            pkl.dump(self.params['_a'], pkl_file)
+            pkl.dump(self.params['_alpha_tilda'], pkl_file)
+            pkl.dump(self.params['_d'], pkl_file)
+            pkl.dump(self.params['_s'], pkl_file)
+            #-------------------------------
+        PolicyUtils.writeFile(outputParamFile, pkl_file.getvalue())
 
     def savePrior(self, priordictfile, priorparamfile):
         """
         Saves the current GP as a prior (these are only the parameters needed to estimate the mean)
         """
-        PolicyUtils.checkDirExistsAndMake(priordictfile)
-        with open(priordictfile, 'wb') as pkl_file:
-            pkl.dump(self.params['_dictionary'], pkl_file)
-        PolicyUtils.checkDirExistsAndMake(priorparamfile)
-        with open(priorparamfile, 'wb') as pkl_file:
-            pkl.dump(self.params['_alpha_tilda'], pkl_file)
+        PolicyUtils.writeFile(priordictfile, pkl.dumps(self.params['_dictionary'].points))
+        PolicyUtils.writeFile(priorparamfile, pkl.dumps(self.params['_alpha_tilda']))
+
+    def reconfigure(self, learning, out_policyfile):
+        """Sets the learning flag, the output policy file and the scale (from the config) of the next phase of a warm session.
+
+        :param learning: whether to learn in the next phase
+        :param out_policyfile: output policy file of the next phase
+        :returns: None
+        """
+        self.learning = learning
+        self._outpolicyfile = out_policyfile
+        self._outputDictFile = out_policyfile + ".dct"
+        self._outputParamFile = out_policyfile + ".prm"
+        if Settings.config.has_option('gpsarsa', "scale"):
+            self._scale = Settings.config.getint('gpsarsa',"scale")
+        if Settings.config.has_option("gpsarsa_"+self.domainString, "scale"):
+            self._scale = Settings.config.getint("gpsarsa_"+self.domainString,"scale")
 
     def savePolicy(self):
         """Saves the GP dictionary (.dct) and parameters (.prm). Saves as a prior if self.save_as_prior is True.
@@ -31,6 +31,8 @@ Copyright CUED Dialogue Systems Group 2015 - 2017
     [gppolicy]
     kernel = polysort
     thetafile = ''    
+    maxdictsize = 0
+    evictionpolicy = oldest
 
 .. seealso:: CUED Imports/Dependencies: 
 
@@ -98,6 +100,8 @@ class GPPolicy(Policy,PolicyCommittee.CommitteeMember):
         self.unabstract_slots = False
         self.doForceSave = False
         self.beliefParametrisation = None
+        self.maxDictionarySize = 0          # 0: dictionary is unbounded
+        self.evictionPolicy = 'oldest'
          
         # CONFIG:
         if Settings.config.has_option('gppolicy',"abstractslots"):
@@ -135,6 +139,10 @@ class GPPolicy(Policy,PolicyCommittee.CommitteeMember):
             self.action_kernel_type = Settings.config.get('gppolicy', "actionkerneltype")
         if Settings.config.has_option('gppolicy', "doforcesave"):
             self.beliefParametrisation = Settings.config.getboolean('gppolicy', "doforcesave")
+        if Settings.config.has_option('gppolicy', "maxdictsize"):
+            self.maxDictionarySize = Settings.config.getint('gppolicy', "maxdictsize")
+        if Settings.config.has_option('gppolicy', "evictionpolicy"):
+            self.evictionPolicy = Settings.config.get('gppolicy', "evictionpolicy")
 
         if Settings.config.has_option("gppolicy_" + domainString, "kernel"):
             self.kerneltype = Settings.config.get("gppolicy_" + domainString, "kernel")
@@ -146,9 +154,14 @@ class GPPolicy(Policy,PolicyCommittee.CommitteeMember):
             self.action_kernel_type = Settings.config.get("gppolicy_" + domainString, "actionkerneltype")
         if Settings.config.has_option("gppolicy_" + domainString, "doforcesave"):
             self.beliefParametrisation = Settings.config.getboolean("gppolicy_" + domainString, "doforcesave")
+        if Settings.config.has_option("gppolicy_" + domainString, "maxdictsize"):
+            self.maxDictionarySize = Settings.config.getint("gppolicy_" + domainString, "maxdictsize")
+        if Settings.config.has_option("gppolicy_" + domainString, "evictionpolicy"):
+            self.evictionPolicy = Settings.config.get("gppolicy_" + domainString, "evictionpolicy")
 
         # Learning algorithm:
-        self.learner = GPSARSA(inpolicyfile,outpolicyfile,domainString=domainString, learning=self.learning, sharedParams=sharedParams)
+        self.learner = GPSARSA(inpolicyfile,outpolicyfile,domainString=domainString, learning=self.learning, sharedParams=sharedParams,
+                               maxDictionarySize=self.maxDictionarySize, evictionPolicy=self.evictionPolicy)
         
         # Load slot abstraction mapping - for everything BCM related         
         if self.abstract_slots and self.unabstract_slots:   # enforce some logic on your config settings:
@@ -248,6 +261,13 @@ class GPPolicy(Policy,PolicyCommittee.CommitteeMember):
         '''
         if self.learning or (FORCE_SAVE and self.doForceSave):
             self.learner.savePolicy()
+
+    def reconfigure(self, learning, out_policy_file):
+        '''
+        Also switches the learner, which reads the scale of the next phase from the config.
+        '''
+        super(GPPolicy, self).reconfigure(learning, out_policy_file)
+        self.learner.reconfigure(learning, out_policy_file)
         
     def train(self):
         '''
@@ -349,8 +369,8 @@ class GPPolicy(Policy,PolicyCommittee.CommitteeMember):
         executable = self._createExecutable(nonExecutableActions) # own domains abstracted actions
         
         values = {}
-        for executable_i in executable:           
-            [mean, variance] = self.learner.QvalueMeanVar(state=abstracted_currentstate, action=executable_i, kernel=self.kernel)                      
+        [means, variances] = self.learner.QvalueMeanVarActions(state=abstracted_currentstate, actions=executable, kernel=self.kernel)
+        for executable_i, mean, variance in zip(executable, means, variances):
             values[executable_i.act] ={'mu':mean, 'variance':variance} 
         return values        
 
@@ -595,6 +615,7 @@ class GPPolicy(Policy,PolicyCommittee.CommitteeMember):
             if self.learner.params['_dictionary'][i][1].is_abstract:
                 self.learner.params['_dictionary'][i][1].act = self._unabstract_action(self.learner.params['_dictionary'][i][1].act)
                 self.learner.params['_dictionary'][i][1].is_abstract = False
+        self.learner.params['_dictionary'].invalidate()
         logger.info('Un-abstracted dictionary in domain {}'.format(self.domainString))
         return               
     
@@ -628,6 +649,7 @@ class GPPolicy(Policy,PolicyCommittee.CommitteeMember):
                 # Use GPAction instance method replaceAction() to perform the action abstraction:
                 self.learner.params['_dictionary'][i][1].act = self.learner.params['_dictionary'][i][1].replaceAction(act, self.replace)
                 self.learner.params['_dictionary'][i][1].is_abstract = True
+        self.learner.params['_dictionary'].invalidate()
         logger.info('Abstracted dictionary in domain {}'.format(self.domainString))
         return  
     
@@ -782,8 +804,52 @@ class Kernel(object):
                 ker = 0     # if this happened frequently (or at all) --> would avoid all above calculation and check this first ...
 
         return ker
-    
-    
+
+    def beliefKernelVector(self, ns, vecs, lens):
+        '''
+        Kernel values between GP state ns and every row of vecs, a matrix of zero padded belief vectors
+        whose true lengths are given in lens. Row by row this is the same as beliefKernel()
+        '''
+        ker = np.zeros(len(lens))
+
+        # 1. Calculate actual kernel
+        if self.kernel_type == 'polysort':
+            nsvec = ns.beliefStateVec
+            if len(nsvec) <= vecs.shape[1]:
+                # rows of a different length (committee calculations) keep kernel value 0
+                match = lens == len(nsvec)
+                if match.all():
+                    ker = np.dot(vecs[:, :len(nsvec)], nsvec)
+                elif match.any():
+                    ker[match] = np.dot(vecs[match, :len(nsvec)], nsvec)
+
+        # 2. DEAL WITH DERIVATIVES (depending on self.der)
+        return self._derivativeVector(ker)
+
+    def beliefKernelDiagonal(self, vecs, lens):
+        '''
+        Kernel value of every row of the packed belief matrix vecs with itself
+        '''
+        if self.kernel_type == 'polysort':
+            ker = np.einsum('ij,ij->i', vecs, vecs)    # zero padding does not contribute
+        else:
+            ker = np.zeros(len(lens))
+        return self._derivativeVector(ker)
+
+    def _derivativeVector(self, ker):
+        if self.kernel_type == 'gausssort':
+            if self.der == None:
+                ker = self.theta[0]*self.theta[0] * np.exp(-ker / self.theta[1]*self.theta[1])
+            elif self.der == 0:
+                ker = 2 * self.theta[0] * np.exp(-ker / self.theta[1]*self.theta[1])
+            elif self.der == 1:
+                ker = self.theta[0]*self.theta[0] * np.exp(-ker / self.theta[1]*self.theta[1]) * \
+                        ker / self.theta[1]*self.theta[1]*self.theta[1]
+            else:
+                ker = np.zeros(len(ker))
+        return ker
+
+
     def hdc_action_kernel(self,na,a):
         ''' Rough handcrafted generalisation away from just identity matrix. 
         '''
@@ -818,7 +884,23 @@ class Kernel(object):
             return self._externally_defined_(na.act,a.act)
         else:
             logger.error('Unknown action kernel type %s' % self.action_kernel_type)
-    
+
+    def actionKernelMatrix(self, nas, actions):
+        '''
+        Action kernel between every action in nas (rows) and every action in actions (columns)
+        '''
+        K = np.zeros((len(nas), len(actions)))
+        if self.action_kernel_type == 'delta':
+            columns = dict((a.act, j) for j, a in enumerate(actions))
+            for i, na in enumerate(nas):
+                if na.act in columns:
+                    K[i, columns[na.act]] = 1.0
+        else:
+            for i, na in enumerate(nas):
+                for j, a in enumerate(actions):
+                    K[i, j] = self.ActionKernel(na, a)
+        return K
+
     #def _externally_defined_(self, na_string,a_string):
     #    pass # action kernel to be overridden somewhere else
 
@@ -832,6 +914,16 @@ class Kernel(object):
 
         return core/math.sqrt(nskernel*skernel)
 
+    def priorKernelVector(self, ns, vecs, lens):
+        '''
+        PriorKernel() between GP state ns and every row of the packed belief matrix vecs
+        '''
+        core = self.beliefKernelVector(ns, vecs, lens)
+        nskernel = self.beliefKernel(ns, ns)
+        skernel = self.beliefKernelDiagonal(vecs, lens)
+
+        return core/np.sqrt(nskernel*skernel)
+
 class ParameterisedActionKernel(object):   
     def __init__(self, action_names):
         '''action names is a list of strings
@@ -1122,7 +1214,7 @@ class GPState(State):
         
         :return: the sorted belief state value vector
         '''
-        bel = copy.deepcopy(belief)
+        bel = dict(belief)  # the values are floats, a shallow copy is enough
         res = []
 
         if '**NONE**' not in belief:
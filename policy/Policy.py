@@ -78,6 +78,13 @@ class Policy(object):
         if Settings.config.has_option('policy_'+domainString, 'useconfreq'):
             self.useconfreq = Settings.config.getboolean('policy_'+domainString, 'useconfreq')
         
+        # DRL policies: keep only what training needs of the belief states in the replay buffer
+        self.compactreplay = False
+        if Settings.config.has_option('policy', 'compactreplay'):
+            self.compactreplay = Settings.config.getboolean('policy', 'compactreplay')
+        if Settings.config.has_option('policy_'+domainString, 'compactreplay'):
+            self.compactreplay = Settings.config.getboolean('policy_'+domainString, 'compactreplay')
+        
         # episode information to be collected for all relevant domains
         # used mostly for training
         self.episode_stack = None
@@ -247,6 +254,23 @@ class Policy(object):
         '''
         pass
     
+    def reconfigure(self, learning, out_policy_file):
+        '''
+        Switches a policy kept in memory between the train and test phases of a warm session (see pydial.py) instead of
+        building it again. Sub-classes with other phase dependent settings should extend it.
+        
+        :param learning: whether the policy learns in the next phase
+        :type learning: bool
+        :param out_policy_file: the file the policy is saved to in the next phase
+        :type out_policy_file: str
+        '''
+        self.learning = learning
+        # the deep RL policies keep the flag and the file themselves
+        if hasattr(self, 'is_training'):
+            self.is_training = learning
+        if hasattr(self, 'out_policy_file'):
+            self.out_policy_file = out_policy_file
+    
     def restart(self):
         '''
         Restarts the policy. Resets internal variables.
@@ -76,6 +76,26 @@ class PolicyManager(object):
                 self.domainPolicies[dstring].savePolicy(FORCE_SAVE)
         return   
         
+    def reconfigure(self):
+        '''
+        Applies the learning flag and the output policy file of the config to the policies which are already loaded.
+        Used by the warm sessions of pydial.py between the train and test phases.
+        '''
+        for dstring, policy in self.domainPolicies.iteritems():
+            if policy is None or dstring in self.SPECIAL_DOMAINS:
+                continue
+            learning = False
+            out_policy_file = ''
+            if Settings.config.has_option('policy', 'learning'):
+                learning = Settings.config.getboolean('policy', 'learning')
+            if Settings.config.has_option('policy', 'outpolicyfile'):
+                out_policy_file = Settings.config.get('policy', 'outpolicyfile')
+            if Settings.config.has_option('policy_'+dstring, 'learning'):
+                learning = Settings.config.getboolean('policy_'+dstring, 'learning')
+            if Settings.config.has_option('policy_'+dstring, 'outpolicyfile'):
+                out_policy_file = Settings.config.get('policy_'+dstring, 'outpolicyfile')
+            policy.reconfigure(learning, out_policy_file)
+
     def bootup(self, domainString):
         '''Loads a policy for a given domain. 
         '''
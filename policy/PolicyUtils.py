@@ -34,6 +34,10 @@ Local/file variables::
     ZERO_THRESHOLD:             unused
     REQUESTING_THRESHOLD:       affects getRequestedSlots() method
 
+Policy files are written with :func:`writeFile`. After :func:`startBackgroundWrites` (used by the warm sessions of
+pydial.py) the writes are done by a background thread while the dialogues go on, :func:`flushWrites` waits for them.
+Processes forked from it write their files directly.
+
 .. seealso:: CUED Imports/Dependencies: 
 
     import :mod:`ontology.Ontology` |.|
@@ -50,6 +54,8 @@ Local/file variables::
 __author__ = "cued_dialogue_systems_group"
 import copy
 import os
+import threading
+from collections import OrderedDict
 
 from numpy.core.numeric import full
 
@@ -80,7 +86,7 @@ def getGlobalAction(belief, globalact, domainString):
 
     # First get the name for the name goal.
     topvalue, topbelief = SummaryUtils.getTopBelief(belief['beliefs']['name'])
-    toptwo, _ = SummaryUtils.getTopBeliefsExcludingNone(belief['beliefs']['name'])
+    toptwo, _ = SummaryUtils.getBeliefSummary(belief, domainString).topHyps('name')
     if topvalue == '**NONE**' or topvalue == 'dontcare' or topbelief < 0.8:
         topnamevalue = ''
     else:
@@ -369,6 +375,95 @@ def checkDirExistsAndMake(fullpath):
                 raise
     else:
         return  # nothing to do, saving to root
-        
+
+
+_writer = None              # background thread of startBackgroundWrites()
+_writer_pid = None          # process of the background thread, a forked process writes directly
+_pending = OrderedDict()    # path -> data still to be written by the background thread
+_writing = [False]          # whether the background thread is writing a file
+_write_errors = []
+_write_condition = threading.Condition()
+
+
+def _write(fullpath, data):
+    '''Writes through a temporary file, so that a policy file is never seen half written.
+    '''
+    tmppath = fullpath + '.tmp'
+    with open(tmppath, 'wb') as f:
+        f.write(data)
+    os.rename(tmppath, fullpath)
+
+
+def _writeInBackground():
+    while True:
+        with _write_condition:
+            while not _pending and _writer is not None:
+                _write_condition.wait()
+            if not _pending:
+                return
+            fullpath, data = _pending.popitem(last=False)
+            _writing[0] = True
+        try:
+            _write(fullpath, data)
+        except (IOError, OSError) as e:
+            _write_errors.append(e)
+        with _write_condition:
+            _writing[0] = False
+            _write_condition.notify_all()
+
+
+def writeFile(fullpath, data):
+    '''Writes the (already serialised) data of a policy file, creating its directory if needed. In the background if
+    :func:`startBackgroundWrites` was called in this process, then a later write to the same file replaces a pending one.
+
+    :param fullpath: path of the file
+    :type fullpath: str
+    :param data: content of the file
+    :type data: str
+    '''
+    checkDirExistsAndMake(fullpath)
+    with _write_condition:
+        if _writer is not None and _writer_pid == os.getpid():
+            _pending[fullpath] = data
+            _write_condition.notify_all()
+            return
+    _write(fullpath, data)
+
+
+def startBackgroundWrites():
+    '''Starts the thread writing the files given to :func:`writeFile`.
+    '''
+    global _writer, _writer_pid
+    with _write_condition:
+        if _writer is None:
+            _writer_pid = os.getpid()
+            _writer = threading.Thread(target=_writeInBackground, name='policy-writer')
+            _writer.daemon = True
+            _writer.start()
+
+
+def flushWrites():
+    '''Waits until the pending files of :func:`writeFile` are written. Raises the first error of the background writes.
+    '''
+    with _write_condition:
+        while _pending or _writing[0]:
+            _write_condition.wait()
+    if _write_errors:
+        error = _write_errors[0]
+        del _write_errors[:]
+        raise error
+
+
+def stopBackgroundWrites():
+    '''Writes the pending files and stops the background thread, :func:`writeFile` writes directly again.
+    '''
+    global _writer
+    with _write_condition:
+        writer, _writer = _writer, None
+        _write_condition.notify_all()
+    if writer is not None:
+        writer.join()
+    flushWrites()
+
 
 #END OF FILE
\ No newline at end of file
@@ -41,6 +41,7 @@ Copyright CUED Dialogue Systems Group 2015 - 2017, 2017
 __author__ = "cued_dialogue_systems_group"
 
 import sys
+import numpy as np
 import SummaryUtils
 from utils import ContextLogger,Settings
 from ontology import Ontology
@@ -49,6 +50,32 @@ logger = ContextLogger.getLogger('')
 MAX_NUM_ACCEPTED = 10
 
 
+class CompactBelief(object):
+    '''
+    What the replay buffers of the DRL policies keep of a belief state when [policy] compactreplay is set: only its
+    executable-action mask, one bit per summary action. :meth:`SummaryAction.getExecutableMask` accepts it in place of
+    the belief.
+    '''
+    __slots__ = ('bits', 'size')
+
+    def __init__(self, execMask):
+        executable = np.asarray(execMask) == 0
+        self.bits = np.packbits(executable).tostring()
+        self.size = len(executable)
+
+    def __getstate__(self):
+        return self.bits, self.size
+
+    def __setstate__(self, state):
+        self.bits, self.size = state
+
+    def executable(self):
+        '''
+        :returns: (numpy.ndarray) True for the executable actions
+        '''
+        return np.unpackbits(np.fromstring(self.bits, dtype=np.uint8))[:self.size].astype(bool)
+
+
 class SummaryAction(object):
     '''
     The summary action class encapsulates the functionality of a summary action along with the conversion from summary to master actions.
@@ -125,7 +152,7 @@ class SummaryAction(object):
 
         self._array_slot_summary = SummaryUtils.arraySlotSummary(belief, self.domainString)
         self._global_summary = SummaryUtils.globalSummary(belief, self.domainString)
-        logger.dial('system summary act: {}.'.format(action))
+        logger.dial('system summary act: %s.', action)
 
         if action == "inform":
             output = self.getInformByConstraints(belief)
@@ -183,9 +210,7 @@ class SummaryAction(object):
             mask_action = False
 
             if action == "inform" or action == "offer":
-                acceptance_list = SummaryUtils.getTopBeliefs(belief, domainString=self.domainString)
-                discriminable = SummaryUtils.acceptanceListCanBeDiscriminated(acceptance_list,
-                                                                                                     self.domainString)
+                discriminable = SummaryUtils.getBeliefSummary(belief, self.domainString).discriminable()
                 if not global_summary['GLOBAL_BYCONSTRAINTS']:
                     mask_action = True
                 if global_summary['GLOBAL_COUNTACCEPTED'] < self.inform_count_accepted and discriminable:
@@ -266,7 +291,7 @@ class SummaryAction(object):
                 if mask_action and self.request_mask:
                     nonexec.append(action)
 
-        logger.info('masked inform actions:' + str([act for act in nonexec if 'inform' in act]))
+        logger.info('masked inform actions:%s', [act for act in nonexec if 'inform' in act])
         return nonexec
 
     # added by phs26, 4 Nov 2016
@@ -278,6 +303,9 @@ class SummaryAction(object):
         return [0.0] * len(self.action_names)
         """
 
+        if isinstance(belief, CompactBelief):
+            return np.where(belief.executable(), 0.0, -sys.maxint).tolist()
+
         execMask = []
         nonExec = self.getNonExecutable(belief.getDomainState(belief.currentdomain), lastSystemAction)
         for action in self.action_names:
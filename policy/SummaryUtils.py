@@ -30,7 +30,8 @@ Copyright CUED Dialogue Systems Group 2015 - 2017
     >>> import SummaryUtils
    
 .. Note::
-        No classes; collection of utility methods
+        Collection of utility methods. :class:`BeliefSummary` keeps the quantities that the action mask, the policies
+        and the conversion of summary acts all derive from a belief state, so that they are computed once per turn.
 
 Local module variables::
 
@@ -40,6 +41,7 @@ Local module variables::
 .. seealso:: CUED Imports/Dependencies: 
 
     import :mod:`ontology.Ontology` |.|
+    import :mod:`belieftracking.BeliefTrackingUtils` |.|
     import :mod:`utils.Settings` |.|
     import :mod:`utils.ContextLogger` |.|
 
@@ -52,6 +54,7 @@ __author__ = "cued_dialogue_systems_group"
 import copy
 from scipy.stats import entropy
 from ontology import Ontology
+from belieftracking.BeliefTrackingUtils import SlotBelief
 from utils import ContextLogger, Settings
 logger = ContextLogger.getLogger('')
 
@@ -90,7 +93,7 @@ def globalSummary(belief, domainString):
     topDiscourseAct, topDiscourseActBelief = getTopBelief(belief['beliefs']['discourseAct'])
 
     summaryArray = dict.fromkeys(global_summary_features, False)
-    summaryArray['GLOBAL_COUNTACCEPTED'] = len(getTopBeliefs(belief, domainString=domainString))
+    summaryArray['GLOBAL_COUNTACCEPTED'] = len(getBeliefSummary(belief, domainString).acceptanceList())
     summaryArray['GLOBAL_NAMENONE'] = belief['features']['lastActionInformNone']
     summaryArray['GLOBAL_OFFERHAPPENED'] = belief['features']['offerHappened']
 
@@ -123,20 +126,9 @@ def arraySlotSummary(belief, domainString):
 
     :param belief: dict representing the full belief state
     :param domainString: string representing the domain
-    :return: (dict) of slot goal summaries
-    '''
-    summary = {}
-    slots = Ontology.global_ontology.get_sorted_system_requestable_slots(domainString)
-        
-    for slot in slots:
-        summary[slot] = {}
-        slot_belief = belief['beliefs'][slot]
-        summary[slot]['TOPHYPS'], summary[slot]['ISTOPNONE'] = getTopBeliefsExcludingNone(belief['beliefs'][slot])
-        belief_dist = slot_belief.values()
-        summary[slot]['ENTROPY'] = entropy(belief_dist)
-        summary[slot]['ISREQUESTTOP'] = belief['beliefs']['requested'][slot] > 0.5
-
-    return summary
+    :return: (dict) of slot goal summaries, shared by all callers in the turn and not to be modified
+    '''
+    return getBeliefSummary(belief, domainString).arraySlotSummary()
 
 
 def getRequestedSlots(belief):
@@ -161,7 +153,8 @@ def getTopBelief(slot_belief):
     :param slot_belief: dict of value-prob pairs for slot distribution
     :return: top_value (str), top_belief (float)
     '''
-
+    if isinstance(slot_belief, SlotBelief):
+        return slot_belief.top()
     top_value = max(slot_belief, key=slot_belief.get)
     return top_value, slot_belief[top_value]
 
@@ -175,7 +168,17 @@ def getTopBeliefs(belief, threshold='auto', domainString=None):
     :param domainString: string representing the domain
     :return: (dict) as {slot: (topvalue, topbelief), ...}
     '''
-    top_beliefs = {}
+    if threshold == 'auto':
+        return dict(getBeliefSummary(belief, domainString).acceptanceItems())
+    return dict(_getTopBeliefs(belief['beliefs'], threshold, domainString))
+
+
+def _getTopBeliefs(beliefs, threshold, domainString):
+    '''
+    :return: (list) of (slot, (topvalue, topbelief)) in the order in which :func:`getTopBeliefs` adds them to its dict.
+        Building a new dict in this order gives the same iteration order as the original one.
+    '''
+    top_beliefs = []
     for slot in Ontology.global_ontology.get_system_requestable_slots(domainString):
         if threshold == 'auto':
             numvalues = Ontology.global_ontology.get_len_informable_slot(domainString, slot)
@@ -183,10 +186,10 @@ def getTopBeliefs(belief, threshold='auto', domainString=None):
         else:
             thres = threshold
             
-        topvalue, topbelief = getTopBelief(belief['beliefs'][slot])
+        topvalue, topbelief = getTopBelief(beliefs[slot])
 
         if topvalue != '**NONE**' and topbelief > thres:
-            top_beliefs[slot] = (topvalue, topbelief)
+            top_beliefs.append((slot, (topvalue, topbelief)))
 
     return top_beliefs
 
@@ -198,19 +201,129 @@ def getTopBeliefsExcludingNone(slot_belief):
     :param slot_belief: dict of value-prob pairs for slot distribution
     :return: (list) of ordered value-beliefs, (bool) telling if the top value is **NONE**
     '''
-    slot_belief_copy = copy.deepcopy(slot_belief)
-    top_hyps = []
-    is_top_none = False
-    while len(slot_belief_copy) > 0:
-        topvalue, topbelief = getTopBelief(slot_belief_copy)
-        if len(top_hyps) == 0 and topvalue == '**NONE**':
-            is_top_none = True
-        if topvalue != '**NONE**':
-            top_hyps.append((topvalue, topbelief))
-        del slot_belief_copy[topvalue]
+    # a stable sort keeps the order in which max() would pick values of equal belief from the copied dict
+    ordered = sorted(dict(slot_belief).items(), key=lambda hyp: hyp[1], reverse=True)
+    is_top_none = len(ordered) > 0 and ordered[0][0] == '**NONE**'
+    top_hyps = [hyp for hyp in ordered if hyp[0] != '**NONE**']
 
     return top_hyps, is_top_none
 
+
+'''
+#####Per-turn belief summary.####
+'''
+
+class BeliefSummary(object):
+    '''
+    Quantities derived from the slot beliefs of one belief state, each computed when first asked for. The belief
+    trackers build a new belief['beliefs'] dict every turn and do not change it afterwards, so one summary serves the
+    feature update of the tracker, the action mask, the policy and the conversion of the summary act in that turn.
+
+    :param belief: dict representing the full belief state
+    :param domainString: string representing the domain
+    '''
+    def __init__(self, belief, domainString):
+        self.beliefs = belief['beliefs']
+        self.domainString = domainString
+        self._top_hyps = {}
+        self._acceptance_items = None
+        self._acceptance_list = None
+        self._ordered_accepted = None
+        self._array_slot_summary = None
+        self._discriminable = {}
+        self._entity_count = {}
+
+    def topHyps(self, slot):
+        '''
+        :return: (list) of ordered value-beliefs of the slot without **NONE**, (bool) telling if the top value is **NONE**
+        '''
+        if slot not in self._top_hyps:
+            self._top_hyps[slot] = getTopBeliefsExcludingNone(self.beliefs[slot])
+        return self._top_hyps[slot]
+
+    def acceptanceItems(self):
+        '''
+        :return: (list) of (slot, (topvalue, topbelief)) for the 'auto' threshold of :func:`getTopBeliefs`
+        '''
+        if self._acceptance_items is None:
+            self._acceptance_items = _getTopBeliefs(self.beliefs, 'auto', self.domainString)
+        return self._acceptance_items
+
+    def acceptanceList(self):
+        '''
+        :return: (dict) as {slot: (topvalue, topbelief), ...} for the 'auto' threshold of :func:`getTopBeliefs`, not to
+            be modified
+        '''
+        if self._acceptance_list is None:
+            self._acceptance_list = dict(self.acceptanceItems())
+        return self._acceptance_list
+
+    def orderedAcceptanceList(self, num_accepted=None):
+        '''
+        :return: (list) of (slot, value, belief) of the num_accepted most likely accepted values
+        '''
+        if self._ordered_accepted is None:
+            self._ordered_accepted = _orderAcceptanceList(self.acceptanceList())
+        return self._ordered_accepted[:num_accepted]
+
+    def _numAccepted(self, num_accepted):
+        # all numbers from the length of the acceptance list up select the same values
+        num_values = len(self.acceptanceList())
+        return num_values if num_accepted is None else min(num_accepted, num_values)
+
+    def discriminable(self, num_accepted=None):
+        '''
+        :return: (bool) as :func:`acceptanceListCanBeDiscriminated` for the acceptance list
+        '''
+        num_accepted = self._numAccepted(num_accepted)
+        if num_accepted not in self._discriminable:
+            self._discriminable[num_accepted] = Ontology.global_ontology.constraintsCanBeDiscriminated(
+                self.domainString, constraints=self.orderedAcceptanceList(num_accepted))
+        return self._discriminable[num_accepted]
+
+    def entityCount(self, num_accepted):
+        '''
+        :return: (int) as :func:`_countEntitiesForAcceptanceListPart` for the acceptance list
+        '''
+        num_accepted = self._numAccepted(num_accepted)
+        if num_accepted not in self._entity_count:
+            self._entity_count[num_accepted] = _countEntities(self.orderedAcceptanceList(num_accepted),
+                                                              self.domainString)
+        return self._entity_count[num_accepted]
+
+    def arraySlotSummary(self):
+        '''
+        :return: (dict) of slot goal summaries, see :func:`arraySlotSummary`
+        '''
+        if self._array_slot_summary is None:
+            summary = {}
+            for slot in Ontology.global_ontology.get_sorted_system_requestable_slots(self.domainString):
+                summary[slot] = {}
+                summary[slot]['TOPHYPS'], summary[slot]['ISTOPNONE'] = self.topHyps(slot)
+                summary[slot]['ENTROPY'] = entropy(self.beliefs[slot].values())
+                summary[slot]['ISREQUESTTOP'] = self.beliefs['requested'][slot] > 0.5
+            self._array_slot_summary = summary
+        return self._array_slot_summary
+
+
+_belief_summaries = {}  # domainString -> summary of the belief state asked for last
+
+
+def getBeliefSummary(belief, domainString):
+    '''
+    Returns the :class:`BeliefSummary` of the belief state, reusing the one of the previous call for the same
+    belief['beliefs'] dict.
+
+    :param belief: dict representing the full belief state
+    :param domainString: string representing the domain
+    :return: (:class:`BeliefSummary`)
+    '''
+    summary = _belief_summaries.get(domainString)
+    if summary is None or summary.beliefs is not belief['beliefs']:
+        summary = BeliefSummary(belief, domainString)
+        _belief_summaries[domainString] = summary
+    return summary
+
 '''
 ####Methods for inform related actions.####
 '''
@@ -229,15 +342,16 @@ def acceptanceListCanBeDiscriminated(accepted_values, domainString, num_accepted
     :return: (bool) answering discrimination question
     '''
 
-    if num_accepted == None:
-        num_accepted = len(accepted_values)
+    ordered_accepted_values = _orderAcceptanceList(accepted_values)[:num_accepted]
+
+    return Ontology.global_ontology.constraintsCanBeDiscriminated(domainString, constraints=ordered_accepted_values)
+
 
+def _orderAcceptanceList(accepted_values):
     ordered_accepted_values = []
     for slot, value in accepted_values.iteritems():
         ordered_accepted_values.append((slot, value[0], value[1]))
-    ordered_accepted_values = sorted(ordered_accepted_values, key=lambda x: x[2], reverse=True)[:num_accepted]
-
-    return Ontology.global_ontology.constraintsCanBeDiscriminated(domainString, constraints=ordered_accepted_values)
+    return sorted(ordered_accepted_values, key=lambda x: x[2], reverse=True)
 
 
 def getInformNoneVenue(constraints, domainString):
@@ -541,9 +655,9 @@ def actionSpecificInformSummary(belief, numAccepted, domainString):
         :returns: summary_array [count==0, count==1, 2<=count<=4, count>4, discriminatable] \  
                         discriminatable: matching entities can be further discriminated
     '''
-    acceptanceList = getTopBeliefs(belief, domainString=domainString)
-    count = _countEntitiesForAcceptanceListPart(acceptanceList, numAccepted, domainString)
-    discriminatable = acceptanceListCanBeDiscriminated(acceptanceList, domainString, numAccepted)
+    belief_summary = getBeliefSummary(belief, domainString)
+    count = belief_summary.entityCount(numAccepted)
+    discriminatable = belief_summary.discriminable(numAccepted)
     summary_array = [count == 0, count == 1, 2 <= count <= 4, count > 4, discriminatable]
     return summary_array
 
@@ -558,12 +672,10 @@ def _countEntitiesForAcceptanceListPart(accepted_values, num_accepted, domainStr
     :returns: (int) number of entities
     '''
 
-    ordered_accepted_values = []
-    for slot, value in accepted_values.iteritems():
-        ordered_accepted_values.append((slot, value[0], value[1]))
-    
-    ordered_accepted_values = sorted(ordered_accepted_values, key=lambda x: x[2], reverse=True)[:num_accepted]
+    return _countEntities(_orderAcceptanceList(accepted_values)[:num_accepted], domainString)
+
 
+def _countEntities(ordered_accepted_values, domainString):
     constraints = {}
     for slot, value, _ in ordered_accepted_values: # slot, value, belief
         if value != 'dontcare':
@@ -25,7 +25,7 @@ Class to convert belief states into DIP parametrisations
 '''
 
 import numpy as np
-import copy
+import heapq
 from itertools import product
 from scipy.stats import entropy
 
@@ -34,17 +34,133 @@ from ontology import Ontology
 from utils import Settings, ContextLogger, DialogueState
 logger = ContextLogger.getLogger('')
 
-class DIP_state(State):
-    def __init__(self, belief, domainString=None, action_freq=None):
-        #params
+class DIPStatics(object):
+    """
+    The parts of the DIP parametrisation of a domain that only depend on its ontology and database: the slots, the
+    number of values per slot, the value distribution in the DB and the masks of the DIP vector. Computed once per domain
+    and shared by all the states, see :func:`get_dip_statics`.
+    """
+    def __init__(self, domainString):
         self.domainString = domainString
-        self.N_bins = 10
         self.slots = list(Ontology.global_ontology.get_informable_slots(domainString))
         if 'price' in self.slots:
             self.slots.remove('price') #remove price from SFR ont, its not used
 
         if 'name' in self.slots:
             self.slots.remove('name')
+        self.slot_set = set(self.slots)
+        self.values = dict((slot, Ontology.global_ontology.get_informable_slot_values(domainString, slot))
+                           for slot in self.slots)
+        self.n_values = dict((slot, len(self.values[slot])) for slot in self.slots)
+        self.slot_n = 1/len(self.slots)
+        self.avg_value_n = 1/np.mean([self.n_values[slot] for slot in self.slots])
+        self._val_dist_in_DB = None
+        self._slot_features = {}
+        self._masks = {}
+
+    def val_dist_in_DB(self, slot):
+        # The entropy of the normalised histogram (|DB(s=v)|/|DB|) \forall v \in V_s, for all slots in one pass over the DB
+        if self._val_dist_in_DB is None:
+            entities = Ontology.global_ontology.entity_by_features(self.domainString, {})
+            self._val_dist_in_DB = {}
+            for s in self.slots:
+                index = dict((v, i) for i, v in reversed(list(enumerate(self.values[s]))))
+                val_dist = np.zeros(len(self.values[s]))
+                n = 0
+                for ent in entities:
+                    # values missing from the ontology are not counted, as 'not available'
+                    if ent[s] != 'not available' and ent[s] in index:
+                        val_dist[index[ent[s]]] += 1
+                        n += 1
+                self._val_dist_in_DB[s] = entropy(val_dist/n) if n else 0.
+        return self._val_dist_in_DB[slot]
+
+    def slot_features(self, slot, N_bins):
+        """
+        The ontology and DB based features of a slot of :class:`DIP_state`
+        :return: [norm_N_values, val_dist_in_DB], the bins of the number of values
+        """
+        if (slot, N_bins) not in self._slot_features:
+            V_len = self.n_values[slot]
+            norm_N_values = 1 / V_len
+            v_len_bin_vector = [0.] * N_bins
+            v_len_bin_vector[min(int(np.log2(V_len)), N_bins - 1)] = 1.
+            self._slot_features[(slot, N_bins)] = ([norm_N_values, self.val_dist_in_DB(slot)], v_len_bin_vector)
+        return self._slot_features[(slot, N_bins)]
+
+    def masks(self, slot_len, general_len):
+        """
+        The masks selecting the vector of every slot (and the padding vector for 'general') together with the general
+        features from the DIP vector. Shared between the states, so they must not be modified.
+        """
+        if (slot_len, general_len) not in self._masks:
+            masks = {}
+            mask_template = [False] * (slot_len * (len(self.slots) + 1)) + [True] * general_len
+            i = 1
+            for slot in self.slots:
+                masks[slot] = np.array(mask_template)
+                masks[slot][slot_len*i:slot_len*(i+1)] = True
+                i += 1
+            masks['general'] = np.array(mask_template)
+            masks['general'][:slot_len] = True
+            self._masks[(slot_len, general_len)] = masks
+        return self._masks[(slot_len, general_len)]
+
+
+_dip_statics = {}
+
+
+def get_dip_statics(domainString):
+    """
+    Returns the :class:`DIPStatics` of the domain, creating them on first use.
+    """
+    if domainString not in _dip_statics:
+        _dip_statics[domainString] = DIPStatics(domainString)
+    return _dip_statics[domainString]
+
+
+def joint_slot_beliefs(belief, slots, k):
+    """
+    Joint beliefs over the informable slots. Each slot contributes its two most likely values (other than **NONE**) and
+    the joint beliefs are the products of one of them per slot, in the order of itertools.product over the slots in the
+    order of the belief state. Only the first k of these 2^n products are computed: they only vary the last log2(k) slots,
+    so the other slots always contribute their top value and the products are not enumerated.
+    :param belief: the belief state of the domain
+    :param slots: the set of informable slots
+    :param k: the number of joint beliefs
+    :return: the first k joint beliefs, the joint probability of **NONE**, the number of slots whose top value is more
+    likely than **NONE**
+    """
+    joint_none = 1.
+    n_not_none = 0
+    informable_beliefs = []
+    for slot, b in belief['beliefs'].iteritems():
+        if slot in slots:
+            none_val = b['**NONE**']
+            joint_none *= none_val
+            # should I put **NONE** prob mass to dontcare?
+            top = heapq.nlargest(2, [x for value, x in b.iteritems() if value != '**NONE**' and x != 0])
+            while len(top) < 2:
+                top.append(0.)
+            informable_beliefs.append(top)
+            if top[0] > none_val:
+                n_not_none += 1
+    n_varied = 0
+    while 2 ** n_varied < k and n_varied < len(informable_beliefs):
+        n_varied += 1
+    n_fixed = len(informable_beliefs) - n_varied
+    fixed = [b[0] for b in informable_beliefs[:n_fixed]]
+    joint_beliefs = [np.prod(fixed + list(probs)) for probs in product(*informable_beliefs[n_fixed:])]
+    return joint_beliefs[:k], joint_none, n_not_none
+
+
+class DIP_state(State):
+    def __init__(self, belief, domainString=None, action_freq=None):
+        #params
+        self.domainString = domainString
+        self.N_bins = 10
+        self.statics = get_dip_statics(domainString)
+        self.slots = self.statics.slots
         self.DIP_state = {'general':None, 'joint':None}
         for slot in self.slots:
             self.DIP_state[slot]=None
@@ -72,18 +188,11 @@ class DIP_state(State):
         general_len = len(self.DIP_state['general']) + len(self.DIP_state['joint'])
         pad_v[0] = 1.
         self.DIP_vector = [pad_v]
-        self.DIP_masks = {}
-        mask_template = [False] * (slot_len * (len(self.slots) + 1)) + [True] * general_len
-        i = 1
         for slot in self.slots:
             self.DIP_vector.append(self.DIP_state[slot])
-            self.DIP_masks[slot] = np.array(mask_template)
-            self.DIP_masks[slot][slot_len*i:slot_len*(i+1)] = True
-            i += 1
         self.DIP_vector.append(self.DIP_state['general'])
         self.DIP_vector.append(self.DIP_state['joint'])
-        self.DIP_masks['general'] = np.array(mask_template)
-        self.DIP_masks['general'][:slot_len] = True
+        self.DIP_masks = self.statics.masks(slot_len, general_len)
 
         self.DIP_vector = np.concatenate(self.DIP_vector)
 
@@ -116,14 +225,8 @@ class DIP_state(State):
         method = belief['beliefs']['method'].values()
         features = [int(belief['features']['offerHappened']), int(belief['features']['lastActionInformNone']), int(bool(belief['features']['lastInformedVenue']))]
         discriminable = [int(x) for x in belief['features']['inform_info']]
-        slot_n = 1/len(self.slots)
-        val_n = []
-        for slot in self.slots:
-            val_n.append(len(Ontology.global_ontology.get_informable_slot_values(self.domainString, slot)))
-        avg_value_n = 1/np.mean(val_n)
-
 
-        return dial_act + requested + method + features + discriminable + [slot_n, avg_value_n]
+        return dial_act + requested + method + features + discriminable + [self.statics.slot_n, self.statics.avg_value_n]
 
 
     def _get_DIP_requested_vector(self, belief):
@@ -143,21 +246,11 @@ class DIP_state(State):
         if type(belief) == DialogueState.DialogueState:
             belief = belief.domainStates[belief.currentdomain]
 
-        joint_beliefs = []
-        joint_none = 1.
-        informable_beliefs = [copy.deepcopy(belief['beliefs'][x]) for x in belief['beliefs'].keys() if x in self.slots] # this might be inneficent
-        for i, b in enumerate(informable_beliefs):
-            joint_none *= b['**NONE**']
-            del b['**NONE**'] # should I put **NONE** prob mass to dontcare?
-            informable_beliefs[i] = sorted([x for x in b.values() if x != 0], reverse=True)[:2]
-            while len(informable_beliefs[i]) < 2:
-                informable_beliefs[i].append(0.)
-        for probs in product(*informable_beliefs):
-            joint_beliefs.append(np.prod(probs))
+        joint_beliefs, joint_none, n = joint_slot_beliefs(belief, self.statics.slot_set, 8)
         j_top = joint_beliefs[0]
         j_2nd = joint_beliefs[1]
         j_3rd = joint_beliefs[2]
-        first_joint_beliefs = joint_beliefs[:8]
+        first_joint_beliefs = joint_beliefs
         if sum(first_joint_beliefs) == 0:
             first_joint_beliefs = np.ones(len(first_joint_beliefs)) / len(first_joint_beliefs)
         else:
@@ -173,13 +266,6 @@ class DIP_state(State):
         j_dif_bin[idx] = 1
 
         # number of slots which are not **NONE**
-        n = 0
-        for key in belief['beliefs']:
-            if key in self.slots:
-                none_val = belief['beliefs'][key]['**NONE**']
-                top_val = np.max([belief['beliefs'][key][value] for value in belief['beliefs'][key].keys() if value != '**NONE**'])
-                if top_val > none_val:
-                    n += 1
         not_none = [0.] * 5
         if n > 4:
             n = 4
@@ -196,12 +282,10 @@ class DIP_state(State):
         if type(belief) == DialogueState.DialogueState:
             belief = belief.domainStates[belief.currentdomain]
         b = [belief['beliefs'][slot]['**NONE**']] + sorted([belief['beliefs'][slot][value] for value in belief['beliefs'][slot].keys() if value != '**NONE**'], reverse=True)
-        b_top = b[1]
-        b_2nd = b[2]
-        b_3rd = b[3]
+        b_top, b_2nd, b_3rd = (b[1:] + [0., 0., 0.])[:3] # slots of SGD domains can have less than 3 values
         b_ent = entropy(b)
         b_none = b[0]
-        b_dif = b[1] - b[2]
+        b_dif = b_top - b_2nd
         b_dif_bin = [0.] * 5
         idx = int((b_dif) * 5)
         if idx == 5:
@@ -211,28 +295,16 @@ class DIP_state(State):
         non_zero_rate = sum(non_zero_rate) / len(non_zero_rate)
         requested_prob = belief['beliefs']['requested'][slot]
 
-        # Ontology and DB based features
-        V_len = len(Ontology.global_ontology.get_informable_slot_values(self.domainString, slot))
-        norm_N_values = 1 / V_len
-        v_len_bin_vector = [0.] * self.N_bins
-        v_len_bin_vector[int(np.log2(V_len))] = 1.
+        # Ontology and DB based features: norm_N_values, val_dist_in_DB and the bins of the number of values
         #ocurr_prob, not_occur_prob, first_prob, second_prob, later_prob = self._get_importance_and_priority(slot) # this was manually set in the original DIP paper, I think it can be learned from the other features
-        val_dist_in_DB = self._get_val_dist_in_DB(slot)
+        db_features, v_len_bin_vector = self.statics.slot_features(slot, self.N_bins)
         # potential_contr_to_DB_search = self._get_potential_contr_to_DB_search(slot, belief)
         #potential_contr_to_DB_search = [0, 0, 0, 0] # the implementation of this method is too slow right now, dont knwo how useful these features are (but they seem quite useful)
-        return [0, b_top, b_2nd, b_3rd, b_ent, b_none, non_zero_rate, requested_prob, norm_N_values, val_dist_in_DB] + b_dif_bin + v_len_bin_vector
+        return [0, b_top, b_2nd, b_3rd, b_ent, b_none, non_zero_rate, requested_prob] + db_features + b_dif_bin + v_len_bin_vector
 
     def _get_val_dist_in_DB(self, slot):
         # The entropy of the normalised histogram (|DB(s=v)|/|DB|) \forall v \in V_s
-        values = Ontology.global_ontology.get_informable_slot_values(self.domainString, slot)
-        entities = Ontology.global_ontology.entity_by_features(self.domainString, {})
-        val_dist = np.zeros(len(values))
-        n = 0
-        for ent in entities:
-            if ent[slot] != 'not available':
-                val_dist[values.index(ent[slot])] += 1
-                n += 1
-        return entropy(val_dist/n)
+        return self.statics.val_dist_in_DB(slot)
 
 
 class padded_state(State):
@@ -245,15 +317,9 @@ class padded_state(State):
             self.sortbelief = Settings.config.getboolean('feudalpolicy', 'sortbelief')
         #if Settings.config.has_option('feudalpolicy', 'action_freq'):
         #    self.action_freq = Settings.config.getboolean('feudalpolicy', 'action_freq')
-        self.slots = list(Ontology.global_ontology.get_informable_slots(domainString))
-        if 'price' in self.slots:
-            self.slots.remove('price') #remove price from SFR ont, its not used
-
-        if 'name' in self.slots:
-            self.slots.remove('name')
+        self.statics = get_dip_statics(domainString)
+        self.slots = self.statics.slots
 
-        slot_values = Ontology.global_ontology.get_informable_slots_and_values(domainString)
-        self.max_v = np.max([len(slot_values[s]) for s in self.slots]) + 3 # (+**NONE**+dontcare+pad)
         self.max_v = 158
         self.si_size = 72 # size of general plus joint vectors
         self.sd_size = self.max_v
@@ -285,18 +351,11 @@ class padded_state(State):
         general_len = len(self.DIP_state['general']) + len(self.DIP_state['joint'])
         pad_v[0] = 1.
         self.DIP_vector = [pad_v]
-        self.DIP_masks = {}
-        mask_template = [False] * (slot_len * (len(self.slots) + 1)) + [True] * general_len
-        i = 1
         for slot in self.slots:
             self.DIP_vector.append(self.DIP_state[slot])
-            self.DIP_masks[slot] = np.array(mask_template)
-            self.DIP_masks[slot][slot_len*i:slot_len*(i+1)] = True
-            i += 1
         self.DIP_vector.append(self.DIP_state['general'])
         self.DIP_vector.append(self.DIP_state['joint'])
-        self.DIP_masks['general'] = np.array(mask_template)
-        self.DIP_masks['general'][:slot_len] = True
+        self.DIP_masks = self.statics.masks(slot_len, general_len)
 
         self.DIP_vector = np.concatenate(self.DIP_vector)
 
@@ -351,20 +410,8 @@ class padded_state(State):
         if type(belief) == DialogueState.DialogueState:
             belief = belief.domainStates[belief.currentdomain]
 
-        joint_beliefs = []
-        joint_none = 1.
-        informable_beliefs = [copy.deepcopy(belief['beliefs'][x]) for x in belief['beliefs'].keys() if
-                              x in self.slots]  # this might be inneficent
-        for i, b in enumerate(informable_beliefs):
-            joint_none *= b['**NONE**']
-            del b['**NONE**']  # should I put **NONE** prob mass to dontcare?
-            informable_beliefs[i] = sorted([x for x in b.values() if x != 0], reverse=True)[:2]
-            while len(informable_beliefs[i]) < 2:
-                informable_beliefs[i].append(0.)
-        for probs in product(*informable_beliefs):
-            joint_beliefs.append(np.prod(probs))
+        joint_beliefs, joint_none, n = joint_slot_beliefs(belief, self.statics.slot_set, 20)
         first_joint_beliefs = -np.ones(20)
-        joint_beliefs = joint_beliefs[:20]
         len_joint_beliefs = len(joint_beliefs)
         first_joint_beliefs[:len_joint_beliefs] = joint_beliefs
 
@@ -374,14 +421,6 @@ class padded_state(State):
             first_joint_beliefs = list(np.array(first_joint_beliefs) / sum(first_joint_beliefs))  # why normalise?
 
         # number of slots which are not **NONE**
-        n = 0
-        for key in belief['beliefs']:
-            if key in self.slots:
-                none_val = belief['beliefs'][key]['**NONE**']
-                top_val = np.max(
-                    [belief['beliefs'][key][value] for value in belief['beliefs'][key].keys() if value != '**NONE**'])
-                if top_val > none_val:
-                    n += 1
         not_none = [0.] * 5
         if n > 4:
             n = 4
@@ -414,15 +453,7 @@ class padded_state(State):
 
     def _get_val_dist_in_DB(self, slot):
         # The entropy of the normalised histogram (|DB(s=v)|/|DB|) \forall v \in V_s
-        values = Ontology.global_ontology.get_informable_slot_values(self.domainString, slot)
-        entities = Ontology.global_ontology.entity_by_features(self.domainString, {})
-        val_dist = np.zeros(len(values))
-        n = 0
-        for ent in entities:
-            if ent[slot] != 'not available':
-                val_dist[values.index(ent[slot])] += 1
-                n += 1
-        return entropy(val_dist/n)
+        return self.statics.val_dist_in_DB(slot)
 
 
 def get_test_beliefs():
@@ -227,12 +227,14 @@ class FeudalACERPolicy(ACERPolicy):
 
         value = self.acer.predict_value([cState], [mask])
 
+        # the belief state is not used for training, with compactreplay it is not kept
+        state_ori = None if self.compactreplay else state
         if self.replay_type == 'vanilla':
             self.episodes[domainInControl].record(state=cState, \
-                    state_ori=state, action=cAction, reward=reward, value=value[0], distribution=mu_weight, mask=mask)
+                    state_ori=state_ori, action=cAction, reward=reward, value=value[0], distribution=mu_weight, mask=mask)
         elif self.replay_type == 'prioritized':
             self.episodes[domainInControl].record(state=cState, \
-                    state_ori=state, action=cAction, reward=reward, value=value[0], distribution=mu_weight, mask=mask)
+                    state_ori=state_ori, action=cAction, reward=reward, value=value[0], distribution=mu_weight, mask=mask)
 
         self.actToBeRecorded = None
         self.samplecount += 1
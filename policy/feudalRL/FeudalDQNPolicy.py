@@ -213,13 +213,15 @@ class FeudalDQNPolicy(policy.DQNPolicy.DQNPolicy):
         Q_s_t_a_t_ = cur_action_q[0][cAction]
         gamma_Q_s_tplu1_maxa_ = self.gamma * np.max(admissible)
 
+        # the belief state is not used for training, with compactreplay it is not kept
+        state_ori = None if self.compactreplay else state
         if self.replay_type == 'vanilla':
             self.episodes[domainInControl].record(state=cState, \
-                                                  state_ori=state, action=cAction, reward=reward)
+                                                  state_ori=state_ori, action=cAction, reward=reward)
         elif self.replay_type == 'prioritized':
             # heuristically assign 0.0 to Q_s_t_a_t_ and Q_s_tplu1_maxa_, doesn't matter as it is not used
             self.episodes[domainInControl].record(state=cState, \
-                                                  state_ori=state, action=cAction, reward=reward, \
+                                                  state_ori=state_ori, action=cAction, reward=reward, \
                                                   Q_s_t_a_t_=Q_s_t_a_t_,
                                                   gamma_Q_s_tplu1_maxa_=gamma_Q_s_tplu1_maxa_, uniform=False)
         self.actToBeRecorded = None
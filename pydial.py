@@ -26,6 +26,7 @@
 import os
 from scriptine import run, path, log, command
 import re
+import cStringIO
 import numpy as np
 
 # Uncomment for mac os users
@@ -46,6 +47,7 @@ import Texthub
 from utils import Settings
 from utils import ContextLogger
 from ontology import Ontology
+from policy import PolicyUtils
 import utils.ContextLogger as clog
 import pprint
 pp = pprint.PrettyPrinter(indent=4)
@@ -65,6 +67,8 @@ gtrainerrorrate = 0
 gtesterrorrate = 0
 gtrainsourceiteration = 0
 gtesteverybatch = False
+gwarmsession = False
+gsimulator = None       # simulation system kept between the runs of a warm session, see getSimulator()
 
 gpscale = 1
 
@@ -216,7 +220,7 @@ def initialise(configId, config_file, seed, mode, trainerrorrate=None, trainsour
     global gnumtrainbatches, gtraindialogsperbatch, gnumbatchtestdialogs, gnumtestdialogs
     global gtrainerrorrate, gtesterrorrate, gtrainsourceiteration
     global taskID, domain, domains, policytype, gtesteverybatch, gpscale
-    global gdeleteprevpolicy, isSingleModel
+    global gdeleteprevpolicy, isSingleModel, gwarmsession
     global policytypes
 
     if seed is not None:
@@ -338,6 +342,7 @@ def initialise(configId, config_file, seed, mode, trainerrorrate=None, trainsour
     gnumbatchtestdialogs = getOptionalConfigInt("numbatchtestdialogs", 20)
     gtesteverybatch = getOptionalConfigBool("testeverybatch",True)
     gdeleteprevpolicy = getOptionalConfigBool("deleteprevpolicy", False)
+    gwarmsession = getOptionalConfigBool("warmsession", False)
     if seed is not None and not 'seed' in configId:
         if seed >= 100 and seed < 200:
             seed_string = 'seed{}-'.format(seed - 100)
@@ -418,6 +423,41 @@ def setupPolicy(domain, configId, trainerr, source_iteration, target_iteration,
     return (inpolicyfile, outpolicyfile)
 
 
+def getSimulator(error):
+    '''
+    Returns the simulation system for the next run. A warm session builds it once and only reconfigures it for the
+    following train and test runs, keeping the agent, the policies and the user simulator in memory, and writes the
+    policy files in the background. Otherwise a new system is built for every run.
+
+    Evaluations run by worker processes ([simulate] numworkers, see :func:`evalPolicy`) do not use it: every worker
+    builds its own system and loads the policies from their files.
+    '''
+    global gsimulator
+    if not gwarmsession:
+        return Simulate.SimulationSystem(error_rate=error)
+    if gsimulator is None:
+        PolicyUtils.startBackgroundWrites()
+        gsimulator = Simulate.SimulationSystem(error_rate=error)
+    else:
+        gsimulator.reconfigure(error)
+    return gsimulator
+
+
+def endWarmSession():
+    '''
+    Drops the simulation system of a warm session and waits for its policy files to be written.
+    '''
+    global gsimulator
+    gsimulator = None
+    PolicyUtils.stopBackgroundWrites()
+
+
+def saveConfig(confsavefile):
+    cf = cStringIO.StringIO()
+    Settings.config.write(cf)
+    PolicyUtils.writeFile(confsavefile, cf.getvalue())
+
+
 def trainBatch(domain, configId, trainerr, ndialogs, source_iteration, seed=None):
     if isSingleDomain:
         (inpolicy, outpolicy) = setupPolicy(domain, configId, trainerr, source_iteration, source_iteration + 1, seed=seed)
@@ -458,13 +498,13 @@ def trainBatch(domain, configId, trainerr, ndialogs, source_iteration, seed=None
         confsavefile = conf_dir + multipolicy + ".train.cfg"
 
     # Save the config file for this iteration
-    cf = open(confsavefile, 'w')
-    Settings.config.write(cf)
+    saveConfig(confsavefile)
     error = float(trainerr) / 100.0
     # run the system
-    simulator = Simulate.SimulationSystem(error_rate=error)
+    simulator = getSimulator(error)
     simulator.run_dialogs(ndialogs)
     if gdeleteprevpolicy:
+        PolicyUtils.flushWrites()
         if isSingleDomain:
             if inpolicy[-1] != '0':
                 if Settings.config.has_section("policy_" + domain):
@@ -499,8 +539,7 @@ def setEvalConfig(domain, configId, evalerr, ndialogs, iteration, seed=None):
             Settings.config.set("gpsarsa", "scale", "1")
     # Save a copy of config file
     confsavefile = conf_dir + "%s.eval.%02d.cfg" % (policy, evalerr)
-    cf = open(confsavefile, 'w')
-    Settings.config.write(cf)
+    saveConfig(confsavefile)
 
 
 def evalPolicy(domain, configId, evalerr, ndialogs, iteration, seed=None):
@@ -511,8 +550,17 @@ def evalPolicy(domain, configId, evalerr, ndialogs, iteration, seed=None):
             setEvalConfig(dom, configId, evalerr, ndialogs, iteration, seed=seed)
 
     error = float(evalerr) / 100.0
-    # finally run the system
-    simulator = Simulate.SimulationSystem(error_rate=error)
+    # finally run the system, in several processes if configured
+    numworkers = 1
+    if Settings.config.has_option("simulate", "numworkers"):
+        numworkers = Settings.config.getint("simulate", "numworkers")
+    # the workers are forked, which is not possible once an agent has been built here (e.g. by trainBatch)
+    if numworkers != 1 and Simulate.can_fork_workers():
+        # the workers load the policies from their files, which the background writes may not have written yet
+        PolicyUtils.flushWrites()
+        simulator = Simulate.ParallelSimulationSystem(error_rate=error, num_workers=numworkers)
+    else:
+        simulator = getSimulator(error)
     simulator.run_dialogs(ndialogs)
 
 
@@ -853,6 +901,8 @@ def train_command(configfile, seed=None, trainerrorrate=None,trainsourceiteratio
         exit(0)
     except KeyboardInterrupt:
         print "\nCommand Aborted from Keyboard"
+    finally:
+        endWarmSession()
 
 
 def test_command(configfile, iteration, seed=None, testerrorrate=None, trainerrorrate=None,
@@ -952,6 +1002,8 @@ def test_command(configfile, iteration, seed=None, testerrorrate=None, trainerro
         exit(0)
     except KeyboardInterrupt:
         print "\nCommand Aborted from Keyboard"
+    finally:
+        endWarmSession()
 
 
 def plotTrainLogs(logfilelist, printtab, noplot, saveplot, datasetname, title, block=True):
@@ -1223,7 +1275,14 @@ def evaluate_actions_command(configfile, test_file, seed=None, trainerrorrate=No
                     else:
                         Settings.config.set("gpsarsa", "scale", "1")
         
-    evaluator = ActionEvaluator.ActionEvaluator(trainerrorrate)
+    # run the test dialogues in several processes if configured
+    numworkers = 1
+    if Settings.config.has_option("simulate", "numworkers"):
+        numworkers = Settings.config.getint("simulate", "numworkers")
+    if numworkers != 1:
+        evaluator = ActionEvaluator.ParallelActionEvaluator(trainerrorrate, num_workers=numworkers)
+    else:
+        evaluator = ActionEvaluator.ActionEvaluator(trainerrorrate)
     evaluator.run_eval(test_file)
 
 # class addInfo(object):
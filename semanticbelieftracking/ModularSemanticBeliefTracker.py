@@ -68,8 +68,7 @@ class ModularSemanticBeliefTracker(SemanticBeliefTracker):
         if ASR_obs is not None:
             if hub_id == 'simulate':
                 if sim_lvl=='dial_act':
-                    ASR_obs = [(h.to_string(), h.P_Au_O) for h in ASR_obs]
-                    
+                    # (interned act, probability) pairs from the error model, tracked without parsing them again
                     self.lastHyps = self.semi_manager.simulate_add_context_to_user_act(sys_act, ASR_obs,
                                                                                        self.domainString)
                     
@@ -73,7 +73,7 @@ class SemanticBeliefTracker(object):
         :param ASR_obs: the list of ASR hypotheses
         :type ASR_obs: list
         :param sys_act: the last system act (necessary for deriving context information)
-        :type sys_act: str ?
+        :type sys_act: :class:`utils.dact.Act`
         :param  constraints: internal constraints derived from previous domain in case of domain switch
         :type  constraints: list
         :param turn: the current turn number
@@ -141,7 +141,7 @@ class SemanticBeliefTrackingManager(object):
         :param ASR_obs: the list of ASR hypotheses
         :type ASR_obs: list
         :param sys_act: the last system act (necessary for deriving context information)
-        :type sys_act: str ?
+        :type sys_act: :class:`utils.dact.Act`
         :param turn: the current turn number
         :type turn: int
         :param hub_id: the hub id (identifying texthub vs. simulate vs. dialogue server)
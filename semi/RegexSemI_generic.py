@@ -27,6 +27,12 @@ RegexSemI_generic.py - regular expression based generic SemI decoder
 
 HELPFUL: http://regexr.com
 
+The inform and request regular expressions of a slot or value are all of the form "<context>\ (<phrase>)" or
+"(<phrase>)<context>". Rather than searching the utterance with the expression of every value, the phrases are spotted
+in one pass with a :class:`PhraseSpotter` and only the context around each occurrence is checked with a regular
+expression compiled once per domain. Phrases holding regular expression syntax are searched with their own compiled
+expression.
+
 """
 
 
@@ -38,6 +44,54 @@ from utils import ContextLogger
 from ontology import Ontology
 logger = ContextLogger.getLogger('')
 
+REGEX_SYNTAX = re.compile(r"[.^$*+?{}\[\]\\|()]")
+
+
+def literal_phrase(regex):
+    """Returns the phrase matched by a regular expression of the form "(phrase)", or None if the expression is not a
+    plain phrase.
+    """
+    if len(regex) > 2 and regex[0] == "(" and regex[-1] == ")" and not REGEX_SYNTAX.search(regex[1:-1]):
+        return regex[1:-1]
+    return None
+
+
+class PhraseSpotter(object):
+    """Finds every occurrence of a set of phrases in an utterance, ignoring case, by walking a trie of the phrases from
+    each position of the utterance. Occurrences may overlap.
+
+    :param phrases: (key, phrase) pairs, a key is returned for each occurrence of its phrase
+    :type phrases: list
+    """
+    def __init__(self, phrases):
+        self.trie = {}
+        for key, phrase in phrases:
+            node = self.trie
+            for char in phrase.lower():
+                node = node.setdefault(char, {})
+            node.setdefault(None, []).append(key)
+
+    def spot(self, text):
+        """
+        :param text: the utterance
+        :type text: str
+        :returns: (list) (key, start, end) for each occurrence of a phrase in text
+        """
+        lowered = text.lower()
+        length = len(lowered)
+        occurrences = []
+        for start in xrange(length):
+            node = self.trie.get(lowered[start])
+            end = start + 1
+            while node is not None:
+                if None in node:
+                    occurrences.extend((key, start, end) for key in node[None])
+                if end == length:
+                    break
+                node = node.get(lowered[end])
+                end += 1
+        return occurrences
+
 
 class RegexSemI_generic(RegexSemI.RegexSemI):
     """
@@ -45,6 +99,8 @@ class RegexSemI_generic(RegexSemI.RegexSemI):
     def __init__(self, domain):
         RegexSemI.RegexSemI.__init__(self)  #better than super() here - wont need to be changed for other domains
         self.domainTag = domain  #FIXME
+        self._spotted_requests = (None, None)   # (utterance, requested slots)
+        self._spotted_informs = (None, None)    # (utterance, {slot: informed values})
         self.create_domain_dependent_regex() 
 
     def create_domain_dependent_regex(self):
@@ -83,6 +139,18 @@ class RegexSemI_generic(RegexSemI.RegexSemI):
             self.request_regex[slot] = self.rREQUEST+"\ "+self.slot_vocab[slot]
             self.request_regex[slot] += "|(?<!"+self.DONTCAREWHAT+")(?<!want\ )"+self.IT+"\ "+self.slot_vocab[slot]
             self.request_regex[slot] += "|(?<!"+self.DONTCARE+")"+self.WHAT+"\ "+self.slot_vocab[slot]
+        # the same expressions split into the slot phrases and the context that has to end where a phrase starts
+        self.request_prefix = re.compile("(?:"+self.rREQUEST+"|(?<!"+self.DONTCAREWHAT+")(?<!want\ )"+self.IT
+                                         +"|(?<!"+self.DONTCARE+")"+self.WHAT+")\ \Z", re.I)
+        phrases = []
+        self.request_fallback = []
+        for slot in self.request_regex:
+            phrase = literal_phrase(self.slot_vocab[slot])
+            if phrase is not None:
+                phrases.append((slot, phrase))
+            else:
+                self.request_fallback.append((slot, re.compile(self.request_regex[slot], re.I)))
+        self.request_spotter = PhraseSpotter(phrases)
 
     def _set_inform_regex(self):
         """
@@ -93,23 +161,61 @@ class RegexSemI_generic(RegexSemI.RegexSemI):
             for value in self.slot_values[slot].keys():
                 self.inform_regex[slot][value] = self.rINFORM+"\ "+self.slot_values[slot][value]
                 self.inform_regex[slot][value] += "|"+self.slot_values[slot][value] + self.WBG
+        # a value is informed if the context before it ends where it starts or the context after it starts where it ends
+        self.inform_prefix = re.compile("(?:"+self.rINFORM+")\ \Z", re.I)
+        self.inform_suffix = re.compile(self.WBG, re.I)
+        phrases = []
+        self.inform_fallback = []
+        self.inform_rank = {}   # position of each (slot, value) in the order the values of a slot are reported
+        for slot in self.inform_regex:
+            for rank, value in enumerate(self.inform_regex[slot]):
+                self.inform_rank[(slot, value)] = rank
+                phrase = literal_phrase(self.slot_values[slot][value])
+                if phrase is not None:
+                    phrases.append(((slot, value), phrase))
+                else:
+                    self.inform_fallback.append(((slot, value), re.compile(self.inform_regex[slot][value], re.I)))
+        self.inform_spotter = PhraseSpotter(phrases)
+
+    def _spot_requests(self, obs):
+        """Returns the set of slots requested in the utterance, computed once per utterance.
+        """
+        if self._spotted_requests[0] != obs:
+            slots = set()
+            for slot, start, end in self.request_spotter.spot(obs):
+                if slot not in slots and self.request_prefix.search(obs, 0, start):
+                    slots.add(slot)
+            slots.update(slot for slot, regex in self.request_fallback if self._check(regex.search(obs)))
+            self._spotted_requests = (obs, slots)
+        return self._spotted_requests[1]
+
+    def _spot_informs(self, obs):
+        """Returns the values informed in the utterance for each slot, in the order of self.inform_regex[slot],
+        computed once per utterance.
+        """
+        if self._spotted_informs[0] != obs:
+            found = set()
+            for key, start, end in self.inform_spotter.spot(obs):
+                if key not in found and (self.inform_prefix.search(obs, 0, start) or self.inform_suffix.match(obs, end)):
+                    found.add(key)
+            found.update(key for key, regex in self.inform_fallback if self._check(regex.search(obs)))
+            values = {}
+            for slot, value in sorted(found, key=self.inform_rank.get):
+                values.setdefault(slot, []).append(value)
+            self._spotted_informs = (obs, values)
+        return self._spotted_informs[1]
 
     def _generic_request(self,obs,slot):
         """
         """
-        if self._check(re.search(self.request_regex[slot],obs, re.I)):
+        if slot in self._spot_requests(obs):
             self.semanticActs.append('request('+slot+')')
 
     def _generic_inform(self,obs,slot):
         """
         """
-        
-        DETECTED_SLOT_INTENT = False
-        for value in self.inform_regex[slot]:
-            if self._check(re.search(self.inform_regex[slot][value],obs, re.I)):
-                ADD_SLOTeqVALUE = True
-                if ADD_SLOTeqVALUE and not DETECTED_SLOT_INTENT:
-                    self.semanticActs.append('inform('+slot+'='+value+')')
+        for value in self._spot_informs(obs).get(slot, []):
+            self.semanticActs.append('inform('+slot+'='+value+')')
 
     def _decode_request(self, obs):
         """
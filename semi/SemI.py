@@ -62,7 +62,7 @@ class SemI(object):
         :param ASR_obs: the ASR observation list
         :param ASR_obs: list
         :param sys_act: the last system action, optional
-        :param sys_act: str
+        :param sys_act: :class:`utils.dact.Act`
         :param turn: the current turn number, optional
         :param turn: int
         :return: list of semantic interpretations of the input
@@ -172,7 +172,7 @@ class SemIManager(object):
         :param ASR_obs: ASR hypotheses
         :type ASR_obs: list
         :param sys_act: is the system action prior to collecting users response in obs.
-        :type sys_act: str
+        :type sys_act: :class:`utils.dact.Act`
         :param domainTag: is the domain we want to parse the obs in
         :type domainTag: str
         :param turn: the turn id, this parameter is optional
@@ -229,8 +229,8 @@ class SemIManager(object):
         While for simulation no semantic decoding is needed, context information needs to be added in some instances. This is done with this method.
         
         :param sys_act: the last system act
-        :type sys_act: str
-        :param user_acts: user act hypotheses
+        :type sys_act: :class:`utils.dact.Act`
+        :param user_acts: user act hypotheses, (interned act, probability) pairs
         :type user_acts: list
         :param domainTag: the domain of the dialogue
         :type domainTag: str
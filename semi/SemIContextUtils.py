@@ -31,6 +31,7 @@ Copyright CUED Dialogue Systems Group 2015 - 2017
     import :mod:`ontology.Ontology` |.|
     import :mod:`ontology.OntologyUtils` |.|
     import :mod:`utils.DiaAct` |.|
+    import :mod:`utils.dact` |.|
     import :mod:`utils.ContextLogger`
 
 ************************
@@ -39,7 +40,7 @@ Copyright CUED Dialogue Systems Group 2015 - 2017
 
 __author__ = "cued_dialogue_systems_group"
 
-from utils import ContextLogger, DiaAct
+from utils import ContextLogger, DiaAct, dact
 from ontology import OntologyUtils, Ontology
 logger = ContextLogger.getLogger('')
 
@@ -52,8 +53,8 @@ def _add_context_to_user_act(sys_act, hyps, active_domain):
     Note: this does eventually depend on the current domain we assume we are operating in (self.active_domain)
     
     :param sys_act: system dialogue act
-    :type sys_act: str
-    :param hyps: hypothesis
+    :type sys_act: :class:`utils.dact.Act`
+    :param hyps: hypothesis, the acts are strings or (in simulation) interned acts, which stay interned
     :type hyps: list
     :return:
     '''
@@ -66,10 +67,12 @@ def _add_context_to_user_act(sys_act, hyps, active_domain):
     # "i dont want indian food" for example
     new_hyps = []
     for hyp in hyps:
-        if hyp[0] in ['affirm()','negate()']:
+        if dact.ActText(hyp[0]) in ['affirm()','negate()']:
             user_act,prob = hyp
-            user_act = _convert_yes_no(sys_act, user_act, active_domain)  
-            new_hyps.append((user_act,prob))
+            contextual_act = _convert_yes_no(sys_act, dact.ActText(user_act), active_domain)  
+            if isinstance(user_act, dact.Act):
+                contextual_act = dact.InternAct(contextual_act)
+            new_hyps.append((contextual_act,prob))
         else:
             new_hyps.append(hyp)
     return new_hyps
@@ -124,7 +127,7 @@ def _convert_yes_no(sys_act, user_act, active_domain):
     Necessary for binary slots in system utterance ie. request(hasparking) --> inform(slot=opposite)
     
     :param sys_act: the last system action
-    :type sys_act: str
+    :type sys_act: :class:`utils.dact.Act`
     :param user_act: the user input act to be processed
     :type user_act: str
     :return: the transformed user act if conditions apply else the untouched user act
@@ -114,6 +114,8 @@ class Model(object):
         self.detectpairs= parser.get('gen','detectpairs')
         self.verbose    = parser.getint('gen','verbose')
         self.decode     = parser.get('gen','decode')
+        self.genbatch   = parser.getint('gen','genbatch') \
+                if parser.has_option('gen','genbatch') else 1
         # setting rnn configuration
         self.gentype    = parser.get('generator','type')
         self.dh         = parser.getint('generator','hidden')
@@ -420,16 +422,26 @@ class Model(object):
         self.model.loadConverseParams()
 
     def generate(self,dact):
-
-        # format dact
-        feat = self.reader.formatter.format(dact)
-        #try:
-        a,sv,s,v = self.reader.genFeatVec(feat,self.reader.cardinality,self.reader.dfs)
-        #except:
-        #    return ''
-
-        # generate sentences
-        gens = self.model.gen(a,sv,s,v)
+        return self.generateBatch([dact])[0]
+
+    def generateBatch(self,dacts):
+
+        # format dacts
+        das = []
+        for dact in dacts:
+            feat = self.reader.formatter.format(dact)
+            das.append(self.reader.genFeatVec(feat,self.reader.cardinality,self.reader.dfs))
+
+        # generate sentences of all dacts together
+        sents = []
+        for (a,sv,s,v),dact,gens in zip(das,dacts,self.model.genBatch(das)):
+            # rerank and lexicalise
+            gens = self.rerank(gens,a,sv,dact)
+            # post editing
+            sents.append(random.choice([self.postEdit(gen) for penalty,gen in gens]))
+        return sents
+
+    def rerank(self,gens,a,sv,dact):
         # for slot error rate scoring
         felements = [self.reader.cardinality[x+self.reader.dfs[1]]\
                 for x in sv] 
@@ -446,33 +458,30 @@ class Model(object):
             # lexicalise back
             gens[i] = (penalty,self.reader.lexicalise(gen,dact))
         # get the top-k for evaluation
-        gens = sorted(gens,key=operator.itemgetter(0))[:self.topk]
-        
-        # post editing
-        for i in range(len(gens)):
-            sent = gens[i][1].split()
-            t = 1
-            while t<len(sent):
-                if sent[t]=='-s':
-                    if sent[t-1].endswith('ch') or sent[t-1].endswith('s'):
-                        sent[t-1] += 'es'
-                    else:
-                        sent[t-1] += 's'
-                    del sent[t]
-                elif sent[t]=='-ly':
-                    sent[t-1] += 'ly'
-                    del sent[t]
-                elif sent[t]=='-er':
-                    sent[t-1] += 'er'
-                    del sent[t]
-                elif sent[t]=='s':
-                    sent[t-1] += '\'s'
-                    del sent[t]
+        return sorted(gens,key=operator.itemgetter(0))[:self.topk]
+
+    def postEdit(self,gen):
+        sent = gen.split()
+        t = 1
+        while t<len(sent):
+            if sent[t]=='-s':
+                if sent[t-1].endswith('ch') or sent[t-1].endswith('s'):
+                    sent[t-1] += 'es'
                 else:
-                    t +=1
-            gens[i] = ' '.join(sent)
-        return random.choice(gens)
-      
+                    sent[t-1] += 's'
+                del sent[t]
+            elif sent[t]=='-ly':
+                sent[t-1] += 'ly'
+                del sent[t]
+            elif sent[t]=='-er':
+                sent[t-1] += 'er'
+                del sent[t]
+            elif sent[t]=='s':
+                sent[t-1] += '\'s'
+                del sent[t]
+            else:
+                t +=1
+        return ' '.join(sent)
 
     def testNet(self):
         ######## test RNN generator on test set ######### 
@@ -485,61 +494,50 @@ class Model(object):
         # slot error counts
         gencnts, refcnts = [0.0,0.0,0.0],[0.0,0.0,0.0]
 
-        while True:
-            # read data point
-            data = self.reader.read(mode='test',batch=1)
-            if data==None:
-                break
-            a,sv,s,v,sents,dact,bases,cutoff_b,cutoff_f = data
-            # remove batch dimension
-            a,sv,s,v = a[0],sv[0],s[0],v[0]
-            sents,dact,bases = sents[0],dact[0],bases[0]
-            # generate sentences
-            gens = self.model.gen(a,sv,s,v)
-            # for slot error rate scoring
-            felements = [self.reader.cardinality[x+self.reader.dfs[1]]\
-                    for x in sv] 
-  
-            # post processing
-            for i in range(len(gens)):
-                penalty, gen = gens[i]
-                # replace word id with actual words
-                gen = ' '.join([self.reader.vocab[x] for x in gen[1:-1]])
-                # score slot error rate
-                cnt, total, caty = self.gentscorer.scoreERR(a,felements,gen)
-                # update score by categorical slot errors
-                penalty += caty
-                # lexicalise back
-                gens[i] = (penalty,self.reader.lexicalise(gen,dact))
-            # get the top-k for evaluation
-            gens = sorted(gens,key=operator.itemgetter(0))[:self.topk]
-            # print results
-            print dact
-            print 'Penalty\tTSER\tASER\tGen'
-            for penalty, gen in gens:
-                # score slot error rate
-                cnt, total, caty = self.gentscorer.scoreERR(a,felements,
-                        self.reader.delexicalise(gen,dact))
-                # accumulate slot error cnts
-                gencnts[0]  += cnt
-                gencnts[1]  += total
-                gencnts[2]  += caty
-                print '%.4f\t%d\t%d\t%s' % (penalty,total,caty,gen)
-            print '\n'
+        data = self.reader.read(mode='test',batch=1)
+        while data!=None:
+            # read up to genbatch data points
+            points = []
+            while data!=None and len(points)<self.genbatch:
+                a,sv,s,v,sents,dact,bases,cutoff_b,cutoff_f = data
+                # remove batch dimension
+                points.append((a[0],sv[0],s[0],v[0],sents[0],dact[0],bases[0]))
+                data = self.reader.read(mode='test',batch=1)
+            # generate sentences of all data points together
+            allgens = self.model.genBatch([(a,sv,s,v) for a,sv,s,v,sents,dact,bases in points])
+            for (a,sv,s,v,sents,dact,bases),gens in zip(points,allgens):
+                # for slot error rate scoring
+                felements = [self.reader.cardinality[x+self.reader.dfs[1]]\
+                        for x in sv] 
+                # rerank and lexicalise, get the top-k for evaluation
+                gens = self.rerank(gens,a,sv,dact)
+                # print results
+                print dact
+                print 'Penalty\tTSER\tASER\tGen'
+                for penalty, gen in gens:
+                    # score slot error rate
+                    cnt, total, caty = self.gentscorer.scoreERR(a,felements,
+                            self.reader.delexicalise(gen,dact))
+                    # accumulate slot error cnts
+                    gencnts[0]  += cnt
+                    gencnts[1]  += total
+                    gencnts[2]  += caty
+                    print '%.4f\t%d\t%d\t%s' % (penalty,total,caty,gen)
+                print '\n'
             
-            # compute gold standard slot error rate
-            for sent in sents:
-                # score slot error rate
-                cnt, total, caty = self.gentscorer.scoreERR(a,felements,
-                        self.reader.delexicalise(sent,dact))
-                # accumulate slot error cnts
-                refcnts[0]  += cnt
-                refcnts[1]  += total
-                refcnts[2]  += caty
-
-            # accumulate score for bleu score computation         
-            parallel_corpus.append([[g for p,g in gens],sents])
-            hdc_corpus.append([bases[:1],sents])
+                # compute gold standard slot error rate
+                for sent in sents:
+                    # score slot error rate
+                    cnt, total, caty = self.gentscorer.scoreERR(a,felements,
+                            self.reader.delexicalise(sent,dact))
+                    # accumulate slot error cnts
+                    refcnts[0]  += cnt
+                    refcnts[1]  += total
+                    refcnts[2]  += caty
+
+                # accumulate score for bleu score computation         
+                parallel_corpus.append([[g for p,g in gens],sents])
+                hdc_corpus.append([bases[:1],sents])
 
         bleuModel   = self.gentscorer.scoreBLEU(parallel_corpus)
         bleuHDC     = self.gentscorer.scoreBLEU(hdc_corpus)
@@ -623,6 +621,8 @@ class Model(object):
         self.detectpairs= parser.get('gen','detectpairs')
         self.decode     = parser.get('gen','decode')
         self.verbose    = parser.getint('gen','verbose')
+        self.genbatch   = parser.getint('gen','genbatch') \
+                if parser.has_option('gen','genbatch') else 1
         # load model architectures from model
         self.gentype    = bundle['model']['self.gentype']
         self.di         = bundle['model']['self.di']
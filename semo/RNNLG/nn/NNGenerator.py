@@ -141,6 +141,18 @@ class NNGenerator(object):
             elif self.gentype=='hlstm':
                 return self.generator.sample(a,sv)
 
+    def genBatch(self,das):
+        # das: list of (a,sv,s,v), beam search decodes them together
+        if self.decode=='beam':
+            if self.gentype=='sclstm':
+                return self.generator.beamSearchBatch([(a,sv) for a,sv,s,v in das])
+            elif self.gentype=='encdec':
+                return self.generator.beamSearchBatch([(a,s,v) for a,sv,s,v in das])
+            elif self.gentype=='hlstm':
+                return self.generator.beamSearchBatch([(a,sv) for a,sv,s,v in das])
+        else:
+            return [self.gen(a,sv,s,v) for a,sv,s,v in das]
+
     def setWordVec(self,word2vec):
         self.generator.setWordVec(word2vec)
 
@@ -28,6 +28,8 @@ Copyright CUED Dialogue Systems Group 2015 - 2017
  
 ************************
 '''
+import heapq
+import operator
 import numpy as np
 import theano
 import math
@@ -37,10 +39,18 @@ import theano.tensor as T
 eps = 1e-7
 
 def softmax(w):
+    # normalised along the last axis, so a matrix gives one distribution per row
     e = np.exp(w)
-    dist = e/np.sum(e)
+    dist = e/np.sum(e,axis=-1,keepdims=True)
     return dist
 
+def argtopk(w,k):
+    # indices of the k largest values of each row, largest first
+    rows = np.arange(w.shape[0])[:,None]
+    top = np.argpartition(-w,k-1,axis=1)[:,:k]
+    order = np.argsort(-w[rows,top],axis=1,kind='mergesort')
+    return top[rows,order]
+
 def sigmoid(w):
     e = np.exp(-w)
     acti = 1/(1+e)
@@ -109,6 +119,66 @@ class BeamSearchNode(object):
             return self.logp/float(self.leng-1+eps)-40.0
         return self.logp/float(self.leng-1+eps)
 
+# best-first search of one DA, for decoding several DAs at once
+class BestFirstSearch(object):
+    '''
+    Queue and finished nodes of the beam search decoding of one DA
+    '''
+    def __init__(self,node,overgen):
+        self.nodes  = [(-node.eval(),node)]
+        self.qsize  = 1
+        self.endnodes = []
+        self.overgen= overgen
+        self.done   = False
+
+    def next(self,model):
+        '''
+        Pop nodes until reaching one which has to be expanded, return None once the search has finished
+        '''
+        while not self.done:
+            # give up when decoding takes too long
+            if self.qsize>10000:
+                self.done = True
+                break
+            # fetch the best node
+            score, n = heapq.heappop(self.nodes)
+            # if end of sentence token
+            if n.wordid==1 and n.prevNode!=None:
+                self.endnodes.append((model._endScore(n),n))
+                # if reach maximum # of sentences required
+                if len(self.endnodes)>=self.overgen:
+                    self.done = True
+                continue
+            return n
+        return None
+
+    def put(self,nodes):
+        '''
+        Put the children of an expanded node into the queue
+        '''
+        for node in nodes:
+            heapq.heappush(self.nodes,(-node.eval(),node))
+        # increase qsize
+        self.qsize += len(nodes)-1
+
+    def nbest(self):
+        '''
+        Back trace the finished paths, or the top scored paths if none has finished
+        '''
+        endnodes = self.endnodes
+        if len(endnodes)==0:
+            endnodes = [heapq.heappop(self.nodes) for n in range(self.overgen)]
+        utts = []
+        for score,n in sorted(endnodes,key=operator.itemgetter(0)):
+            utt = [n.wordid]
+            while n.prevNode!=None:
+                # back trace
+                n = n.prevNode
+                utt.append(n.wordid)
+            utt = utt[::-1]
+            utts.append((score,utt))
+        return utts
+
 # basic class for Recurrent Language Generator
 class BaseRLG(object):
     '''
@@ -149,6 +219,44 @@ class BaseRLG(object):
         '''
         pass
 
+    def beamSearchBatch(self):
+        '''
+        Beam search decoding of several DAs at once, gives the same nbest lists as beamSearch on each DA
+        '''
+        pass
+
+    def _beamSearchNodes(self,starts):
+        '''
+        Best-first search from each starting node. The searches run in lockstep: each pops its queue
+        until it reaches a node to expand, and the nodes of all searches are expanded together by one
+        call to _genBatch. Every search pops and expands the same nodes as it would on its own.
+        '''
+        searches = [BestFirstSearch(node,self.overgen) for node in starts]
+        while True:
+            expanding = []
+            for search in searches:
+                n = search.next(self)
+                if n!=None:
+                    expanding.append((search,n))
+            if len(expanding)==0: break
+            # decode for one step for all searches
+            steps = self._genBatch([n for search,n in expanding])
+            for (search,n),step in zip(expanding,steps):
+                search.put(self._expand(n,step))
+        return [search.nbest() for search in searches]
+
+    def _expand(self,node,step):
+        '''
+        Make the child nodes of a node from the output of its decoding step
+        '''
+        pass
+
+    def _endScore(self,node):
+        '''
+        Score of a finished node
+        '''
+        return -node.eval()
+
     def sample(self):
         '''
         The generation function in numpy using ramdom sampling
@@ -160,6 +268,12 @@ class BaseRLG(object):
         Per step generation function in numpy while testing
         '''
         pass
+
+    def _genBatch(self):
+        '''
+        Per step generation function for a list of nodes, computed as one matrix operation
+        '''
+        pass
     
     def loadConverseParams(self):
         '''
@@ -34,7 +34,6 @@ Copyright CUED Dialogue Systems Group 2015 - 2017
 import operator
 import numpy as np
 import theano.tensor as T
-from Queue import PriorityQueue
 
 from basic  import *
 
@@ -161,57 +160,32 @@ class encdec(BaseRLG):
                 self.Wsh_np[s,:]+self.Wvh_np[v,:]
 
     def beamSearch(self,a,s,v):
-        # embed DA
-        a_emb, sv_emb = self._npemb(a,s,v)
-        # end nodes
-        endnodes = []
-        # initial layers
-        h0,c0 = np.zeros(self.dh),np.zeros(self.dh)
-        # starting node
-        node = BeamSearchNode(h0,c0,None,1,0,1)
-        node.sv = sv_emb
-        node.a  = a_emb
-        # queue for beam search
-        nodes= PriorityQueue()
-        nodes.put((-node.eval(),node))
-        qsize = 1
-        # start beam search
-        while True:
-            # give up when decoding takes too long 
-            if qsize>10000: break
-            # fetch the best node
-            score, n = nodes.get()
-            # if end of sentence token 
-            if n.wordid==1 and n.prevNode!=None:
-                endnodes.append((score,n))
-                # if reach maximum # of sentences required
-                if len(endnodes)>=self.overgen: break
-                else:                           continue
-            # decode for one step using decoder 
-            words, probs, c, h = self._gen(n)
-            # put them into a queue
-            for i in range(len(words)):
-                node = BeamSearchNode(h,c,n,words[i],
-                        n.logp+np.log10(probs[i]),n.leng+1)
-                node.sv = sv_emb
-                node.a  = a_emb
-                nodes.put( (-node.eval(),node) )
-            # increase qsize
-            qsize += len(words)-1
-        # if no finished nodes, choose the top scored paths
-        if len(endnodes)==0:
-            endnodes = [nodes.get() for n in range(self.overgen)]
-        # choose nbest paths, back trace them
-        utts = []
-        for score,n in sorted(endnodes,key=operator.itemgetter(0)):
-            utt = [n.wordid]
-            while n.prevNode!=None:
-                # back trace
-                n = n.prevNode
-                utt.append(n.wordid)
-            utt = utt[::-1]
-            utts.append((score,utt))
-        return utts
+        return self.beamSearchBatch([(a,s,v)])[0]
+
+    def beamSearchBatch(self,das):
+        # starting nodes, one per DA
+        starts = []
+        for a,s,v in das:
+            # embed DA
+            a_emb, sv_emb = self._npemb(a,s,v)
+            # initial layers
+            h0,c0 = np.zeros(self.dh),np.zeros(self.dh)
+            node = BeamSearchNode(h0,c0,None,1,0,1)
+            node.sv = sv_emb
+            node.a  = a_emb
+            starts.append(node)
+        return self._beamSearchNodes(starts)
+
+    def _expand(self,n,step):
+        words, probs, c, h = step
+        logps = n.logp+np.log10(probs)
+        nodes = []
+        for i in range(len(words)):
+            node = BeamSearchNode(h,c,n,words[i],logps[i],n.leng+1)
+            node.sv = n.sv
+            node.a  = n.a
+            nodes.append(node)
+        return nodes
 
     def sample(self,a,s,v):
         # embed DA
@@ -260,36 +234,47 @@ class encdec(BaseRLG):
         return gens 
 
     def _gen(self,node):
-        
+        return self._genBatch([node])[0]
+
+    def _genBatch(self,nodes):
+        # stack the states of the nodes, one row per node
+        h_tm1 = np.array([n.h for n in nodes])
+        c_tm1 = np.array([n.c for n in nodes])
+        a_emb = np.array([n.a for n in nodes])
         # input word embedding
-        wv_t = sigmoid(self.Wemb_np[node.wordid,:])
-        # attention
-        b_t = np.zeros((node.sv.shape[0]))
-        for j in range(node.sv.shape[0]):
-            b_t[j] = np.dot(tanh(np.dot(
-                np.concatenate([wv_t,node.h,node.sv[j]],axis=0),
-                self.Wha_np)),self.Vha_np)
-        b_t = softmax(b_t)
-        sv_emb_t = np.dot(b_t,node.sv)
-        da_emb_t = tanh( node.a+sv_emb_t )
+        wv_t = sigmoid(self.Wemb_np[[n.wordid for n in nodes],:])
+        # attention, scoring the slot-value pairs of all nodes together
+        lens = [n.sv.shape[0] for n in nodes]
+        state_x = np.concatenate([np.repeat(
+            np.concatenate([wv_t,h_tm1],axis=1),lens,axis=0),
+            np.concatenate([n.sv for n in nodes],axis=0)],axis=1)
+        score_x = np.dot(tanh(np.dot(state_x,self.Wha_np)),self.Vha_np)
+        sv_emb_t = np.zeros((len(nodes),self.dh))
+        start = 0
+        for i in range(len(nodes)):
+            b_t = softmax(score_x[start:start+lens[i]])
+            sv_emb_t[i] = np.dot(b_t,nodes[i].sv)
+            start += lens[i]
+        da_emb_t = tanh( a_emb+sv_emb_t )
         # compute ig, fg, og together and slice it
-        gates_t = np.dot( np.concatenate([wv_t,node.h,da_emb_t],axis=0),
+        gates_t = np.dot( np.concatenate([wv_t,h_tm1,da_emb_t],axis=1),
                 self.Wgate_np)
-        ig  = sigmoid(gates_t[:self.dh])
-        fg  = sigmoid(gates_t[self.dh:self.dh*2])
-        og  = sigmoid(gates_t[self.dh*2:self.dh*3])
-        cx_t= tanh( gates_t[self.dh*3:] )
+        ig  = sigmoid(gates_t[:,:self.dh])
+        fg  = sigmoid(gates_t[:,self.dh:self.dh*2])
+        og  = sigmoid(gates_t[:,self.dh*2:self.dh*3])
+        cx_t= tanh( gates_t[:,self.dh*3:] )
         # update lstm internal state
-        c_t = np.multiply(ig,cx_t) + np.multiply(fg,node.c)
+        c_t = np.multiply(ig,cx_t) + np.multiply(fg,c_tm1)
         # obtain new hiddne layer
         h_t = np.multiply(og,tanh(c_t))
         # compute output distribution target word prob
         o_t = softmax( np.dot(h_t,self.Who_np) )
         # make sure we won't sample unknown word
-        o_t[0] = 0.0
-        selected_words = np.argsort(o_t)[::-1][:self.beamwidth].tolist()
+        o_t[:,0] = 0.0
+        selected_words = argtopk(o_t,self.beamwidth)
         # return results
-        return selected_words, o_t[selected_words], c_t, h_t
+        return [(selected_words[i].tolist(), o_t[i,selected_words[i]],
+            c_t[i], h_t[i]) for i in range(len(nodes))]
 
     def loadConverseParams(self):
         self.Wemb_np    = self.params[0].get_value()
@@ -35,7 +35,6 @@ Copyright CUED Dialogue Systems Group 2015 - 2017
 import operator
 import numpy as np
 import theano.tensor as T
-from Queue import PriorityQueue
 from theano.ifelse import ifelse
 from copy import deepcopy
 
@@ -187,62 +186,35 @@ class hlstm(BaseRLG):
         return vec
 
     def beamSearch(self,a,sv):
-        # get 1 hot vector
-        a = self._get1hot(a,self.da)
-        sv= self._get1hot(sv,self.dsv)
-        # end nodes
-        endnodes = []
-        # initial layers
-        h0,c0 = np.zeros(self.dh),np.zeros(self.dh)
-        # starting node
-        node = BeamSearchNode(h0,c0,None,1,0,1)
-        node.sv = sv
-        node.a  = a
-        # queue for beam search
-        nodes= PriorityQueue()
-        nodes.put((-node.eval(),node))
-        qsize = 1
-        # start beam search
-        while True:
-            # give up when decoding takes too long 
-            if qsize>10000: break
-            # fetch the best node
-            score, n = nodes.get()
-            # if end of sentence token 
-            if n.wordid==1 and n.prevNode!=None:
-                endnodes.append((score,n))
-                # if reach maximum # of sentences required
-                if len(endnodes)>=self.overgen: break
-                else:                           continue
-            # decode for one step using decoder 
-            words, probs, c, h = self._gen(n)
-            # put them into a queue
-            for i in range(len(words)):
-                node = BeamSearchNode(h,c,n,words[i],
-                        n.logp+np.log10(probs[i]),n.leng+1)
-                # heuristically update DA
-                node.sv = n.sv
-                node.a  = n.a
-                tmpsv   = np.append(node.sv,1.0)
-                tmpsv[self.tokmap_np[words[i]]] = 0.0
-                node.sv = tmpsv[:-1]
-                nodes.put( (-node.eval(),node) )
-            # increase qsize
-            qsize += len(words)-1
-        # if no finished nodes, choose the top scored paths
-        if len(endnodes)==0:
-            endnodes = [nodes.get() for n in range(self.overgen)]
-        # choose nbest paths, back trace them
-        utts = []
-        for score,n in sorted(endnodes,key=operator.itemgetter(0)):
-            utt = [n.wordid]
-            while n.prevNode!=None:
-                # back trace
-                n = n.prevNode
-                utt.append(n.wordid)
-            utt = utt[::-1]
-            utts.append((score,utt))
-        return utts
+        return self.beamSearchBatch([(a,sv)])[0]
+
+    def beamSearchBatch(self,das):
+        # starting nodes, one per DA
+        starts = []
+        for a,sv in das:
+            # initial layers
+            h0,c0 = np.zeros(self.dh),np.zeros(self.dh)
+            node = BeamSearchNode(h0,c0,None,1,0,1)
+            # get 1 hot vector
+            node.sv = self._get1hot(sv,self.dsv)
+            node.a  = self._get1hot(a,self.da)
+            starts.append(node)
+        return self._beamSearchNodes(starts)
+
+    def _expand(self,n,step):
+        words, probs, c, h = step
+        logps = n.logp+np.log10(probs)
+        # heuristically update DA, one row per child
+        tmpsv = np.tile(np.append(n.sv,1.0),(len(words),1))
+        tmpsv[np.arange(len(words)),self.tokmap_np[words]] = 0.0
+        tmpsv = tmpsv[:,:-1]
+        nodes = []
+        for i in range(len(words)):
+            node = BeamSearchNode(h,c,n,words[i],logps[i],n.leng+1)
+            node.sv = tmpsv[i]
+            node.a  = n.a
+            nodes.append(node)
+        return nodes
 
     def sample(self,a,sv):
         # get 1 hot vector
@@ -294,30 +266,37 @@ class hlstm(BaseRLG):
         return gens 
 
     def _gen(self,node):
-        
+        return self._genBatch([node])[0]
+
+    def _genBatch(self,nodes):
+        # stack the states of the nodes, one row per node
+        h_tm1 = np.array([n.h for n in nodes])
+        c_tm1 = np.array([n.c for n in nodes])
         # input word embedding
-        wv_t = sigmoid(self.Wemb_np[node.wordid,:])
+        wv_t = sigmoid(self.Wemb_np[[n.wordid for n in nodes],:])
         # embed DA
-        da_emb_t = tanh(np.dot(np.concatenate([node.a,node.sv],axis=0),self.Wfc_np))
+        da_emb_t = tanh(np.dot(np.array([np.concatenate([n.a,n.sv],axis=0)
+            for n in nodes]),self.Wfc_np))
         # compute ig, fg, og together and slice it
         gates_t = np.dot( np.concatenate(
-            [wv_t,node.h,da_emb_t],axis=0),self.Wgate_np)
-        ig  = sigmoid(gates_t[:self.dh])
-        fg  = sigmoid(gates_t[self.dh:self.dh*2])
-        og  = sigmoid(gates_t[self.dh*2:self.dh*3])
-        cx_t= np.tanh(gates_t[self.dh*3:])
+            [wv_t,h_tm1,da_emb_t],axis=1),self.Wgate_np)
+        ig  = sigmoid(gates_t[:,:self.dh])
+        fg  = sigmoid(gates_t[:,self.dh:self.dh*2])
+        og  = sigmoid(gates_t[:,self.dh*2:self.dh*3])
+        cx_t= np.tanh(gates_t[:,self.dh*3:])
         # update lstm internal state
         c_t =   np.multiply(ig,cx_t) +\
-                np.multiply(fg,node.c)
+                np.multiply(fg,c_tm1)
         # obtain new hiddne layer
         h_t = np.multiply(og,tanh(c_t))
         # compute output distribution target word prob
         o_t = softmax( np.dot(h_t,self.Who_np) )
         # make sure we won't sample unknown word
-        o_t[0] = 0.0
-        selected_words = np.argsort(o_t)[::-1][:self.beamwidth].tolist()
+        o_t[:,0] = 0.0
+        selected_words = argtopk(o_t,self.beamwidth)
         # return results
-        return selected_words, o_t[selected_words], c_t, h_t
+        return [(selected_words[i].tolist(), o_t[i,selected_words[i]],
+            c_t[i], h_t[i]) for i in range(len(nodes))]
 
     def loadConverseParams(self):
         self.Wemb_np    = self.params[0].get_value()
@@ -35,7 +35,6 @@ Copyright CUED Dialogue Systems Group 2015 - 2017
 import operator
 import numpy as np
 import theano.tensor as T
-from Queue import PriorityQueue
 
 from basic  import *
 
@@ -163,63 +162,37 @@ class sclstm(BaseRLG):
         return vec
 
     def beamSearch(self,a,sv):
-        # get 1 hot vector
-        a = self._get1hot(a,self.da)
-        sv= self._get1hot(sv,self.dsv)
-        # end nodes
-        endnodes = []
-        # initial layers
-        h0,c0 = np.zeros(self.dh),np.zeros(self.dh)
-        # starting node
-        node = BeamSearchNode(h0,c0,None,1,0,1)
-        node.sv = sv
-        node.a  = a
-        # queue for beam search
-        nodes= PriorityQueue()
-        nodes.put((-node.eval(),node))
-        qsize = 1
-        # start beam search
-        while True:
-            # give up when decoding takes too long 
-            if qsize>10000: break
-            # fetch the best node
-            score, n = nodes.get()
-            # if end of sentence token 
-            if n.wordid==1 and n.prevNode!=None:
-                # update score with sem cost
-                n.logp -= np.sum(abs(n.sv))
-                score = -n.eval()
-                endnodes.append((score,n))
-                # if reach maximum # of sentences required
-                if len(endnodes)>=self.overgen: break
-                else:                           continue
-            # decode for one step using decoder 
-            words, probs, sv, c, h = self._gen(n)
-            # put them into a queue
-            for i in range(len(words)):
-                node = BeamSearchNode(h,c,n,words[i],
-                        n.logp+np.log10(probs[i])-
-                        np.sum(0.0001*(100.0**abs(sv-n.sv)))
-                        ,n.leng+1)
-                node.sv = sv
-                node.a  = a
-                nodes.put( (-node.eval(),node) )
-            # increase qsize
-            qsize += len(words)-1
-        # if no finished nodes, choose the top scored paths
-        if len(endnodes)==0:
-            endnodes = [nodes.get() for n in range(self.overgen)]
-        # choose nbest paths, back trace them
-        utts = []
-        for score,n in sorted(endnodes,key=operator.itemgetter(0)):
-            utt = [n.wordid]
-            while n.prevNode!=None:
-                # back trace
-                n = n.prevNode
-                utt.append(n.wordid)
-            utt = utt[::-1]
-            utts.append((score,utt))
-        return utts
+        return self.beamSearchBatch([(a,sv)])[0]
+
+    def beamSearchBatch(self,das):
+        # starting nodes, one per DA
+        starts = []
+        for a,sv in das:
+            # initial layers
+            h0,c0 = np.zeros(self.dh),np.zeros(self.dh)
+            node = BeamSearchNode(h0,c0,None,1,0,1)
+            # get 1 hot vector
+            node.sv = self._get1hot(sv,self.dsv)
+            node.a  = self._get1hot(a,self.da)
+            starts.append(node)
+        return self._beamSearchNodes(starts)
+
+    def _expand(self,n,step):
+        words, probs, sv, c, h = step
+        # scores of all children, with the sem cost of the DA update
+        logps = n.logp+np.log10(probs)-np.sum(0.0001*(100.0**abs(sv-n.sv)))
+        nodes = []
+        for i in range(len(words)):
+            node = BeamSearchNode(h,c,n,words[i],logps[i],n.leng+1)
+            node.sv = sv
+            node.a  = n.a
+            nodes.append(node)
+        return nodes
+
+    def _endScore(self,n):
+        # update score with sem cost
+        n.logp -= np.sum(abs(n.sv))
+        return -n.eval()
 
     def sample(self,a,sv):
         # get 1 hot vector
@@ -273,36 +246,43 @@ class sclstm(BaseRLG):
         return gens 
 
     def _gen(self,node):
-        
+        return self._genBatch([node])[0]
+
+    def _genBatch(self,nodes):
+        # stack the states of the nodes, one row per node
+        h_tm1 = np.array([n.h for n in nodes])
+        c_tm1 = np.array([n.c for n in nodes])
+        sv_tm1= np.array([n.sv for n in nodes])
+        a     = np.array([n.a for n in nodes])
         # input word embedding
-        wv_t = sigmoid(self.Wemb_np[node.wordid,:])
+        wv_t = sigmoid(self.Wemb_np[[n.wordid for n in nodes],:])
         # compute ig, fg, og together and slice it
-        gates_t = np.dot( np.concatenate(
-            [wv_t,node.h,node.sv],axis=0),self.Wgate_np)
-        ig  = sigmoid(gates_t[:self.dh])
-        fg  = sigmoid(gates_t[self.dh:self.dh*2])
-        og  = sigmoid(gates_t[self.dh*2:self.dh*3])
+        x_t = np.concatenate([wv_t,h_tm1,sv_tm1],axis=1)
+        gates_t = np.dot(x_t,self.Wgate_np)
+        ig  = sigmoid(gates_t[:,:self.dh])
+        fg  = sigmoid(gates_t[:,self.dh:self.dh*2])
+        og  = sigmoid(gates_t[:,self.dh*2:self.dh*3])
         # compute reading rg
-        rg  = sigmoid(np.dot(np.concatenate(
-            [wv_t,node.h,node.sv],axis=0),self.Wrgate_np))
+        rg  = sigmoid(np.dot(x_t,self.Wrgate_np))
         # compute proposed cell value
         cx_t= np.tanh(np.dot(np.concatenate(
-            [wv_t,node.h],axis=0),self.Wcx_np))
+            [wv_t,h_tm1],axis=1),self.Wcx_np))
         # update DA 1-hot vector
-        sv_t = np.multiply(rg,node.sv)
+        sv_t = np.multiply(rg,sv_tm1)
         # update lstm internal state
         c_t =   np.multiply(ig,cx_t) +\
-                np.multiply(fg,node.c)+\
-                tanh(np.dot(np.concatenate([node.a,sv_t],axis=0),self.Wfc_np))
+                np.multiply(fg,c_tm1)+\
+                tanh(np.dot(np.concatenate([a,sv_t],axis=1),self.Wfc_np))
         # obtain new hiddne layer
         h_t = np.multiply(og,tanh(c_t))
         # compute output distribution target word prob
         o_t = softmax( np.dot(h_t,self.Who_np) )
         # make sure we won't sample unknown word
-        o_t[0] = 0.0
-        selected_words = np.argsort(o_t)[::-1][:self.beamwidth].tolist()
+        o_t[:,0] = 0.0
+        selected_words = argtopk(o_t,self.beamwidth)
         # return results
-        return selected_words, o_t[selected_words], sv_t, c_t, h_t
+        return [(selected_words[i].tolist(), o_t[i,selected_words[i]],
+            sv_t[i], c_t[i], h_t[i]) for i in range(len(nodes))]
 
     def loadConverseParams(self):
         self.Wemb_np    = self.params[0].get_value()
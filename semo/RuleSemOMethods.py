@@ -34,6 +34,7 @@ Copyright CUED Dialogue Systems Group 2015 - 2017
     import :mod:`utils.DiaAct` |.|
     import :mod:`utils.dact` |.|
     import :mod:`utils.ContextLogger` |.|
+    import :class:`utils.LRUCache.LRUCache` |.|
     import :mod:`ontology.OntologyUtils` |.|
 
 ************************
@@ -61,6 +62,7 @@ from random import shuffle
 
 import SemOManager
 from utils import Settings, DiaAct, ContextLogger, dact
+from utils.LRUCache import LRUCache
 from ontology import OntologyUtils
 logger = ContextLogger.getLogger('')  
 
@@ -458,10 +460,16 @@ class BasicTemplateGenerator(object):
     The basic template generator loads a list of template-based rules from a string.
     These are then applied on any input dialogue act and used to generate an output string.
 
+    The rules are indexed by act type, as only rules of the same type as the input act can be chosen. The chosen rule is
+    cached by act signature (see :meth:`signature`), so that an act of a known signature only matches its values against
+    that rule.
+
     :param filename: the template rules file
     :type filename: str
+    :param cachesize: number of act signatures of which the chosen rule is kept (0 disables the cache)
+    :type cachesize: int
     '''
-    def __init__(self, filename):
+    def __init__(self, filename, cachesize=1000):
         from utils import Scanner
         fn = Settings.locate_file(filename)
         if os.path.exists(fn):
@@ -476,6 +484,8 @@ class BasicTemplateGenerator(object):
             self.function_map = {}
             self.parse_rules(scanner)
             f.close()
+            self.index_rules()
+            self.rule_cache = LRUCache(cachesize)
         else:
             logger.error("Cannot locate template file %s",filename)
 
@@ -500,42 +510,58 @@ class BasicTemplateGenerator(object):
         except SyntaxError as inst:
             print inst
 
-    def transform(self, sysAct):
+    def index_rules(self):
+        '''Groups the rules by act type, keeping their order, and collects the values the rules of each act type name.
         '''
-        Transforms the sysAct from a semantic utterance form to a text form using the rules in the generator.
-        This function will run the sysAct through all variable rules and will choose the best one according to the
-        number of matched act types, matched items and missing items.
+        self.rules_by_act = defaultdict(list)
+        self.terminals_by_act = defaultdict(set)
+        for rule in self.rules:
+            self.rules_by_act[rule.rule_act.act].append(rule)
+            for item in rule.rule_act.items:
+                if item.val is None or item.val[0] != '$':
+                    self.terminals_by_act[rule.rule_act.act].add(item.val)
 
-        :param sysAct: input system action (semantic form).
-        :type sysAct: str
-        :returns: (str) natural language 
+    def signature(self, act):
+        '''
+        The act type and the sorted slot-value pairs of the act, where each value no rule of that act type names is replaced
+        by a placeholder. Equal values get the same placeholder. A rule compares the values of an act only with the values
+        it names and with each other, so acts of the same signature choose the same rule.
+
+        :param act: the input act
+        :type act: :class:`DiaAct.DiaAct`
+        :returns: (tuple) hashable signature
+        '''
+        terminals = self.terminals_by_act.get(act.act, ())
+        placeholders = {}
+        items = []
+        for item in sorted(act.items, key=lambda item: (item.slot, item.val)):
+            val = item.val
+            if val not in terminals:
+                val = placeholders.setdefault(val, '$%d' % len(placeholders))
+            items.append((item.slot, val))
+        return act.act, tuple(items)
+
+    def choose_rule(self, input_utt):
+        '''
+        Runs the act through all rules of its type and chooses the best one according to the number of matched items and
+        missing items.
+
+        :param input_utt: input system act
+        :type input_utt: :class:`DiaAct.DiaAct`
+        :returns: best rule or None, its output words, number of missing items and non-terminal map
         '''
-        input_utt = DiaAct.DiaAct(sysAct)
-        
-        # FIXME hack to transform system acts with slot op "!=" to "=" and add slot-value pair other=true which is needed by NLG rule base
-        # assumption: "!=" only appears if there are no further alternatives, ie, inform(name=none, name!=place!, ...)
-        negFound = False
-        for item in input_utt.items:
-            if item.op == "!=":
-                item.op = u"="
-                negFound = True
-        if negFound:
-            otherTrue = dact.DactItem(u'other',u'=',u'true')
-            input_utt.items.append(otherTrue)        
-            
-        # Iterate over BasicTemplateRule rules.
         best_rule = None
         best = None
         best_matches = 0
         best_type_match = 0
         best_missing = 1000
         best_non_term_map = None
-        for rule in self.rules:
-            logger.debug('Checking Rule %s' % str(rule)) 
+        for rule in self.rules_by_act.get(input_utt.act, []):
+            logger.debug('Checking Rule %s', rule)
             out, matches, missing, type_match, non_term_map = rule.generate(input_utt)
             if type_match > 0:
-                logger.debug('Checking Rule %s: type_match=%d, missing=%d, matches=%d, output=%s' %
-                             (str(rule), type_match, missing, matches, ' '.join(out)))
+                logger.debug('Checking Rule %s: type_match=%d, missing=%d, matches=%d, output=%s',
+                             rule, type_match, missing, matches, ' '.join(out))
 
             # Pick up the best rule.
             choose_this = False
@@ -559,6 +585,40 @@ class BasicTemplateGenerator(object):
                 if best_type_match == 1 and best_missing == 0 and best_matches == len(input_utt.items):
                     break
 
+        return best_rule, best, best_missing, best_non_term_map
+
+    def transform(self, sysAct):
+        '''
+        Transforms the sysAct from a semantic utterance form to a text form using the rules in the generator.
+        The rule is taken from the cache if an act of the same signature has been transformed before, else chosen by
+        :meth:`choose_rule`. The values of sysAct are then matched against the rule.
+
+        :param sysAct: input system action (semantic form).
+        :type sysAct: str
+        :returns: (str) natural language 
+        '''
+        input_utt = DiaAct.DiaAct(sysAct)
+        
+        # FIXME hack to transform system acts with slot op "!=" to "=" and add slot-value pair other=true which is needed by NLG rule base
+        # assumption: "!=" only appears if there are no further alternatives, ie, inform(name=none, name!=place!, ...)
+        negFound = False
+        for item in input_utt.items:
+            if item.op == "!=":
+                item.op = u"="
+                negFound = True
+        if negFound:
+            otherTrue = dact.DactItem(u'other',u'=',u'true')
+            input_utt.items.append(otherTrue)        
+            
+        key = self.signature(input_utt)
+        best_rule = self.rule_cache.get(key)
+        if best_rule is not None:
+            best, _, best_missing, _, best_non_term_map = best_rule.generate(input_utt)
+        else:
+            best_rule, best, best_missing, best_non_term_map = self.choose_rule(input_utt)
+            if best_rule is not None:
+                self.rule_cache.put(key, best_rule)
+
         if best_rule is not None:
             if best_missing > 0:
                 logger.warning('While transforming %s, there were missing items.' % sysAct)
@@ -624,6 +684,7 @@ class BasicSemO(SemOManager.SemO):
     :parameter [basicsemo] emphasis: Generate emphasis tags.
     :parameter [basicsemo] emphasisopen: Emphasis open tag (default: &ltEMPH&lt).
     :parameter [basicsemo] emphasisclose: Emphasis close tag (default: &lt/EMPH&lt).
+    :parameter [basicsemo] templatecachesize: Number of act signatures of which the chosen template is cached (default: 1000).
     '''
     def __init__(self, domainTag=None): 
         template_filename = None
@@ -638,8 +699,11 @@ class BasicSemO(SemOManager.SemO):
         self.emphasis_close = '</EMPH>'
         if Settings.config.has_option('semo_'+domainTag, 'emphasisclose'):            
             self.emphasis = Settings.config.get('semo_'+domainTag, 'emphasisclose')
+        cachesize = 1000
+        if Settings.config.has_option('semo_'+domainTag, 'templatecachesize'):
+            cachesize = Settings.config.getint('semo_'+domainTag, 'templatecachesize')
 
-        self.generator = BasicTemplateGenerator(template_filename)
+        self.generator = BasicTemplateGenerator(template_filename, cachesize)
 
     def generate(self, act):
         if self.emphasis:
@@ -0,0 +1,134 @@
+###############################################################################
+# PyDial: Multi-domain Statistical Spoken Dialogue System Software
+###############################################################################
+#
+# Copyright 2015 - 2019
+# Cambridge University Engineering Department Dialogue Systems Group
+#
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+###############################################################################
+
+'''
+************************
+
+**test_DataBase.py** - test the database backends
+==========================================================================
+
+Checks that :class:`ontology.DataBaseBitmap.DataBase_Bitmap` answers the queries of the dialogue system as
+:class:`ontology.DataBaseSQLite.DataBase_SQLite` does, for random constraint sets built from the values of the database,
+with '!=' and dontcare constraints and values in other cases.
+
+'''
+
+import os,sys
+curdir = os.path.dirname(os.path.realpath(__file__))
+curdir = curdir.split('/')
+curdir = '/'.join(curdir[:-1]) +'/'
+os.chdir(curdir)
+sys.path.append(curdir)
+
+import random
+from utils import Settings
+from utils import ContextLogger
+from utils.dact import DactItem
+from ontology import DataBaseSQLite
+from ontology import DataBaseBitmap
+
+DOMAINS = ['CamRestaurants', 'Restaurants', 'Laptops6']
+NUM_QUERIES = 300
+
+
+def _change_case(rng, value):
+    if not isinstance(value, basestring):
+        return value
+    return rng.choice([value, value.upper(), value.title()])
+
+
+def _random_constraints(rng, columns, entities):
+    '''A list of DactItems on 1 to 3 columns, with values of random entities. The values keep the case given here, as
+    DactItem only lowers the case of values starting with a letter.
+    '''
+    constraints = []
+    for slot in rng.sample(columns, rng.randint(1, min(3, len(columns)))):
+        value = rng.choice(entities)[slot]
+        kind = rng.random()
+        if kind < 0.15:
+            item = DactItem(slot, '=', 'dontcare')
+        elif kind < 0.4:
+            item = DactItem(slot, '!=', value)
+        elif kind < 0.5:
+            item = DactItem(slot, '=', 'not a value of the database')
+        else:
+            item = DactItem(slot, '=', value)
+        item.val = _change_case(rng, item.val) if item.val != 'dontcare' else item.val
+        constraints.append(item)
+    return constraints
+
+
+class TDataBase():
+    """Compare the bitmap database with the sqlite database
+    """
+    def _compare(self, domain):
+        dbfile = 'ontology/ontologies/' + domain + '-dbase.db'
+        sqlite = DataBaseSQLite.DataBase_SQLite(dbfile=dbfile, dstring=domain)
+        bitmap = DataBaseBitmap.DataBase_Bitmap(dbfile=dbfile, dstring=domain)
+        entities = bitmap.get_all_entities()
+        columns = [slot for slot in bitmap.columns if any(ent[slot] is not None for ent in entities)]
+        assert len(entities) == len(sqlite.get_all_entities())
+
+        rng = random.Random(domain)
+        for i in range(NUM_QUERIES):
+            constraints = _random_constraints(rng, columns, entities)
+            if i % 3 == 0:
+                # dict constraints only have '=' and dontcare
+                constraints = dict((c.slot, c.val) for c in constraints if c.op == '=')
+            expected = sqlite.entity_by_features(constraints)
+            found = bitmap.entity_by_features(constraints)
+            values = constraints.values() if isinstance(constraints, dict) else [c.val for c in constraints]
+            if all(value == 'dontcare' for value in values):
+                # no constraints: every entity, shuffled by both
+                found, expected = sorted(found), sorted(expected)
+            assert found == expected, (domain, constraints)
+            assert bitmap.get_length_entity_by_features(constraints) == \
+                   sqlite.get_length_entity_by_features(constraints) == len(expected), (domain, constraints)
+
+        # no constraints (or only dontcare): every entity, shuffled by both
+        for constraints in [[], {}, [DactItem(columns[0], '=', 'dontcare')]]:
+            expected = sqlite.entity_by_features(constraints)
+            found = bitmap.entity_by_features(constraints)
+            assert sorted(found) == sorted(expected) and len(found) == len(entities)
+            assert bitmap.get_length_entity_by_features(constraints) == \
+                   sqlite.get_length_entity_by_features(constraints) == len(entities)
+
+    def test_bitmap_matches_sqlite(self):
+        '''Run the same random queries against both databases of a few domains
+        '''
+        Settings.init(config_file='./tests/test_configs/simulate_singledomain_for_all_domains.cfg', seed=1)
+        ContextLogger.createLoggingHandlers(config=Settings.config)
+        for domain in DOMAINS:
+            self._compare(domain)
+
+
+def Test():
+    test = TDataBase()
+    print "\nExecuting tests in",test.__class__.__name__
+    test.test_bitmap_matches_sqlite()
+    print "Done"
+
+
+if __name__ == '__main__':
+    Test()
+
+#END OF FILE
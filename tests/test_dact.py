@@ -0,0 +1,136 @@
+###############################################################################
+# PyDial: Multi-domain Statistical Spoken Dialogue System Software
+###############################################################################
+#
+# Copyright 2015 - 2019
+# Cambridge University Engineering Department Dialogue Systems Group
+#
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+###############################################################################
+
+'''
+************************
+
+**test_dact.py** - test the interned dialogue acts
+==========================================================================
+
+Checks that :class:`utils.dact.Act` is interned, survives copies and pickling, and is parsed by
+:meth:`utils.dact.ParseAct` and the belief trackers as its text is.
+
+'''
+
+import os,sys
+curdir = os.path.dirname(os.path.realpath(__file__))
+curdir = curdir.split('/')
+curdir = '/'.join(curdir[:-1]) +'/'
+os.chdir(curdir)
+sys.path.append(curdir)
+
+import copy
+import pickle
+from utils import Settings
+from utils import ContextLogger
+from utils import dact
+from utils import DiaAct
+from ontology import Ontology
+
+ACTS = ['hello()', 'null()', 'bye()', 'reqmore()', 'reqalts()', 'affirm()', 'negate()', 'repeat()',
+        'request(area)', 'request(food)', 'request(name="the missing sock",phone)',
+        'inform(food="thai")', 'inform(area="east",pricerange="cheap")', 'inform(area!="east")',
+        'inform(food=dontcare)', 'inform(=dontcare)', 'inform(name="none",food="Thai")',
+        'inform(name="the missing sock",food="international",area="east")',
+        'confirm(pricerange="cheap")', 'deny(food="thai",food="indian")', 'negate(area="north")',
+        'affirm(pricerange="moderate")', 'reqalts(area="west")', 'inform(count="4")',
+        'INFORM(restaurant_name="Sushi Zone")', 'REQUEST(phone_number)', 'INFORM_INTENT(intent="FindRestaurants")']
+
+
+class TDact():
+    """Test the interned dialogue acts
+    """
+    def test_interned(self):
+        '''The same act is the same object, whether it is parsed from its text or built from its items
+        '''
+        for text in ACTS:
+            act = dact.InternAct(text)
+            assert act is dact.InternAct(text) is dact.InternAct(act), text
+            assert act is dact.MakeAct(act.act, act.items), text
+            assert act is DiaAct.DiaAct(text).interned(), text
+            assert act is copy.copy(act) is copy.deepcopy(act) is pickle.loads(pickle.dumps(act)), text
+            assert dact.InternAct(act.to_string()) is act, text
+            assert DiaAct.DiaAct(act) == DiaAct.DiaAct(text), text
+        assert dact.InternAct('inform(food="thai")') is not dact.InternAct('inform(food="indian")')
+        assert dact.InternAct(None) is None
+
+    def test_parse(self):
+        '''Parsing an act gives the acts of its text
+        '''
+        for text in ACTS:
+            act = dact.InternAct(text)
+            for user in [True, False]:
+                assert dact.ParseAct(act, user=user) == dact.ParseAct(text, user=user), text
+
+    def _track(self, tracker, turns, intern):
+        for sys_act, hyps in turns:
+            if intern:
+                sys_act, hyps = dact.InternAct(sys_act), [(dact.InternAct(h), p) for h, p in hyps]
+            belief = tracker.update_belief_state(sys_act, hyps)
+        return belief
+
+    def test_trackers(self):
+        '''The trackers track interned acts as their text
+        '''
+        Settings.init(config_file='./tests/test_configs/simulate_singledomain_for_all_domains.cfg', seed=1)
+        ContextLogger.createLoggingHandlers(config=Settings.config)
+        Settings.config.set('GENERAL', 'domains', 'CamRestaurants,Restaurants')
+        if not Settings.config.has_section('policy'):
+            Settings.config.add_section('policy')
+        Settings.config.set('policy', 'policytype', 'gp')
+        # a policy other than gp for the SGD tracker, for the features of the last acts in the belief
+        Settings.config.add_section('policy_Restaurants')
+        Settings.config.set('policy_Restaurants', 'policytype', 'hdc')
+        Ontology.init_global_ontology()
+        from belieftracking.baseline import FocusTracker
+        from belieftracking.myBeliefTracker.SGD_beliefTracker import SGDBeliefTracker
+
+        turns = [('hello()', [('inform(food="thai")', 0.7), ('inform(food="indian")', 0.2), ('null()', 0.1)]),
+                 ('confirm(food="thai")', [('affirm()', 0.6), ('negate(area="east")', 0.4)]),
+                 ('request(pricerange)', [('inform(pricerange="cheap")', 0.9), ('reqalts()', 0.1)]),
+                 ('inform(name="none",food="thai")', [('request(phone)', 1.0)])]
+        assert self._track(FocusTracker('CamRestaurants'), turns, False) == \
+               self._track(FocusTracker('CamRestaurants'), turns, True)
+
+        turns = [('hello()', [('INFORM_INTENT(intent="FindRestaurants")', 1.0)]),
+                 ('request(city)', [('INFORM(city="San Jose")', 1.0)]),
+                 ('request(cuisine)', [('INFORM(cuisine="Thai")', 1.0)]),
+                 ('confirm(cuisine="thai")', [('AFFIRM()', 1.0)]),
+                 ('inform(restaurant_name="sushi zone",city="san jose")', [('REQUEST(phone_number)', 1.0)])]
+        beliefs = [self._track(SGDBeliefTracker('Restaurants'), turns, intern) for intern in [False, True]]
+        assert beliefs[0] == beliefs[1]
+        assert beliefs[1]['beliefs']['lastUserAct'] == 'REQUEST(phone_number)'
+
+
+def Test():
+    test = TDact()
+    print "\nExecuting tests in",test.__class__.__name__
+    test.test_interned()
+    test.test_parse()
+    test.test_trackers()
+    print "Done"
+
+
+if __name__ == '__main__':
+    Test()
+
+#END OF FILE
@@ -26,6 +26,13 @@ ConfusionModel.py - handcrafted SemI error creator
 
 Copyright CUED Dialogue Systems Group 2015 - 2017
 
+The Levenshtein confusion model needs the edit distances between all the values of a slot. They are computed for all pairs
+at once by :func:`levenshteinDistances`, kept in memory for the run and, if a directory is configured, saved there so
+that later runs load them instead::
+
+    [errormodel]
+    confusioncachedir = cache/confusions     # the files are named after a hash of the word list
+
 .. seealso:: CUED Imports/Dependencies: 
 
     import :mod:`utils.DiaAct` |.|
@@ -39,6 +46,8 @@ Copyright CUED Dialogue Systems Group 2015 - 2017
 
 __author__ = "cued_dialogue_systems_group"
 import copy
+import hashlib
+import os
 
 from utils import Settings
 from utils import DiaAct
@@ -47,6 +56,84 @@ from utils import ContextLogger
 import numpy as np
 logger = ContextLogger.getLogger('')
 
+_BLOCK = 256                  # words per block in levenshteinDistances()
+_distanceCache = {}           # hash of a word list -> distances between its sorted words
+
+
+def levenshteinDistances(words):
+    '''Edit distances between all pairs of words. The words are sorted by length and cut into blocks, and the dynamic
+    programming is run for a block of source words against a block of target words at once, one source character per step.
+    As the distance is symmetric only the blocks on and above the diagonal are computed.
+
+    :param words: the words
+    :type words: list
+    :returns: (numpy.ndarray) len(words) x len(words) matrix of distances
+    '''
+    n = len(words)
+    lens = np.array([len(w) for w in words], dtype=int)
+    width = max(lens.max(), 1) if n else 1
+    chars = np.empty((n, width), dtype=np.int32)
+    chars.fill(-1)
+    for i, w in enumerate(words):
+        chars[i, :len(w)] = [ord(c) for c in w]
+
+    distances = np.zeros((n, n), dtype=int)
+    order = np.argsort(lens, kind='mergesort')
+    blocks = [order[start:start + _BLOCK] for start in range(0, n, _BLOCK)]
+    for b, rows in enumerate(blocks):
+        rowlens = lens[rows]
+        for cols in blocks[b:]:
+            collens = lens[cols]
+            w = max(collens.max(), 1)
+            offsets = np.arange(w + 1, dtype=np.int16)
+            targets = chars[cols, :w]
+            prev = np.tile(offsets, (len(rows), len(cols), 1))
+            distances[np.ix_(rows[rowlens == 0], cols)] = collens
+            distances[np.ix_(cols, rows[rowlens == 0])] = collens[:, None]
+            for i in range(rowlens.max()):
+                cur = np.empty_like(prev)
+                cur[:, :, 0] = i + 1
+                np.minimum(prev[:, :, 1:] + 1, prev[:, :, :-1] + (chars[rows, i][:, None, None] != targets),
+                           out=cur[:, :, 1:])
+                # insertions: cur[j] = min over k <= j of cur[k] + j - k
+                cur -= offsets
+                cur = np.minimum.accumulate(cur, axis=2)
+                cur += offsets
+                prev = cur
+                done = np.flatnonzero(rowlens == i + 1)
+                if len(done):
+                    result = cur[done][:, np.arange(len(cols)), collens]
+                    distances[np.ix_(rows[done], cols)] = result
+                    distances[np.ix_(cols, rows[done])] = result.T
+    return distances
+
+
+def _cachedDistances(words, cachedir=None):
+    '''Edit distances between the sorted distinct words, from memory, from cachedir or computed.
+    '''
+    key = hashlib.sha1(u'\n'.join(words).encode('utf-8')).hexdigest()
+    if key in _distanceCache:
+        return _distanceCache[key]
+    path = None
+    if cachedir:
+        path = os.path.join(cachedir, 'levenshtein-%s.npy' % key)
+    if path is not None and os.path.isfile(path):
+        distances = np.load(path).astype(int)
+    else:
+        distances = levenshteinDistances(words)
+        if path is not None:
+            try:
+                if not os.path.isdir(cachedir):
+                    os.makedirs(cachedir)
+                tmp = '%s.%d.tmp' % (path, os.getpid())
+                with open(tmp, 'wb') as f:
+                    np.save(f, distances.astype(np.uint16))
+                os.rename(tmp, path)
+            except (IOError, OSError) as e:
+                logger.warning('Could not save confusion distances to %s: %s' % (cachedir, e))
+    _distanceCache[key] = distances
+    return distances
+
 
 class EMConfusionModel(object):
     '''Base class for EMRandomConfusionModel. 
@@ -221,6 +308,9 @@ class EMLevenshteinConfusionModel(EMConfusionModel):
 
     def __init__(self, domainString):
         self.domainString = domainString
+        self.cachedir = None
+        if Settings.config.has_option('errormodel', 'confusioncachedir'):
+            self.cachedir = Settings.config.get('errormodel', 'confusioncachedir')
 
         self.CONFUSE_TYPE = 0.2
         self.CONFUSE_SLOT = 0.3
@@ -265,12 +355,17 @@ class EMLevenshteinConfusionModel(EMConfusionModel):
         wlist = list(word_list)
         Settings.random.shuffle(wlist)
         distributions = {}
-        distances = [[self.levenshteinDistance(w1,w2) for w1 in wlist] for w2 in wlist]
+        words = sorted(set(wlist))
+        index = dict((w, i) for i, w in enumerate(words))
+        order = [index[w] for w in wlist]
+        distances = _cachedDistances(words, self.cachedir)[np.ix_(order, order)]
+        neighbours = np.argsort(distances, axis=1)[:, 1:self.len_confusion_list+1]
+        warray = np.array(wlist)
         for i in range(len(wlist)):
             word = wlist[i]
             distributions[word] = {}
-            sorted_indexes = np.argsort(distances[i])[1:self.len_confusion_list+1]
-            sorted_wordlist = np.array(wlist)[sorted_indexes]
+            sorted_indexes = neighbours[i]
+            sorted_wordlist = warray[sorted_indexes]
             distribution = np.array(distances[i])[sorted_indexes]
             distribution = 1./distribution
             distribution /= sum(distribution)
@@ -164,8 +164,11 @@ class DomainsErrorSimulator(object):
     def confuse_act(self, last_user_act):
         """Clean act in --> Confused act out. 
 
-        :param: (str) simulated users semantic action
-        :returns (list) of confused user acts.
+        The confusions are made on :class:`DiaAct.DiaActWithProb` copies of the act. The n-best list holds interned acts,
+        which are passed on to the agent and the belief trackers as they are.
+
+        :param: (:class:`utils.dact.Act`) simulated users semantic action
+        :returns (list) of (:class:`utils.dact.Act`, confidence score) pairs, the confused user acts.
         """
         uact = last_user_act
         if not isinstance(uact, DiaAct.DiaActWithProb):
@@ -177,10 +180,8 @@ class DomainsErrorSimulator(object):
         dSum = 0.0
         for hyp in n_best:
             dSum += hyp.P_Au_O # P_Au_O is the confidence score
-        for hyp in n_best:
-            hyp.P_Au_O /= dSum
         
-        return n_best
+        return [(hyp.interned(), hyp.P_Au_O / dSum) for hyp in n_best]
 
 
 #END OF FILE
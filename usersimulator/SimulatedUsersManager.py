@@ -33,7 +33,7 @@ Copyright CUED Dialogue Systems Group 2015 - 2017
     import :mod:`ontology.Ontology` |.|
     import :mod:`ontology.OntologyUtils` |.|
     import :mod:`utils.Settings` |.|
-    import :mod:`utils.DiaAct` |.|
+    import :mod:`utils.dact` |.|
     import :mod:`utils.ContextLogger`
 
 ************************
@@ -47,7 +47,7 @@ import UserModel
 import ErrorModel
 
 
-from utils import DiaAct, Settings, ContextLogger
+from utils import Settings, ContextLogger, dact
 from ontology import Ontology, OntologyUtils
 logger = ContextLogger.getLogger('')
 
@@ -84,14 +84,14 @@ class DomainsSimulatedUser(object):
         if self.randomLearning:
             self.weightGen.updateWeights()
         
-    def act_on(self, sys_act_string):
+    def act_on(self, sys_act):
         '''Thru the UserModel member, receives the system action and then responds.
 
-        :param sys_act_string: system action
-        :type sys_act_string: unicode str
-        :returns: (str) user action
+        :param sys_act: system action
+        :type sys_act: :class:`utils.dact.Act` or unicode str
+        :returns: (instance) user action, an interned act or :class:`utils.DiaAct.DiaAct`
         '''
-        sys_act = DiaAct.DiaAct(sys_act_string)
+        sys_act = dact.InternAct(sys_act)
         self.um.receive(sys_act)
         user_act = self.um.respond()
         return user_act
@@ -255,8 +255,8 @@ class SimulatedUsersManager(object):
             
             # DEBUG prints to inspect goals we have generated:
             if self.sim_level != 'sys2text':
-                logger.debug(str(self.simUserManagers[dstring].um.goal))
-                logger.debug(str(self.simUserManagers[dstring].um.goal.copied_constraints))
+                logger.debug('%s', self.simUserManagers[dstring].um.goal)
+                logger.debug('%s', self.simUserManagers[dstring].um.goal.copied_constraints)
                 #logger.debug(str(self.simUserManagers[dstring].um.hdcSim.agenda.agenda_items))
                 logger.debug("DOMAIN-----"+dstring)
             #raw_input('goal and agenda for domain '+dstring)
@@ -289,7 +289,7 @@ class SimulatedUsersManager(object):
         # TODO - this is just a start. lots needs thinking about here.
         # -- needs to return the current simulation domain explictly for now
         # return dstring too -  use this information for error simulation. 
-        logger.debug('simulated users uncompleted domains:'+str(self.uncompleted_domains))
+        logger.debug('simulated users uncompleted domains:%s', self.uncompleted_domains)
         for dstring in self.using_domains:
             if dstring in self.uncompleted_domains:
                 user_act = self.simUserManagers[dstring].act_on(sys_act)
@@ -326,24 +326,16 @@ class SimulatedUsersManager(object):
         if type(user_act) != list:
             hyps = self.simUserManagers[user_actsDomain].error_simulator.confuse_act(user_act) 
         else:
-            hyps = []
-            for act in user_act:
-                if not isinstance(act, DiaAct.DiaActWithProb):
-                    act = DiaAct.DiaActWithProb(act)
-                hyps.append(act)
+            hyps = [(act.interned(), 1.0) for act in user_act]
         null_prob = 0.0
-        for h in hyps:
-            act = h.to_string()
-            prob = h.P_Au_O
-            if act == 'null()':
+        for act, prob in hyps:
+            if act.act == 'null' and not act.items:
                 null_prob += prob
             if self.traceDialog>1:
                 print '   Semi >', act, '[%.6f]' % prob
-            logger.info('| Semi > %s [%.6f]' % (act,prob))
+            logger.info('| Semi > %s [%.6f]', act, prob)
         if self.forceNullPositive and null_prob < 0.001:
-            nullAct = DiaAct.DiaActWithProb('null()')
-            nullAct.P_Au_O = 0.001
-            hyps.append(nullAct)
+            hyps.append((dact.InternAct('null()'), 0.001))
             if self.traceDialog>1:
                 print '| Semi > null() [0.001]'
             logger.info('   Semi > null() [0.001]')
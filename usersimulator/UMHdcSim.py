@@ -253,6 +253,7 @@ class UMHdcSim(UMSimulator.UMSimulator):
     def receive(self, sys_act, goal):
         """
         """
+        sys_act = DiaAct.DiaAct(sys_act)
         self.last_sys_act = sys_act
 
         if goal.is_completed() and self.agenda.size() == 0 and sys_act.act != 'reqmore'\
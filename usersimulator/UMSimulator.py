@@ -70,8 +70,8 @@ class UMSimulator(object):
         
         It needs to be implemented in a sub-class.
         
-        :param sys_act: the max patience for this simulation run.
-        :type sys_act: :class:`DiaAct.DiaAct`
+        :param sys_act: the system act, interned and not to be modified.
+        :type sys_act: :class:`utils.dact.Act`
         :param goal: the user goal
         :type goal: :class:`UserModel.UMGoal`
         '''
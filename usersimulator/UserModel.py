@@ -577,7 +577,7 @@ class GoalGenerator(object):
 
         # Set initial goal status vars
         goal = UMGoal(um_patience, domainString=self.dstring)
-        logger.debug(str(goal))
+        logger.debug('%s', goal)
         num_attempts_to_resample = 2000
         while True:
             num_attempts_to_resample -= 1
@@ -721,7 +721,7 @@ class UM(object):
             self.max_patience = Settings.random.randint(self.sample_patience[0], self.sample_patience[1])
         
         self.goal = self.generator.init_goal(otherDomainsConstraints, self.max_patience)
-        logger.debug(str(self.goal))
+        logger.debug('%s', self.goal)
 
         self.lastUserAct = None
         self.lastSysAct = None
@@ -732,6 +732,7 @@ class UM(object):
         This method is called to transmit the machine dialogue act to the user.
         It updates the goal and the agenda.
         :param sys_act: System action.
+        :type sys_act: :class:`utils.dact.Act`
         :return:
         '''
         # Update previous goal.
@@ -744,7 +745,7 @@ class UM(object):
             self.goal.patience = self.max_patience
 
         if self.goal.patience < 1:
-            logger.debug(str(self.goal))
+            logger.debug('%s', self.goal)
             logger.debug('All patience gone. Clearing agenda.')
             self.hdcSim.agenda.clear()
             # Pushing bye act onto agenda.
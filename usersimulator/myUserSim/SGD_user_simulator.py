@@ -1,4 +1,4 @@
-from .dialogUtils import DialogStatus, Action, DialogGoal
+from .dialogUtils import DialogStatus, DialogGoal, user_action, system_action_params
 import random
 import numpy as np
 import copy
@@ -96,8 +96,8 @@ class SGDUserSimulator(UMSimulator.UMSimulator):
         
         It needs to be implemented in a sub-class.
         
-        :param sys_act: the max patience for this simulation run.
-        :type sys_act: :class:`DiaAct.DiaAct`
+        :param sys_act: the system act, read as it is without converting it.
+        :type sys_act: :class:`utils.dact.Act`
         :param goal: the user goal
         :type goal: :class:`UserModel.UMGoal`
         '''
@@ -110,26 +110,19 @@ class SGDUserSimulator(UMSimulator.UMSimulator):
 
         :param goal: of :class:`UserModel.UMGoal`
         :type goal: :class:`UserModel.UMGoal`
-        :returns: (instance) of :class:`DiaAct.DiaActWithProb`
+        :returns: (instance) interned :class:`utils.dact.Act`, or a list of them when replaying a dialog file
         '''
         #print "GOAL: ",goal
         act = self.agenda.pop()
 
-        act = Action.from_pydial_act(act)
-
         if self.mode == "simulator":
-            user_act = self.next(act)
-            user_act = user_act.to_pydial_act()
-            return user_act
+            return self.next(act)
         else:
             user_act = self.get_next_act()
-            pydial_acts = []
             if len(user_act) == 0:
-                user_act.append(Action("GOODBYE"))
-            for act in user_act:
-                pydial_acts.append(act.to_pydial_act())
+                user_act.append(user_action("GOODBYE"))
             
-            return pydial_acts
+            return user_act
         
 
     def get_next_act(self):
@@ -151,7 +144,7 @@ class SGDUserSimulator(UMSimulator.UMSimulator):
                             slot_val = ""
                         
                         params[slot_name] = slot_val
-                actions.append(Action(action, params))
+                actions.append(user_action(action, params))
         
         self.turn += 1
         #print actions
@@ -159,19 +152,20 @@ class SGDUserSimulator(UMSimulator.UMSimulator):
 
     def next(self, agent_action):
         user_act = None
+        params = system_action_params(agent_action)
 
-        if self.last_agent_action != None and agent_action != None:
-            if agent_action.action == self.last_agent_action.action and agent_action.params == self.last_agent_action.params:
+        if self.last_agent_action != None:
+            if agent_action.act == self.last_agent_action.act and params == system_action_params(self.last_agent_action):
                 self.goal.patience -= 1
             else:
                 self.goal.patience = self.max_patience
         
         if self.goal.patience < 1:
-            return Action(action='GOODBYE')
+            return user_action('GOODBYE')
         
         self.last_agent_action = agent_action
         # First turn -> Inform Intent
-        if agent_action.action == 'HELLO' and self.dialog_status == DialogStatus.NOT_STARTED:
+        if agent_action.act == 'hello' and self.dialog_status == DialogStatus.NOT_STARTED:
             self.dialog_status = DialogStatus.NO_OUTCOME_YET
             user_act = self.reply_to_ask_goal()
             self.last_user_action = user_act
@@ -181,38 +175,38 @@ class SGDUserSimulator(UMSimulator.UMSimulator):
         # if not self.in_offer:
         #     self.goal.update_request_slots(list(filter(lambda x: x.action!='OFFER' and x.action!='CONFIRM', agent_action))) 
 
-        if agent_action.action == 'INFORM':
-            self.save_inform(agent_action)          # userAct = None
+        if agent_action.act == 'inform':
+            self.save_inform(params)          # userAct = None
 
         self.update_status(agent_action)    
 
-        if self.dialog_status == DialogStatus.FINISHED or agent_action.action == 'GOODBYE': 
+        if self.dialog_status == DialogStatus.FINISHED or agent_action.act == 'bye': 
             self.dialog_status = DialogStatus.FINISHED
-            user_act = Action(action='GOODBYE')
+            user_act = user_action('GOODBYE')
             self.last_user_action = user_act
             return user_act
         
         self.executed_agent_actions.append(agent_action)
     
-        if agent_action.action == 'REQ_MORE':
+        if agent_action.act in ['reqmore', 'reqalts']:
             user_act = self.request_random_slot()   # possible userAct = None
-        elif agent_action.action == 'CONFIRM':
-            user_act = self.confirm(agent_action)
-        elif agent_action.action == 'REQUEST':
-            user_act = self.reply_to_ask_slot(agent_action)
-        elif agent_action.action == 'REPEAT':
+        elif agent_action.act == 'confirm':
+            user_act = self.confirm(params)
+        elif agent_action.act == 'request':
+            user_act = self.reply_to_ask_slot(params)
+        elif agent_action.act == 'repeat':
             user_act = self.last_user_action
-        elif agent_action.action == 'OFFER':
-            self.save_offer(agent_action)           # userAct = None
-        elif agent_action.action == 'OFFER_INTENT':
-            user_act = self.reply_to_offer_intent(agent_action) 
-        elif agent_action.action in ['NOTIFY_SUCCESS', 'NOTIFY_FAILURE']: # if we have these 2 actions but we have unrequested slots, request a slot
+        elif agent_action.act == 'offer':
+            self.save_offer(params)           # userAct = None
+        elif agent_action.act == 'offer_intent':
+            user_act = self.reply_to_offer_intent(params) 
+        elif agent_action.act == 'notify': # if we have these 2 actions but we have unrequested slots, request a slot
             request_action = self.request_random_slot()
             if request_action != None and self.current_intent != None and self.yaml_goal.request_slots[self.current_intent] != None:
                 return request_action
 
         if user_act != None:
-            if user_act.action != 'NEGATE':
+            if user_act.act != 'NEGATE':
                 self.last_user_action = user_act
                 return user_act
             else:   # if NEGATE, sometimes request a new slot
@@ -225,7 +219,7 @@ class SGDUserSimulator(UMSimulator.UMSimulator):
                     else:
                         return user_act # NEGATE
         else:    # REQ_MORE, NOTIFY_SUCCESS, NOTIFY_FAILURE, OFFER, INFORM agent actions
-            if agent_action.action in ['REQ_MORE', 'NOTIFY_SUCCESS', 'NOTIFY_FAILURE']:
+            if agent_action.act in ['reqmore', 'reqalts', 'notify']:
                 return self.reply_to_ask_goal()            
             if self.in_offer:   
                 select = True   # check if all the slots in offer_slots have a value, if so select the offer
@@ -246,12 +240,12 @@ class SGDUserSimulator(UMSimulator.UMSimulator):
                     self.in_offer = False
                     del self.offer_slots
                     self.offer_slots = {}
-                    user_act = Action(action='SELECT')
+                    user_act = user_action('SELECT')
                     self.last_user_action = user_act
                     return user_act
                 else: 
                     wrong_offer = True # check if the agent made a wrong offer
-                    for slot in agent_action.params:
+                    for slot in params:
                         if slot in self.offer_slots:
                             wrong_offer = False
 
@@ -259,13 +253,13 @@ class SGDUserSimulator(UMSimulator.UMSimulator):
                         self.in_offer = False
                         del self.offer_slots
                         self.offer_slots = {}
-                        user_act = Action(action="INFORM_INTENT", params={'intent':self.goal.constraints['intent']})
+                        user_act = user_action("INFORM_INTENT", params={'intent':self.goal.constraints['intent']})
                     else:   # if not select chose if reply with a request or request_alts
                         choice = np.random.choice([0,1], size=1, p=[0.3, 0.7])[0] # 1 request 0 request_alts
                         if choice: # request
                             user_act = self.request_random_slot()
                         else: # request_alts
-                            user_act = Action(action='REQUEST_ALTS')
+                            user_act = user_action('REQUEST_ALTS')
             else:   # not in offer -> agent informed slot
                 user_act = self.request_random_slot()
         
@@ -276,7 +270,7 @@ class SGDUserSimulator(UMSimulator.UMSimulator):
         return user_act
 
     def inform_type(self):
-        return Action(action="INFORM", params={"type":self.dstring})
+        return user_action("INFORM", params={"type":self.dstring})
 
     def change_goal(self):
         # save already executed goals
@@ -303,7 +297,7 @@ class SGDUserSimulator(UMSimulator.UMSimulator):
     def reply_to_ask_goal(self):
         if self.current_intent != None:
             if self.current_intent not in self.finished_intents:
-                return Action(action='INFORM_INTENT', params={'intent':self.current_intent})  
+                return user_action('INFORM_INTENT', params={'intent':self.current_intent})  
 
         intents = self.yaml_goal.goals
         for intent in intents:
@@ -311,18 +305,18 @@ class SGDUserSimulator(UMSimulator.UMSimulator):
                 self.informed_intents.append(intent)
                 self.current_intent = intent
                 
-                return Action(action='INFORM_INTENT', params={'intent':intent})   
+                return user_action('INFORM_INTENT', params={'intent':intent})   
         
         # No more goals -> bye 
         self.dialog_status = DialogStatus.FINISHED
-        return Action(action='GOODBYE')
+        return user_action('GOODBYE')
 
     # reply to 'REQUEST' agent action
-    def reply_to_ask_slot(self, agent_action):
+    def reply_to_ask_slot(self, agent_params):
 
         params = {}
 
-        requested_slot = agent_action.params['slot']
+        requested_slot = agent_params['slot']
         requested_slot_value = ''
 
         # If the user is cooperative it will reply with the requested slot 
@@ -331,7 +325,7 @@ class SGDUserSimulator(UMSimulator.UMSimulator):
         if reply_requested_slot:    # reply with requested slot value
             if requested_slot == 'intent':
                 if self.current_intent != None:
-                    return Action(action='INFORM_INTENT', params={'intent':self.current_intent})   
+                    return user_action('INFORM_INTENT', params={'intent':self.current_intent})   
                 else:
                     return self.reply_to_ask_goal()
             elif requested_slot in self.informed_slots:
@@ -354,12 +348,12 @@ class SGDUserSimulator(UMSimulator.UMSimulator):
         params = self.get_additional_random_slot(params, requested_slot, True) 
 
         if requested_slot_value != None and requested_slot_value != '': 
-            user_action = Action(action='INFORM', params=params)
+            user_act = user_action('INFORM', params=params)
         else:
-            user_action = Action(action='NEGATE')
+            user_act = user_action('NEGATE')
             self.informed_slots[requested_slot] = 'dontcare'
         
-        return user_action
+        return user_act
 
     # get additional slots, different from requested_slot
     # if prob is True choose with a given probability if getting or not a new slot
@@ -397,17 +391,17 @@ class SGDUserSimulator(UMSimulator.UMSimulator):
 
         return params
 
-    def save_offer(self, agent_action): # Fix if adding offer agent actions
+    def save_offer(self, agent_params): # Fix if adding offer agent actions
         if not self.in_offer:
             self.in_offer = True
             self.offer_slots = copy.deepcopy(self.goal.requests)
             
-        for slot_key, slot_val in agent_action.params.items():
+        for slot_key, slot_val in agent_params.items():
             if slot_key in self.offer_slots:
                     self.offer_slots[slot_key] = slot_val
 
-    def save_inform(self, agent_action):
-        for slot_key, slot_val in agent_action.params.items():
+    def save_inform(self, agent_params):
+        for slot_key, slot_val in agent_params.items():
             if slot_key in self.goal.requests:
                 self.goal.requests[slot_key] = slot_val
             
@@ -415,18 +409,18 @@ class SGDUserSimulator(UMSimulator.UMSimulator):
                 if slot_key in self.yaml_goal.request_slots[intent]:
                     self.yaml_goal.request_slots[intent][slot_key] = slot_val
 
-    def reply_to_offer_intent(self, agent_action):
-        intent = agent_action.params['intent']
+    def reply_to_offer_intent(self, agent_params):
+        intent = agent_params['intent']
         if self.goal.constraints['intent']:
             goal_intent = self.goal.constraints['intent']
             if type(goal_intent.val) == list:
                 if intent in goal_intent.val:            
-                    return Action(action='AFFIRM_INTENT')
+                    return user_action('AFFIRM_INTENT')
             else:
                 if intent == goal_intent.val:
-                    return Action(action='AFFIRM_INTENT')
+                    return user_action('AFFIRM_INTENT')
         
-        return Action(action='NEGATE_INTENT')
+        return user_action('NEGATE_INTENT')
 
     def request_random_slot(self):
         request_slots = []
@@ -446,58 +440,58 @@ class SGDUserSimulator(UMSimulator.UMSimulator):
         
         if request_slots:
             slot = random.choice(request_slots)
-            return Action(action='REQUEST', params={slot:""})
+            return user_action('REQUEST', params={slot:""})
         else:
             return None
 
-    def confirm(self, action):
+    def confirm(self, agent_params):
         
-        param = list(action.params.keys())[0]
+        param = list(agent_params.keys())[0]
         if param == 'intent':
-            if self.current_intent != None and action.params[param] == self.current_intent:
-                return Action(action='AFFIRM')
+            if self.current_intent != None and agent_params[param] == self.current_intent:
+                return user_action('AFFIRM')
             else:
                 if self.current_intent == None:
                     return self.reply_to_ask_goal()
                 else:
-                    return Action(action='INFORM_INTENT', params={'intent':self.current_intent})
+                    return user_action('INFORM_INTENT', params={'intent':self.current_intent})
         elif param in self.informed_slots:    # param is informed
-            if action.params[param] == self.informed_slots[param]:  
-                return Action(action='AFFIRM')    # same as informed value
+            if agent_params[param] == self.informed_slots[param]:  
+                return user_action('AFFIRM')    # same as informed value
             else:
                 p = {param: self.informed_slots[param]}
-                return Action(action='INFORM', params=p)    # different from informed value
+                return user_action('INFORM', params=p)    # different from informed value
         else:                               # param not informed
             if param in self.goal.requests:
                 val = self.goal.requests[param]
                 if val != None:   # slot already requested -> check value        
-                    if action.params[param] == val:             
-                        return Action(action='AFFIRM')
+                    if agent_params[param] == val:             
+                        return user_action('AFFIRM')
                     else:
                         p = {param: val}
-                        return Action(action='INFORM', params=p)
+                        return user_action('INFORM', params=p)
             else:   # param not in request slots
                 slot_val = self.goal.get_correct_const_value(param)   # check in inform slots
                 if slot_val != None:
                     if type(slot_val) != list:
-                        if action.params[param] == slot_val:
-                            return Action(action='AFFIRM')
+                        if agent_params[param] == slot_val:
+                            return user_action('AFFIRM')
                         else:
                             p = {param: slot_val}
-                            return Action(action='INFORM', params=p)
+                            return user_action('INFORM', params=p)
                     else:
-                        if action.params[param] in slot_val:
-                            return Action(action='AFFIRM')
+                        if agent_params[param] in slot_val:
+                            return user_action('AFFIRM')
                         else:
                             p = {param: random.choice(slot_val)}
-                            return Action(action='INFORM', params=p)
+                            return user_action('INFORM', params=p)
 
         # param not in request slots, not in informed/inform slots -> negate or return None      
         accept = np.random.choice([0,1], size=1, p=[1-self.user_cooperation, self.user_cooperation])[0]
         if accept:
             return None
         else:
-            return Action(action='NEGATE')
+            return user_action('NEGATE')
 
     # Update the status of the dialog -> if all the request slots are filled the dialog is finished
     def update_status(self, agent_action):
@@ -518,7 +512,7 @@ class SGDUserSimulator(UMSimulator.UMSimulator):
                     self.finished_intents.append(self.current_intent)
                     self.current_intent = None
             else:   # the intent doesn't have request slots
-                if agent_action.action in ["NOTIFY_SUCCESS","NOTIFY_FAILURE"]:
+                if agent_action.act == 'notify':
                     self.finished_intents.append(self.current_intent)
                     self.current_intent = None
 
@@ -1,5 +1,5 @@
 from enum import Enum
-from utils import DiaAct
+from utils import dact
 import random
 
 '''
@@ -11,77 +11,43 @@ class DialogStatus(Enum):
     FINISHED = 2  
 
 '''
-Class used to represent an action
+Functions used to create the acts of the simulated user and to read the acts of the system. The acts are interned
+dialogue acts (utils.dact.Act) that are passed as they are to the error model and the belief tracker.
 '''
-class Action:
+def user_action(action, params={}):
+    '''
+    Returns the user act of the action. Only the first slot of INFORM and REQUEST params is used. Slot names and values
+    are stripped as when the act was parsed from its text.
+    '''
+    if action == "INFORM":
+        slot, val = params.items()[0]
+        return dact.MakeAct(action, [(slot.strip(), '=', '{}'.format(val).strip("' "))])
+    elif action == "REQUEST":
+        slot = params.keys()[0]
+        return dact.MakeAct(action, [(slot.strip(), None, None)])
+    elif action == "INFORM_INTENT":
+        val = params['intent']
+        return dact.MakeAct(action, [('intent', '=', '{}'.format(val).strip("' "))])
+    else:
+        return dact.MakeAct(action)
 
-    def __init__(self, action=None, params={}):
-        self.action = action
-        self.params = params
-
-    def to_pydial_act(self):
-        
-        if self.action == "GOODBYE":
-            return DiaAct.DiaAct("GOODBYE()")
-        elif self.action == "AFFIRM":
-            return DiaAct.DiaAct("AFFIRM()")
-        elif self.action == "NEGATE":
-            return DiaAct.DiaAct("NEGATE()")
-        elif self.action == "INFORM":
-            slot, val = self.params.items()[0]
-            return DiaAct.DiaAct("INFORM({}={})".format(slot, val))
-        elif self.action == "REQUEST":
-            slot = self.params.keys()[0]
-            return DiaAct.DiaAct("REQUEST({})".format(slot))
-        elif self.action == "INFORM_INTENT":
-            val = self.params['intent']
-            return DiaAct.DiaAct("INFORM_INTENT(intent={})".format(val))
-        elif self.action == "SELECT":
-            return DiaAct.DiaAct("SELECT()")
-        else:
-            return DiaAct.DiaAct("{}()".format(self.action))
-    
-    @classmethod
-    def from_pydial_act(cls, action):
-        if action.act == 'hello':
-            return cls(action="HELLO")
-        elif action.act == 'bye':
-            return cls(action="GOODBYE")        
-        elif action.act == 'request':
-            slot = action.items[0].slot
-            return cls(action="REQUEST", params={"slot":slot})
-        elif action.act == 'requalts' or action.act == 'reqmore':
-            return cls(action="REQ_MORE")
-        elif action.act == 'inform':
-            params = {}
-            for slot in action.items:
-                params.update({slot.slot: slot.val})
-            return cls(action="INFORM", params=params)
-        elif action.act == 'confirm':
-            slot = action.items[0]
-            return cls(action="CONFIRM", params={slot.slot: slot.val})
-        elif action.act == 'affirm':
-            return cls(action='AFFFIRM')
-        elif action.act == 'negate':
-            return cls(action='NEGATE')
-        elif action.act == 'repeat':
-            return cls(action='REPEAT')
-        elif action.act == 'notify':
-            return cls(action='NOTIFY_SUCCESS')
-        elif action.act == 'offer':
-            params = {}
-            for slot in action.items:
-                params.update({slot.slot: slot.val})
-            return cls(action="OFFER", params=params)
-            
-        return None
-        
-
-    def set_utterance(self, utterance):
-        self.utterance = utterance
-    
-    def __str__(self):
-        return "{}({})".format(self.action, self.params)
+def system_action_params(action):
+    '''
+    Returns the params of a system act (utils.dact.Act or utils.DiaAct.DiaAct) that the simulated user uses: the requested
+    slot as {'slot': slot}, the first slot and value of a confirm, and the slots and values of an inform, offer or
+    offer_intent.
+    '''
+    if action.act == 'request':
+        return {'slot': action.items[0].slot}
+    elif action.act == 'confirm':
+        item = action.items[0]
+        return {item.slot: item.val}
+    elif action.act in ['inform', 'offer', 'offer_intent']:
+        params = {}
+        for item in action.items:
+            params[item.slot] = item.val
+        return params
+    return {}
 
 class DialogGoal:
 
@@ -129,7 +95,7 @@ class DialogGoal:
 
     def update_request_slots(self, executed_actions):
         for action in executed_actions:
-            for slot, value in action.params.items():
+            for slot, value in system_action_params(action).items():
                 for intent in self.request_slots.keys():
                     if self.request_slots[intent] != None:
                         if slot in self.request_slots[intent].keys():
@@ -33,6 +33,7 @@ Copyright CUED Dialogue Systems Group 2015 - 2017
     file_level=debug
     file=logFileName.txt
     usecolor = False
+    queue = False
 
 **Basic Usage**:
     >>> from utils import ContextLogger
@@ -45,6 +46,15 @@ Copyright CUED Dialogue Systems Group 2015 - 2017
 
     issuing an error message generates ``ExceptionRaisedByLogger``.
 
+    A message below the level of the logger or of every handler returns before the message is built, so pass the
+    arguments of a message rather than formatting it first, and test the level before computing anything costly:
+
+        >>> logger.dial('| User > %s', user_act)
+        >>> if logger.isEnabledFor(ContextLogger.DEBUG):
+        ...     logger.debug(pprint.pformat(belief))
+
+    With ``queue = True`` the console and file handlers write from a background thread (see :class:`QueueHandler`).
+
     Logger can if required be configured via a config section.
     Then pass config info to ``createLoggingHandlers``
     >>> ContextLogger.createLoggingHandlers(config)
@@ -56,8 +66,9 @@ Copyright CUED Dialogue Systems Group 2015 - 2017
 
 __author__ = "cued_dialogue_systems_group"
 
-import contextlib, logging, inspect, copy, sys, traceback, time
+import contextlib, logging, copy, sys, traceback, time
 import os.path
+import threading, Queue
 
 # ----------------------------------------------
 #   Configure the standard Python logging API
@@ -65,6 +76,13 @@ import os.path
 
 msg_format = '%(levelname)-7s:: %(asctime)s: %(name)4s %(message)s'
 
+DEBUG = logging.DEBUG
+INFO = logging.INFO
+DIAL = 25
+WARNING = logging.WARNING
+RESULTS = 35
+ERROR = logging.ERROR
+
 class NOcolors:
     '''
     ASCII escape chars just print junk when dumping logger output to file. Can use the config setting usecolor.
@@ -132,13 +150,95 @@ class ConsoleFormatter(logging.Formatter):
             print('except TypeError: in ContextLogger.ConsoleFormatter(). Known minor issue with message format of logger')
             # Note: this might be more serious - it may be stopping the individual module logging level specification...
 
+class QueueHandler(logging.Handler):
+    '''
+    Passes records on to the given handlers from a background thread. The message of a record is built when it is
+    queued, so later changes to the arguments do not show in the log. The queue is emptied when the handler is flushed
+    or closed, which the logging module does at exit. A process forked after the handler was made (e.g. the workers of
+    Simulate.ParallelSimulationSystem) has no background thread, so it passes its records on directly.
+
+    :param handlers: the handlers writing the records
+    :type handlers: list
+    '''
+    def __init__(self, handlers):
+        logging.Handler.__init__(self, min(h.level for h in handlers))
+        self.handlers = handlers
+        self.queue = Queue.Queue()
+        self._pid = os.getpid()
+        self._thread = threading.Thread(target=self._serve, name='ContextLoggerQueue')
+        self._thread.daemon = True
+        self._thread.start()
+
+    def emit(self, record):
+        if os.getpid() != self._pid:
+            self._handle(record)
+            return
+        try:
+            record.msg = record.getMessage()
+            record.args = None
+            if record.exc_info:
+                record.exc_text = logging._defaultFormatter.formatException(record.exc_info)
+                record.exc_info = None
+            self.queue.put(record)
+        except (KeyboardInterrupt, SystemExit):
+            raise
+        except:
+            self.handleError(record)
+
+    def _serve(self):
+        while True:
+            record = self.queue.get()
+            try:
+                if record is None:
+                    return
+                self._handle(record)
+            finally:
+                self.queue.task_done()
+
+    def _handle(self, record):
+        for handler in self.handlers:
+            if record.levelno >= handler.level:
+                handler.handle(record)
+
+    def flush(self):
+        if self._thread.is_alive() and os.getpid() == self._pid:
+            self.queue.join()
+        for handler in self.handlers:
+            handler.flush()
+
+    def close(self):
+        if self._thread.is_alive() and os.getpid() == self._pid:
+            self.queue.put(None)
+            self._thread.join()
+        logging.Handler.close(self)
+
+
 cl = {}             # current set of context loggers indexed by module name
 module_level = {}   # logging level for each logger in cl
+handler_level = logging.NOTSET  # lowest level passed by a handler of the top level logger
+
+def _updateHandlerLevel():
+    global handler_level
+    handlers = logging.getLogger('').handlers
+    handler_level = min(h.level for h in handlers) if handlers else logging.NOTSET
 
 def resetLoggingHandlers():
 
     top_logger = logging.getLogger('')
+    for handler in top_logger.handlers:
+        if isinstance(handler, QueueHandler):
+            handler.close()
     top_logger.handlers = []
+    _updateHandlerLevel()
+
+
+def flushLoggingHandlers():
+    '''
+    Writes the records still queued by a :class:`QueueHandler`. Called before forking worker processes, so that no
+    handler is in use by the logging thread when the process is copied.
+    '''
+    for handler in logging.getLogger('').handlers:
+        handler.flush()
 
 
 def createLoggingHandlers(config=None, screen_level = "INFO", \
@@ -167,6 +267,7 @@ def createLoggingHandlers(config=None, screen_level = "INFO", \
     # levels for logging
     
     file_append = False
+    use_queue = False
     
     if config:
         if config.has_option("logging", "file") :
@@ -179,8 +280,11 @@ def createLoggingHandlers(config=None, screen_level = "INFO", \
             screen_level = config.get("logging", "screen_level").upper()
         if config.has_option("logging", "usecolor"):
             use_color = config.get("logging", "usecolor")
+        if config.has_option("logging", "queue"):
+            use_queue = config.getboolean("logging", "queue")
         for option in config.options('logging'):
-            if option not in ['usecolor','file', 'file_level', 'screen_level'] and option not in config.defaults():
+            if option not in ['usecolor','file', 'file_level', 'file_append', 'screen_level', 'queue'] \
+                    and option not in config.defaults():
                 logger_name = option.lower()
                 module_level[logger_name] = config.get('logging', option)
                 if logger_name in cl:
@@ -191,18 +295,17 @@ def createLoggingHandlers(config=None, screen_level = "INFO", \
     There was a problem with dumping logger output to file - print() statements and logger comments get separated.
     StreamHandler now sends to sys.stdout 
     """
-    logging.addLevelName(25, "DIAL")
-    logging.addLevelName(35, "RESULTS")
+    logging.addLevelName(DIAL, "DIAL")
+    logging.addLevelName(RESULTS, "RESULTS")
     ch = logging.StreamHandler(sys.stdout)  # NB: originally took no arguments
     if screen_level == "DIAL":
-        ch.setLevel(25)
+        ch.setLevel(DIAL)
     elif screen_level == "RESULTS":
-        ch.setLevel(35)
+        ch.setLevel(RESULTS)
     else:
         ch.setLevel(getattr(logging, screen_level.upper()))
     ch.setFormatter(ConsoleFormatter(colors=use_color))
-    # add the handlers to logger
-    top_logger.addHandler(ch)
+    handlers = [ch]
 
     # configure file output:
     if log_file :
@@ -221,14 +324,22 @@ def createLoggingHandlers(config=None, screen_level = "INFO", \
             file_mode = 'a'
         fh = logging.FileHandler(log_file, mode=file_mode)
         if file_level.upper() == 'DIAL':
-            lvl = 25
+            lvl = DIAL
         elif file_level.upper() == 'RESULTS':
-            lvl = 35
+            lvl = RESULTS
         else:
             lvl = getattr(logging, file_level.upper())
         fh.setLevel(lvl)
         fh.setFormatter(formatter)
-        top_logger.addHandler(fh)
+        handlers.append(fh)
+
+    # add the handlers to logger
+    if use_queue:
+        top_logger.addHandler(QueueHandler(handlers))
+    else:
+        for handler in handlers:
+            top_logger.addHandler(handler)
+    _updateHandlerLevel()
     
 # ----------------------------------------------
 #   Interface to the standard Python logging API
@@ -258,6 +369,16 @@ class ContextLogger:
         """
         self.logger.setLevel(getattr(logging, level.upper()))
 
+    def isEnabledFor(self, level):
+        """
+        Whether a message of the given level would be written by any handler.
+
+        :param level: logging level, eg ContextLogger.DEBUG
+        :type level: int
+        :returns: bool
+        """
+        return level >= handler_level and self.logger.isEnabledFor(level)
+
     def _exceptHook(self, etype, value, tb) :
         if etype != ExceptionRaisedByLogger :
             msg = self._convertMsg("Uncaught exception: "+str(etype) + "( "+str(value)+" )\n")
@@ -304,14 +425,18 @@ class ContextLogger:
         self.stack += args
         yield self.stack
         t1 = time.time()
-        self.info("Timer %.4fs"%(t1-t0))
+        self.info("Timer %.4fs", t1-t0)
         self.stack = self.stack[:n]
     
     def _callLocString(self, ):
-        inspected = inspect.getouterframes(inspect.currentframe())
-        frame,filename,line_number,function_name,lines,index=inspected[min(3,len(inspected)-1)]
-        filename = filename.split("/")[-1]
-        return filename + ":" + function_name + ">" + str(line_number)
+        # the caller of debug, info, ... is three frames up
+        frame = sys._getframe()
+        for _ in range(3):
+            if frame.f_back is None:
+                break
+            frame = frame.f_back
+        filename = frame.f_code.co_filename.split("/")[-1]
+        return filename + ":" + frame.f_code.co_name + ">" + str(frame.f_lineno)
     
     def _stackString(self) :
         if len(self.stack) == 0:
@@ -334,8 +459,9 @@ class ContextLogger:
         :param args: args to formatted message string if any
         :returns: None
         """
-        msg = self._convertMsg(msg)
-        self.logger.debug(msg,*args,**kwargs)
+        if self.isEnabledFor(DEBUG):
+            msg = self._convertMsg(msg)
+            self.logger.debug(msg,*args,**kwargs)
     
     def info(self,msg,*args,**kwargs):
         """ Log an INFO message.
@@ -345,8 +471,9 @@ class ContextLogger:
         :param args: args to formatted message string if any
         :returns: None
         """
-        msg = self._convertMsg(msg)
-        self.logger.info(msg,*args,**kwargs)
+        if self.isEnabledFor(INFO):
+            msg = self._convertMsg(msg)
+            self.logger.info(msg,*args,**kwargs)
     
     def warning(self,msg,*args,**kwargs):
         """
@@ -357,8 +484,9 @@ class ContextLogger:
         :param args: args to formatted message string if any
         :returns: None
         """
-        msg = self._convertMsg(msg)
-        self.logger.warning(msg,*args,**kwargs)
+        if self.isEnabledFor(WARNING):
+            msg = self._convertMsg(msg)
+            self.logger.warning(msg,*args,**kwargs)
     
     def error(self,msg,*args,**kwargs):
         """
@@ -372,18 +500,19 @@ class ContextLogger:
         .. note::
             Issuing an error message also raises exception ``ExceptionRaisedByLogger``
         """
-        msg0 = msg
-        msg = self._convertMsg(msg)
-        self.logger.error(msg,*args,**kwargs)
-        raise ExceptionRaisedByLogger(msg0)
+        if self.isEnabledFor(ERROR):
+            self.logger.error(self._convertMsg(msg),*args,**kwargs)
+        raise ExceptionRaisedByLogger(msg)
 
     def dial(self, msg, *args, **kwargs):
-        msg = self._convertMsg(msg)
-        self.logger.log(25,msg,*args,**kwargs)
+        if self.isEnabledFor(DIAL):
+            msg = self._convertMsg(msg)
+            self.logger.log(DIAL,msg,*args,**kwargs)
 
     def results(self, msg, *args, **kwargs):
-        msg = self._convertMsg(msg)
-        self.logger.log(35,msg,*args,**kwargs)
+        if self.isEnabledFor(RESULTS):
+            msg = self._convertMsg(msg)
+            self.logger.log(RESULTS,msg,*args,**kwargs)
 
 def getLogger(name):
     """
@@ -95,7 +95,7 @@ class DiaAct(object):
 
     self.dact = ``{'act': acttype,'slots': [(slot1, op1, value1), ..])}``
 
-    :param act: dialogue act in string
+    :param act: dialogue act in string or interned :class:`dact.Act`
 
     .. todo:: SummaryAction is not implemented.
 
@@ -109,6 +109,13 @@ class DiaAct(object):
         
         self.prompt = None
 
+    def interned(self):
+        '''
+        :param None:
+        :returns: (:class:`dact.Act`) the interned act of this act as it is now
+        '''
+        return dact.MakeAct(self.act, [(item.slot, item.op, item.val) for item in self.items])
+
 
     def append(self, slot, value, negate=False):
         '''
@@ -291,7 +298,7 @@ class DiaActWithProb(DiaAct):
     self.dact = ``{'act': acttype,'slots': set([(slot1, value1), ..])}``
 
     :param act: dialogue act
-    :type act: str
+    :type act: str, :class:`dact.Act` or :class:`DiaAct`
 
     .. todo:: Parser is not complete. Attached probability P_Au_O cannot be parsed.
            SummaryAction is not implemented.
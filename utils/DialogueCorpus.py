@@ -0,0 +1,198 @@
+###############################################################################
+# PyDial: Multi-domain Statistical Spoken Dialogue System Software
+###############################################################################
+#
+# Copyright 2015 - 2019
+# Cambridge University Engineering Department Dialogue Systems Group
+#
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+###############################################################################
+
+'''
+DialogueCorpus.py - lazy access to the markdown dialogue corpora
+=================================================================
+
+Copyright CUED Dialogue Systems Group 2015 - 2017
+
+The dialogue files in data/train and data/test hold one dialogue per section, starting with a "## <name>" line and followed
+by one "USER: <act>" or "AGENT: <act>" line per act. A dialogue is returned as a dict with the acts of every user turn
+and of every agent turn::
+
+    {"USER": {0: ['INFORM_INTENT(intent=FindRestaurants)'], 1: [...]}, "AGENT": {0: ['REQUEST(city)'], ...}}
+
+:class:`DialogueCorpus` reads a file once line by line and keeps only the name and the byte range of every dialogue. A
+dialogue is read from the file and parsed when it is asked for, so every call returns a new dict. The index of a file is
+kept for the run (see :func:`getCorpus`). :class:`DialogueSampler` draws the dialogues in random order without
+replacement.
+
+The names are listed in the order of a dict of the dialogues, which the corpora were read into before, so that seeded runs
+evaluate and draw the dialogues in the same order as then.
+
+.. seealso:: CUED Imports/Dependencies:
+
+    none
+
+************************
+
+'''
+
+__author__ = "cued_dialogue_systems_group"
+import os
+import random
+
+
+def parseDialogue(lines):
+    '''
+    Groups the acts of a dialogue into turns. A user turn ends when an agent act follows it and vice versa.
+
+    :param lines: the lines of the dialogue after its name line
+    :type lines: list
+    :returns: (dict) the user and agent turns of the dialogue
+    '''
+    user_turns = {}
+    u_turn = 0
+    in_user = False
+    agent_turns = {}
+    a_turn = 0
+    in_agent = False
+    for line in lines:
+        if line.startswith("USER: "):
+            if in_agent:
+                a_turn += 1
+            in_agent = False
+            in_user = True
+            user_turns.setdefault(u_turn, []).append(line.split("USER: ")[1])
+        elif line.startswith("AGENT: "):
+            if in_user:
+                u_turn += 1
+            in_agent = True
+            in_user = False
+            agent_turns.setdefault(a_turn, []).append(line.split("AGENT: ")[1])
+    return {"USER": user_turns, "AGENT": agent_turns}
+
+
+class DialogueCorpus(object):
+    '''
+    The dialogues of a markdown corpus file, indexed by name and loaded on demand.
+
+    :param path: the corpus file
+    :type path: str
+    '''
+    def __init__(self, path):
+        self.path = path
+        self.names = []         # dialogue names in file order
+        self._index = {}        # name -> position in self.names
+        self._ranges = []       # (start, end) byte offsets of the acts of each dialogue
+        self._build()
+        self._keys = list(dict.fromkeys(self.names))     # names in dict order
+
+    def _build(self):
+        offset = 0
+        start = None
+        current = None
+        with open(self.path, 'rb') as f:
+            for line in f:
+                if line.startswith('##'):
+                    if current is not None:
+                        self._ranges[current] = (start, offset)
+                    name = line[2:].strip()
+                    if name in self._index:
+                        current = self._index[name]     # a later dialogue of the same name replaces the earlier one
+                    else:
+                        current = len(self.names)
+                        self._index[name] = current
+                        self.names.append(name)
+                        self._ranges.append(None)
+                    start = offset + len(line)
+                offset += len(line)
+        if current is not None:
+            self._ranges[current] = (start, offset)
+
+    def __len__(self):
+        return len(self.names)
+
+    def __iter__(self):
+        return iter(self._keys)
+
+    def __contains__(self, name):
+        return name in self._index
+
+    def __getitem__(self, name):
+        return self.dialogue(self._index[name])
+
+    def keys(self):
+        return list(self._keys)
+
+    def dialogue(self, i):
+        '''
+        Reads and parses the i-th dialogue of the file.
+
+        :param i: position of the dialogue in self.names
+        :type i: int
+        :returns: (dict) the user and agent turns of the dialogue
+        '''
+        start, end = self._ranges[i]
+        with open(self.path, 'rb') as f:
+            f.seek(start)
+            text = f.read(end - start)
+        return parseDialogue(text.split("\n"))
+
+
+_corpora = {}
+
+
+def getCorpus(path):
+    '''
+    Returns the corpus of the file, reusing the index built earlier in the run unless the file has changed since.
+
+    :param path: the corpus file
+    :type path: str
+    :returns: (:class:`DialogueCorpus`)
+    '''
+    stat = os.stat(path)
+    key = os.path.abspath(path)
+    version = (stat.st_size, stat.st_mtime)
+    if key not in _corpora or _corpora[key][0] != version:
+        _corpora[key] = (version, DialogueCorpus(path))
+    return _corpora[key][1]
+
+
+class DialogueSampler(object):
+    '''
+    Draws the dialogues of a corpus in random order, each once, and starts again when all have been drawn. Uses the random
+    module, with the same draws as the rejection loop over the names of the dict of dialogues that it replaces.
+
+    :param corpus: the dialogues
+    :type corpus: :class:`DialogueCorpus`
+    '''
+    def __init__(self, corpus):
+        self.corpus = corpus
+        self._keys = corpus.keys()
+        self._executed = set()
+
+    def sample(self):
+        '''
+        :returns: (tuple) name of the drawn dialogue and the dialogue
+        '''
+        name = random.choice(self._keys)
+        if len(self._executed) < len(self._keys):
+            while name in self._executed:
+                name = random.choice(self._keys)
+            self._executed.add(name)
+        else:
+            self._executed = set()
+        return name, self.corpus[name]
+
+#END OF FILE
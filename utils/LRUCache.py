@@ -0,0 +1,73 @@
+###############################################################################
+# PyDial: Multi-domain Statistical Spoken Dialogue System Software
+###############################################################################
+#
+# Copyright 2015 - 2019
+# Cambridge University Engineering Department Dialogue Systems Group
+#
+# 
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+###############################################################################
+
+'''
+LRUCache.py - bounded cache dropping the least recently used entry
+==================================================================
+
+Copyright CUED Dialogue Systems Group 2015 - 2017
+
+**Basic Usage**: 
+    >>> from utils.LRUCache import LRUCache
+    >>> cache = LRUCache(1000)
+    >>> cache.put(key, value)
+    >>> cache.get(key)      # None if key is not cached
+
+.. seealso:: CUED Imports/Dependencies: 
+
+    none
+
+************************
+
+'''
+
+__author__ = "cued_dialogue_systems_group"
+from collections import OrderedDict
+
+
+class LRUCache(object):
+    '''Bounded dict which drops the least recently used entry when full. A size of 0 disables caching.
+    '''
+    def __init__(self, size):
+        self.size = size
+        self._entries = OrderedDict()
+
+    def get(self, key):
+        try:
+            value = self._entries.pop(key)
+        except KeyError:
+            return None
+        self._entries[key] = value
+        return value
+
+    def put(self, key, value):
+        if self.size <= 0:
+            return
+        self._entries.pop(key, None)
+        self._entries[key] = value
+        if len(self._entries) > self.size:
+            self._entries.popitem(last=False)
+
+    def clear(self):
+        self._entries.clear()
+
+#END OF FILE
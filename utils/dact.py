@@ -42,11 +42,22 @@ Copyright CUED Dialogue Systems Group 2015 - 2017
 
 import re
 import string
+import weakref
+from collections import namedtuple
 
 from utils import ContextLogger
 logger = ContextLogger.getLogger('')
 
 
+def _normaliseValue(val):
+    '''
+    Values are lower cased unless they start with a punctuation character.
+    '''
+    if val is not None and type(val) in [str, unicode] and len(val) > 0 and val[0] not in string.punctuation:
+        return val.lower()
+    return val
+
+
 class DactItem(object):
     '''
     Dialogue act specification
@@ -59,15 +70,13 @@ class DactItem(object):
     def __init__(self, slot, op, val):
         self.slot = slot
         self.op = op
-        self.val = val
+        self.val = _normaliseValue(val)
 
         # if slot == "count":
         #     try:
         #         self.val = int(val)
         #     except ValueError:
         #         pass
-        if val is not None and type(val) in [str, unicode] and len(val) > 0 and val[0] not in string.punctuation:
-            self.val = val.lower()
 
     def match(self, other):
         '''
@@ -146,7 +155,134 @@ class DactItem(object):
         return repr((self.slot, self.op, self.val))
 
 
+ActItem = namedtuple('ActItem', ['slot', 'op', 'val'])
+
+
+class Act(object):
+    '''
+    Interned dialogue act: the act type ('act') and a tuple of :class:`ActItem` (slot, op, val) ('items').
+
+    There is only one object for each distinct act and it must not be modified, so acts compare and hash by identity.
+    They are passed as they are between the simulated user, the error model, the agent and the belief trackers, which
+    memoise their work per act. Create them with :func:`InternAct` from a string or with :func:`MakeAct` from their
+    parts. :class:`utils.DiaAct.DiaAct` gives a modifiable copy.
+    '''
+    __slots__ = ('act', 'items', '_string', '__weakref__')
+
+    def __init__(self, act, items):
+        self.act = act
+        self.items = items
+        self._string = None
+
+    def interned(self):
+        '''
+        :returns: (:class:`Act`) this act, as :meth:`utils.DiaAct.DiaAct.interned`
+        '''
+        return self
+
+    def to_string(self):
+        '''
+        :returns: (str) semantic act, as :meth:`utils.DiaAct.DiaAct.to_string`
+        '''
+        if self._string is None:
+            s = self.act + '('
+            for i, item in enumerate(self.items):
+                if i != 0:
+                    s += ','
+                if item.slot is not None:
+                    s += item.slot
+                if item.val is not None:
+                    s = s+item.op+'"'+str(item.val)+'"'
+            self._string = s + ')'
+        return self._string
+
+    def __copy__(self):
+        return self
+
+    def __deepcopy__(self, memo):
+        return self
+
+    def __reduce__(self):
+        return MakeAct, (self.act, self.items)
+
+    def __repr__(self):
+        return self.to_string()
+
+    def __str__(self):
+        return self.to_string()
+
+
+_interned_acts = weakref.WeakValueDictionary()
+
+
+def MakeAct(act, items=()):
+    '''
+    Returns the interned act of the act type and the (slot, op, val) items. The values are normalised as in
+    :class:`DactItem`.
+
+    :param act: act type
+    :type act: str
+    :param items: (slot, op, val) items
+    :type items: list
+    :returns: (:class:`Act`) the act
+    '''
+    items = tuple(ActItem(slot, op, _normaliseValue(val)) for slot, op, val in items)
+    key = (act, items)
+    interned = _interned_acts.get(key)
+    if interned is None:
+        interned = Act(act, items)
+        _interned_acts[key] = interned
+    return interned
+
+
+_parsed_acts = {}
+_PARSED_ACTS_SIZE = 10000
+
+
+def InternAct(t):
+    '''
+    Returns the interned act of a dialogue act string. This is where act strings from the policies, the text hubs and the
+    configuration enter the system, and the same strings come over and over, so the parses are memoised.
+
+    Acts and None are returned unchanged.
+
+    :param t: dialogue act
+    :type t: str or :class:`Act`
+    :returns: (:class:`Act`) the act
+    '''
+    if t is None or isinstance(t, Act):
+        return t
+    act = _parsed_acts.get(t)
+    if act is None:
+        r = _InParseActItems(t)
+        act = MakeAct(r['act'], [(item.slot, item.op, item.val) for item in r['slots']])
+        if len(_parsed_acts) >= _PARSED_ACTS_SIZE:
+            _parsed_acts.clear()
+        _parsed_acts[t] = act
+    return act
+
+
+def ActText(act):
+    '''
+    Returns the string of an interned act and returns act strings (eg ASR hypotheses) unchanged.
+    '''
+    if isinstance(act, Act):
+        return act.to_string()
+    return act
+
+
 def _InParseAct(t):
+    '''
+    Parses a dialogue act string or :class:`Act` into a dict with the act type ('act') and a list of :class:`DactItem`
+    ('slots').
+
+    The items are created anew for every call as the users of the parse modify them.
+    '''
+    act = InternAct(t)
+    return {'act': act.act, 'slots': [DactItem(slot, op, val) for slot, op, val in act.items]}
+
+
+def _InParseActItems(t):
 
     r = {}
     r['slots'] = []
@@ -299,9 +435,32 @@ def __ParseAct(t):
                 pass
     return r
 
+def _RawAct(act):
+    '''
+    The raw act of __ParseAct for an interned :class:`Act`, read from its items.
+    '''
+    r = {'act': act.act, 'slots': []}
+    for slot, op, val in act.items:
+        if op == '!=':
+            slot += '!'
+        if val is not None:
+            if not isinstance(val, basestring):
+                val = str(val)
+            val = val.lower()
+            if slot == "count" :
+                try :
+                    val = int(val)
+                except ValueError:
+                    pass
+        r['slots'].append([slot, val])
+    return r
+
 def _ParseAct(raw_act_text, user=True):
     
-    raw_act = __ParseAct(raw_act_text)
+    if isinstance(raw_act_text, Act):
+        raw_act = _RawAct(raw_act_text)
+    else:
+        raw_act = __ParseAct(raw_act_text)
     final_dialog_act = []
     
     if raw_act['act'] == "select" and user :
@@ -475,7 +634,8 @@ def _ParseAct(raw_act_text, user=True):
 def ParseAct(raw_act_text, user=True):
     final = []
     
-    for act_text in raw_act_text.split("|") :
+    act_texts = [raw_act_text] if isinstance(raw_act_text, Act) else raw_act_text.split("|")
+    for act_text in act_texts :
         try:
             final += _ParseAct(act_text, user=user)
         except RuntimeError: